@@ -2,9 +2,15 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
+from collections import deque
+from estatisticas import EstatisticasDataset
+from previsoes import previsao_linear
+
+# Análises guardadas no histórico de cada agente (as mais antigas são descartadas)
+HISTORICO_MAXIMO = 50
 
 class AgenteAnaliseDesmatamento:
-    def __init__(self, df):
+    def __init__(self, df, agregados=None, estatisticas=None, historico_maximo=HISTORICO_MAXIMO):
         self.df = df
         self.nome = "Amazon Agent"
         self.descricao = (
@@ -15,41 +21,40 @@ class AgenteAnaliseDesmatamento:
             "Seu objetivo é auxiliar na compreensão do fenômeno do desmatamento e "
             "apoiar a tomada de decisões estratégicas para a preservação da Amazônia Legal."
         )
+        # Estatísticas já atualizadas incrementalmente podem ser reaproveitadas
+        self.estatisticas = estatisticas or EstatisticasDataset(df, agregados=agregados)
         self.contexto = self._gerar_contexto()
         self.ultima_analise = None
-        self.historico_analises = []
+        self.historico_analises = deque(maxlen=historico_maximo)
     
     def _gerar_contexto(self):
         """Gera um contexto baseado nos dados atuais"""
         return {
-            'estados': list(self.df.columns[1:-1]),
-            'periodo': f"{self.df['Ano/Estados'].min()} - {self.df['Ano/Estados'].max()}",
+            'estados': list(self.estatisticas.estados),
+            'periodo': f"{self.estatisticas.anos.min()} - {self.estatisticas.anos.max()}",
             'ultima_atualizacao': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'estatisticas_gerais': self._calcular_estatisticas_gerais()
         }
     
     def _calcular_estatisticas_gerais(self):
         """Calcula estatísticas gerais dos dados"""
+        total = self.estatisticas.coluna_total
         return {
-            'total_amazonia': self.df['AMZ LEGAL'].sum(),
-            'media_amazonia': self.df['AMZ LEGAL'].mean(),
-            'max_amazonia': self.df['AMZ LEGAL'].max(),
-            'min_amazonia': self.df['AMZ LEGAL'].min(),
+            'total_amazonia': self.estatisticas.totais[total],
+            'media_amazonia': self.estatisticas.medias[total],
+            'max_amazonia': self.estatisticas.maximos[total],
+            'min_amazonia': self.estatisticas.minimos[total],
             'estados_mais_afetados': self._identificar_estados_mais_afetados(),
             'tendencia_recente': self._calcular_tendencia_recente()
         }
     
     def _identificar_estados_mais_afetados(self):
         """Identifica os estados mais afetados pelo desmatamento"""
-        estados = self.df.columns[1:-1]
-        medias = self.df[estados].mean()
-        return medias.sort_values(ascending=False).head(3).to_dict()
+        return self.estatisticas.mais_afetados(3)
     
     def _calcular_tendencia_recente(self):
         """Calcula a tendência de desmatamento nos últimos 5 anos"""
-        ultimos_5_anos = self.df.tail(5)
-        variacao = ((ultimos_5_anos['AMZ LEGAL'].iloc[-1] - ultimos_5_anos['AMZ LEGAL'].iloc[0]) / 
-                    ultimos_5_anos['AMZ LEGAL'].iloc[0]) * 100
+        variacao = self.estatisticas.variacao_serie(self.estatisticas.coluna_total, 5)
         return {
             'variacao_percentual': variacao,
             'tendencia': 'aumento' if variacao > 0 else 'reducao'
@@ -64,6 +69,19 @@ class AgenteAnaliseDesmatamento:
             'recomendacoes': self._gerar_recomendacoes()
         }
         
+        anterior = self.ultima_analise
+        if anterior is not None and all(anterior[campo] == analise[campo]
+                                        for campo in ('alertas', 'insights', 'recomendacoes')):
+            # Nada mudou: substitui a última entrada em vez de repeti-la no histórico. A anterior
+            # não é alterada, pois pode estar compartilhada (cache de análises, artefatos gerados)
+            analise = dict(anterior, timestamp=analise['timestamp'], repeticoes=anterior.get('repeticoes', 1) + 1)
+            self.ultima_analise = analise
+            if self.historico_analises and self.historico_analises[-1] is anterior:
+                self.historico_analises[-1] = analise
+            else:
+                self.historico_analises.append(analise)
+            return analise
+        
         self.ultima_analise = analise
         self.historico_analises.append(analise)
         return analise
@@ -73,9 +91,7 @@ class AgenteAnaliseDesmatamento:
         alertas = []
         
         # Alerta para aumento significativo
-        ultimos_2_anos = self.df.tail(2)
-        variacao_recente = ((ultimos_2_anos['AMZ LEGAL'].iloc[-1] - ultimos_2_anos['AMZ LEGAL'].iloc[0]) / 
-                           ultimos_2_anos['AMZ LEGAL'].iloc[0]) * 100
+        variacao_recente = self.estatisticas.variacao_serie(self.estatisticas.coluna_total, 2)
         
         if variacao_recente > 20:
             alertas.append({
@@ -85,15 +101,16 @@ class AgenteAnaliseDesmatamento:
             })
         
         # Alerta para estados críticos
-        for estado in self.df.columns[1:-1]:
-            ultimo_ano = self.df[estado].iloc[-1]
-            media_estado = self.df[estado].mean()
-            if ultimo_ano > media_estado * 1.5:
-                alertas.append({
-                    'tipo': 'estado_critico',
-                    'descricao': f'{estado} apresentou desmatamento {((ultimo_ano/media_estado)-1)*100:.1f}% acima da média',
-                    'severidade': 'media'
-                })
+        for estado, razao in self.estatisticas.acima_da_media(1.5):
+            alertas.append({
+                'tipo': 'estado_critico',
+                'serie': estado,
+                'descricao': f'{estado} apresentou desmatamento {(razao-1)*100:.1f}% acima da média',
+                'severidade': 'media'
+            })
+        
+        # Anomalias do último ano em todas as séries (z-score, janela móvel e variação anual)
+        alertas.extend(self.estatisticas.anomalias().alertas(ultimos_anos=1, limite=10))
         
         return alertas
     
@@ -143,6 +160,11 @@ class AgenteAnaliseDesmatamento:
         
         return recomendacoes
     
+    def prever(self, horizonte=5, confianca=0.95):
+        """Previsão linear de todas as séries para os próximos anos, com intervalos"""
+        est = self.estatisticas
+        return previsao_linear(est.anos, est.valores, est.series, horizonte, confianca)
+    
     def exportar_analise(self, formato='json'):
         """Exporta a última análise no formato especificado"""
         if not self.ultima_analise:
@@ -155,7 +177,19 @@ class AgenteAnaliseDesmatamento:
         else:
             raise ValueError("Formato não suportado")
     
-    def monitorar_mudancas(self):
-        """Monitora mudanças nos dados e gera alertas"""
-        # Implementar lógica de monitoramento contínuo
-        pass 
\ No newline at end of file
+    def monitorar_mudancas(self, anterior=None):
+        """Alertas desta versão dos dados que não existiam na análise do agente anterior.
+
+        Usado pelo monitor da pasta de dados (``monitor_dados.py``) a cada
+        arquivo novo ou alterado; um alerta é identificado pelo tipo, série
+        e ano, de modo que mudanças só nos números não o repetem.
+        """
+        analise = self.ultima_analise or self.analisar_dados()
+        if anterior is None or not anterior.ultima_analise:
+            return list(analise['alertas'])
+        vistos = {_chave_alerta(alerta) for alerta in anterior.ultima_analise['alertas']}
+        return [alerta for alerta in analise['alertas'] if _chave_alerta(alerta) not in vistos]
+
+
+def _chave_alerta(alerta):
+    return alerta['tipo'], alerta.get('serie'), alerta.get('ano')
@@ -1,51 +1,63 @@
+import threading
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg') # Usar backend Agg para evitar problemas com threads de GUI
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.linear_model import LinearRegression
 import numpy as np
+from consultas import detectar_esquema
+from estatisticas import EstatisticasDataset, SomasCorrelacao
+from ingestao import ler_csv
+from previsoes import previsao_linear
 
-# Configuração do estilo dos gráficos
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# matplotlib e seaborn levam segundos para importar e só são
+# usados ao desenhar gráficos: são carregados na primeira vez que um é pedido
+_lock_pyplot = threading.Lock()
+_pyplot = None
 
-def carregar_dados():
-    """Carrega e prepara os dados do arquivo CSV."""
-    df = pd.read_csv('prodes_desmatamento.csv', sep=';')
-    df.columns = df.columns.str.strip()
+def carregar_pyplot():
+    """Importa e configura o matplotlib (backend Agg) e o seaborn uma única vez."""
+    global _pyplot
+    with _lock_pyplot:
+        if _pyplot is None:
+            import matplotlib
+            matplotlib.use('Agg') # Usar backend Agg para evitar problemas com threads de GUI
+            import matplotlib.pyplot as plt
+            import seaborn as sns
+            
+            # Configuração do estilo dos gráficos
+            plt.style.use('seaborn-v0_8')
+            sns.set_palette("husl")
+            _pyplot = plt
+    return _pyplot
+
+def carregar_dados(origem='prodes_desmatamento.csv'):
+    """Carrega e prepara os dados do arquivo CSV (caminho ou stream)."""
+    df, _ = ler_csv(origem)
     return df
 
-def analise_detalhada(df):
+def analise_detalhada(df, estatisticas=None):
     """Realiza uma análise detalhada dos dados."""
+    if estatisticas is None:
+        estatisticas = EstatisticasDataset(df)
+    total = estatisticas.coluna_total
     analise = []
     
     # Análise geral da Amazônia Legal
-    total_amazonia = df['AMZ LEGAL'].sum()
-    media_amazonia = df['AMZ LEGAL'].mean()
-    max_amazonia = df['AMZ LEGAL'].max()
-    min_amazonia = df['AMZ LEGAL'].min()
-    ano_max = df.loc[df['AMZ LEGAL'] == max_amazonia, 'Ano/Estados'].iloc[0]
-    ano_min = df.loc[df['AMZ LEGAL'] == min_amazonia, 'Ano/Estados'].iloc[0]
-    
     analise.append(f"Análise da Amazônia Legal:")
-    analise.append(f"- Total desmatado no período: {total_amazonia:,.2f} km²")
-    analise.append(f"- Média anual de desmatamento: {media_amazonia:,.2f} km²")
-    analise.append(f"- Maior índice de desmatamento: {max_amazonia:,.2f} km² (ano {ano_max})")
-    analise.append(f"- Menor índice de desmatamento: {min_amazonia:,.2f} km² (ano {ano_min})")
+    analise.append(f"- Total desmatado no período: {estatisticas.totais[total]:,.2f} km²")
+    analise.append(f"- Média anual de desmatamento: {estatisticas.medias[total]:,.2f} km²")
+    analise.append(f"- Maior índice de desmatamento: {estatisticas.maximos[total]:,.2f} km² (ano {estatisticas.ano_maximo[total]})")
+    analise.append(f"- Menor índice de desmatamento: {estatisticas.minimos[total]:,.2f} km² (ano {estatisticas.ano_minimo[total]})")
     
-    # Análise por estado
-    estados = df.columns[1:-1]  # Exclui 'Ano/Estados' e 'AMZ LEGAL'
+    # Análise por estado, lida dos agregados já calculados
     analise.append("\nAnálise por Estado:")
     
-    for estado in estados:
-        total_estado = df[estado].sum()
-        media_estado = df[estado].mean()
-        max_estado = df[estado].max()
-        min_estado = df[estado].min()
-        ano_max_estado = df.loc[df[estado] == max_estado, 'Ano/Estados'].iloc[0]
-        ano_min_estado = df.loc[df[estado] == min_estado, 'Ano/Estados'].iloc[0]
-        
+    for estado, total_estado, media_estado, max_estado, min_estado, ano_max_estado, ano_min_estado in zip(
+        estatisticas.estados,
+        estatisticas.totais,
+        estatisticas.medias,
+        estatisticas.maximos,
+        estatisticas.minimos,
+        estatisticas.ano_maximo,
+        estatisticas.ano_minimo
+    ):
         analise.append(f"\n{estado}:")
         analise.append(f"- Total desmatado: {total_estado:,.2f} km²")
         analise.append(f"- Média anual: {media_estado:,.2f} km²")
@@ -55,17 +67,13 @@ def analise_detalhada(df):
     # Análise de tendência
     analise.append("\nAnálise de Tendência:")
     # Calcula a variação percentual entre o primeiro e último ano
-    primeiro_ano = df['AMZ LEGAL'].iloc[0]
-    ultimo_ano = df['AMZ LEGAL'].iloc[-1]
-    variacao = ((ultimo_ano - primeiro_ano) / primeiro_ano) * 100
+    variacao = estatisticas.variacao_serie(total)
     
     analise.append(f"- Variação total no período: {variacao:,.2f}%")
     
     # Análise da última década
-    ultima_decada = df.tail(10)
-    media_decada = ultima_decada['AMZ LEGAL'].mean()
-    variacao_decada = ((ultima_decada['AMZ LEGAL'].iloc[-1] - ultima_decada['AMZ LEGAL'].iloc[0]) / 
-                       ultima_decada['AMZ LEGAL'].iloc[0]) * 100
+    media_decada = estatisticas.media_recente_serie(total, 10)
+    variacao_decada = estatisticas.variacao_serie(total, 10)
     
     analise.append(f"- Média da última década: {media_decada:,.2f} km²")
     analise.append(f"- Variação na última década: {variacao_decada:,.2f}%")
@@ -80,63 +88,88 @@ def analise_geral(df):
     print("\nInformações do Dataset:")
     print(df.info())
 
-def plotar_evolucao_amazonia_legal(df):
+def _esquema_com_total(df):
+    """Esquema do DataFrame (``consultas.detectar_esquema``), exigindo a coluna de total."""
+    esquema = detectar_esquema(df)
+    if esquema.coluna_total is None:
+        raise ValueError("Coluna de total não encontrada")
+    return esquema
+
+def _periodo(df, coluna_ano):
+    """Primeiro e último ano, para os títulos dos gráficos."""
+    return f"{int(df[coluna_ano].min())}-{int(df[coluna_ano].max())}"
+
+def plotar_evolucao_amazonia_legal(df, arquivo='evolucao_amazonia_legal.png', dpi=None):
     """Plota a evolução do desmatamento na Amazônia Legal."""
+    plt = carregar_pyplot()
+    esquema = _esquema_com_total(df)
     plt.figure(figsize=(12, 6))
-    plt.plot(df['Ano/Estados'], df['AMZ LEGAL'], marker='o')
-    plt.title('Evolução do Desmatamento na Amazônia Legal (1988-2024)')
+    plt.plot(df[esquema.coluna_ano], df[esquema.coluna_total], marker='o')
+    plt.title(f'Evolução do Desmatamento na Amazônia Legal ({_periodo(df, esquema.coluna_ano)})')
     plt.xlabel('Ano')
     plt.ylabel('Área Desmatada (km²)')
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('evolucao_amazonia_legal.png')
+    plt.savefig(arquivo, dpi=dpi)
     plt.close()
 
-def plotar_estados_mais_afetados(df):
+def plotar_estados_mais_afetados(df, arquivo='estados_mais_afetados.png', dpi=None):
     """Plota os estados mais afetados pelo desmatamento."""
-    # Calcula a média de desmatamento por estado
-    estados = df.columns[1:-1]  # Exclui 'Ano/Estados' e 'AMZ LEGAL'
-    medias = df[estados].mean()
+    plt = carregar_pyplot()
+    # Calcula a média de desmatamento por estado (sem as colunas de ano e de total)
+    esquema = detectar_esquema(df)
+    medias = df[esquema.regioes].mean()
     
     plt.figure(figsize=(12, 6))
     medias.sort_values(ascending=False).plot(kind='bar')
-    plt.title('Média de Desmatamento por Estado (1988-2024)')
+    plt.title(f'Média de Desmatamento por Estado ({_periodo(df, esquema.coluna_ano)})')
     plt.xlabel('Estado')
     plt.ylabel('Área Média Desmatada (km²)')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('estados_mais_afetados.png')
+    plt.savefig(arquivo, dpi=dpi)
     plt.close()
 
-def analise_correlacao(df):
-    """Analisa a correlação entre os estados."""
-    estados = df.columns[1:-1]
+# Acima deste número de estados a matriz completa fica ilegível (e cara):
+# mostra só os de maior média e, para todos, os parceiros mais correlacionados
+LIMITE_MATRIZ_CORRELACAO = 30
+
+def _estados_matriz(estados, medias):
+    """Estados exibidos na matriz de correlação, na ordem original."""
+    if len(estados) <= LIMITE_MATRIZ_CORRELACAO:
+        return list(estados)
+    maiores = set(medias.nlargest(LIMITE_MATRIZ_CORRELACAO).index)
+    return [estado for estado in estados if estado in maiores]
+
+def analise_correlacao(df, arquivo='correlacao_estados.png', dpi=None):
+    """Analisa a correlação entre os estados (os de maior média, se forem muitos)."""
+    plt = carregar_pyplot()
+    import seaborn as sns
+    regioes = detectar_esquema(df).regioes
+    estados = _estados_matriz(regioes, df[regioes].mean())
     correlacao = df[estados].corr()
     
     plt.figure(figsize=(12, 8))
-    sns.heatmap(correlacao, annot=True, cmap='coolwarm', center=0)
+    sns.heatmap(correlacao, annot=len(estados) <= 12, cmap='coolwarm', center=0)
     plt.title('Correlação entre Estados')
     plt.tight_layout()
-    plt.savefig('correlacao_estados.png')
+    plt.savefig(arquivo, dpi=dpi)
     plt.close()
 
-def previsao_futura(df):
+def previsao_futura(df, arquivo='previsao_futura.png', dpi=None):
     """Realiza uma previsão simples para os próximos anos."""
-    X = np.array(range(len(df))).reshape(-1, 1)
-    y = df['AMZ LEGAL'].values
+    plt = carregar_pyplot()
+    esquema = _esquema_com_total(df)
+    anos = df[esquema.coluna_ano].to_numpy()
+    y = df[esquema.coluna_total].to_numpy(dtype=np.float64)
     
-    modelo = LinearRegression()
-    modelo.fit(X, y)
-    
-    # Previsão para os próximos 5 anos
-    anos_futuros = np.array(range(len(df), len(df) + 5)).reshape(-1, 1)
-    previsao = modelo.predict(anos_futuros)
+    # Previsão para os próximos 5 anos, com a regressão sobre os anos (e não a posição da linha)
+    previsao = previsao_linear(anos, y[:, None], [esquema.coluna_total], 5)
     
     plt.figure(figsize=(12, 6))
-    plt.plot(df['Ano/Estados'], df['AMZ LEGAL'], marker='o', label='Dados Históricos')
-    anos_futuros_labels = [str(int(df['Ano/Estados'].iloc[-1]) + i + 1) for i in range(5)]
-    plt.plot(anos_futuros_labels, previsao, marker='o', linestyle='--', label='Previsão')
+    plt.plot(anos, y, marker='o', label='Dados Históricos')
+    plt.plot(previsao.anos_futuros, previsao.previsao[:, 0], marker='o', linestyle='--', label='Previsão')
     plt.title('Previsão de Desmatamento na Amazônia Legal')
     plt.xlabel('Ano')
     plt.ylabel('Área Desmatada (km²)')
@@ -144,9 +177,96 @@ def previsao_futura(df):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('previsao_futura.png')
+    plt.savefig(arquivo, dpi=dpi)
     plt.close()
 
+def _lista(valores):
+    """Converte um array em lista serializável em JSON (NaN vira None)"""
+    return [None if np.isnan(v) else float(v) for v in np.asarray(valores, dtype=np.float64)]
+
+def dados_evolucao(df, estatisticas=None):
+    """Série anual da Amazônia Legal para renderização no navegador."""
+    if estatisticas is None:
+        estatisticas = EstatisticasDataset(df)
+    return {
+        'anos': [int(ano) for ano in estatisticas.anos],
+        'valores': _lista(estatisticas.valores[:, -1])
+    }
+
+def dados_estados(df, estatisticas=None):
+    """Média e total de desmatamento por estado, em ordem decrescente de média."""
+    if estatisticas is None:
+        estatisticas = EstatisticasDataset(df)
+    medias = estatisticas.medias[estatisticas.estados].sort_values(ascending=False)
+    return {
+        'estados': list(medias.index),
+        'medias': _lista(medias.values),
+        'totais': _lista(estatisticas.totais[medias.index].values)
+    }
+
+def dados_correlacao(df, estatisticas=None):
+    """Matriz de correlação entre os estados."""
+    if estatisticas is None:
+        estatisticas = EstatisticasDataset(df)
+    estados = estatisticas.estados
+    if len(estados) <= LIMITE_MATRIZ_CORRELACAO:
+        # Correlação par a par (como DataFrame.corr), mantida incrementalmente pelas estatísticas
+        return {
+            'estados': list(estados),
+            'matriz': [_lista(linha) for linha in np.atleast_2d(estatisticas.correlacao())]
+        }
+    exibidos = _estados_matriz(estados, estatisticas.medias[estados])
+    indices = [estatisticas._indice(estado) for estado in exibidos]
+    correlacao = SomasCorrelacao(len(indices))
+    correlacao.acumular(estatisticas.valores[:, indices])
+    return {
+        'estados': exibidos,
+        'matriz': [_lista(linha) for linha in correlacao.matriz()],
+        'parceiros': estatisticas.parceiros_correlacao(5).para_json(exibidos)
+    }
+
+def dados_previsao(df, estatisticas=None, anos=5):
+    """Histórico e previsão linear (com intervalo de 95%) da Amazônia Legal para os próximos anos."""
+    if estatisticas is None:
+        estatisticas = EstatisticasDataset(df)
+    y = estatisticas.valores[:, -1]
+    # Mesmo modelo de previsao_futura, resolvido em forma fechada
+    previsao = previsao_linear(estatisticas.anos, y[:, None], [estatisticas.coluna_total], anos)
+    return {
+        'anos': [int(ano) for ano in estatisticas.anos],
+        'historico': _lista(y),
+        'anos_futuros': [int(ano) for ano in previsao.anos_futuros],
+        **previsao.serie(estatisticas.coluna_total)
+    }
+
+# Séries de que cada gráfico depende: 'total' (Amazônia Legal) ou 'estados'
+DEPENDENCIAS_GRAFICOS = {
+    'evolucao': 'total',
+    'estados': 'estados',
+    'correlacao': 'estados',
+    'previsao': 'total'
+}
+
+def graficos_afetados(estatisticas, series_alteradas, anos_novos):
+    """Tipos de gráfico cujo conteúdo muda com a atualização informada."""
+    if anos_novos:
+        # Um ano a mais muda o eixo de todos os gráficos
+        return set(DEPENDENCIAS_GRAFICOS)
+    alteradas = set(series_alteradas)
+    total_alterado = estatisticas.coluna_total in alteradas
+    estados_alterados = bool(alteradas - {estatisticas.coluna_total})
+    return {
+        tipo for tipo, dependencia in DEPENDENCIAS_GRAFICOS.items()
+        if (dependencia == 'total' and total_alterado) or (dependencia == 'estados' and estados_alterados)
+    }
+
+DADOS_GRAFICOS = {
+    'evolucao': dados_evolucao,
+    'estados': dados_estados,
+    'correlacao': dados_correlacao,
+    'previsao': dados_previsao
+}
+
 def main():
     """Função principal que executa todas as análises."""
     print("Iniciando análise do desmatamento na Amazônia...")
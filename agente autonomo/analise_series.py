@@ -0,0 +1,237 @@
+import numpy as np
+
+
+class ParceirosCorrelacao:
+    """As ``k`` séries mais correlacionadas (em valor absoluto) com cada série"""
+
+    def __init__(self, series, indices, correlacoes):
+        self.series = list(series)
+        self.indices = indices          # séries x k, -1 onde não há parceiro
+        self.correlacoes = correlacoes  # séries x k (float32), NaN onde não há parceiro
+        self._posicao = {serie: i for i, serie in enumerate(self.series)}
+
+    def parceiros(self, serie):
+        """Lista de (série, correlação) em ordem decrescente de |correlação|"""
+        i = self._posicao[serie]
+        return [
+            (self.series[j], float(r))
+            for j, r in zip(self.indices[i], self.correlacoes[i]) if j >= 0
+        ]
+
+    def para_json(self, series=None):
+        return {
+            serie: [{'serie': parceiro, 'correlacao': r} for parceiro, r in self.parceiros(serie)]
+            for serie in (series or self.series)
+        }
+
+
+def _padronizar(valores):
+    """Centra e escala cada coluna (em float64) antes de reduzir para float32.
+
+    A correlação não muda com deslocamento e escala de cada série, e assim
+    os produtos em float32 não perdem precisão com valores grandes.
+    """
+    x = np.asarray(valores, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.nanmean(x, axis=0)
+        desvio = np.nanstd(x, axis=0)
+        z = (x - media) / np.where(desvio > 0, desvio, 1.0)
+    presentes = ~np.isnan(z)
+    return np.where(presentes, z, 0.0).astype(np.float32), presentes.astype(np.float32)
+
+
+def _correlacao_bloco(z, m, inicio, fim, completas, minimo_anos):
+    """Correlação das colunas ``inicio:fim`` com todas as colunas (bloco x séries).
+
+    Sem ausentes, um único produto de matrizes basta; com ausentes, usa as
+    somas par a par apenas nas linhas em que as duas séries têm valor (mesma
+    regra de ``DataFrame.corr``).
+    """
+    zb, mb = z[:, inicio:fim], m[:, inicio:fim]
+    if completas:
+        n = np.float32(len(z))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlacao = (zb.T @ z) / n
+        # Colunas constantes ficaram zeradas pela padronização
+        constantes = ~z.any(axis=0)
+        correlacao[:, constantes] = np.nan
+        correlacao[constantes[inicio:fim]] = np.nan
+        return correlacao
+    z2 = z * z
+    n = mb.T @ m
+    sx = zb.T @ m
+    sy = mb.T @ z
+    covariancia = n * (zb.T @ z) - sx * sy
+    variancia = (n * ((z2[:, inicio:fim]).T @ m) - sx * sx) * (n * (mb.T @ z2) - sy * sy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlacao = covariancia / np.sqrt(variancia)
+    correlacao[(n < minimo_anos) | ~(variancia > 0)] = np.nan
+    return correlacao
+
+
+def correlacao_parceiros(valores, series, k=10, tamanho_bloco=512, minimo_anos=3):
+    """Top-``k`` parceiros de correlação de cada série, calculados em blocos.
+
+    A matriz séries x séries nunca é montada inteira: cada bloco de
+    ``tamanho_bloco`` colunas é correlacionado com todas as demais em
+    float32 e só os ``k`` maiores |r| de cada linha são guardados, de modo
+    que a memória fica em O(bloco x séries) em vez de O(séries²).
+    """
+    z, m = _padronizar(valores)
+    num_series = z.shape[1]
+    k = max(0, min(k, num_series - 1))
+    indices = np.full((num_series, k), -1, dtype=np.int32)
+    correlacoes = np.full((num_series, k), np.nan, dtype=np.float32)
+    if k == 0:
+        return ParceirosCorrelacao(series, indices, correlacoes)
+
+    completas = bool(m.all())
+    for inicio in range(0, num_series, tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, num_series)
+        bloco = _correlacao_bloco(z, m, inicio, fim, completas, minimo_anos)
+        linhas = np.arange(fim - inicio)
+        bloco[linhas, linhas + inicio] = np.nan  # a própria série não é parceira
+
+        forca = np.abs(bloco)
+        forca[np.isnan(forca)] = -1.0
+        melhores = np.argpartition(-forca, k - 1, axis=1)[:, :k]
+        ordem = np.argsort(-np.take_along_axis(forca, melhores, axis=1), axis=1, kind='stable')
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+        validos = np.take_along_axis(forca, melhores, axis=1) >= 0
+
+        indices[inicio:fim] = np.where(validos, melhores, -1)
+        correlacoes[inicio:fim] = np.where(validos, np.take_along_axis(bloco, melhores, axis=1), np.nan)
+    return ParceirosCorrelacao(series, indices, correlacoes)
+
+
+def _somas_moveis(x, janela):
+    """Soma dos ``janela`` valores anteriores a cada linha (sem incluí-la)"""
+    acumulado = np.vstack([np.zeros((1, x.shape[1])), np.cumsum(x, axis=0)])
+    fim = np.arange(len(x))
+    inicio = np.maximum(fim - janela, 0)
+    return acumulado[fim] - acumulado[inicio]
+
+
+class Anomalias:
+    """Métricas de anomalia (anos x séries) e os alertas derivados delas.
+
+    ``z_historico``: desvios em relação à média da série no período todo;
+    ``z_janela``: desvios em relação aos ``janela`` anos anteriores;
+    ``variacao_anual``: variação percentual sobre o ano anterior, sinalizada
+    só quando a mudança absoluta também supera a variabilidade usual da série.
+    """
+
+    def __init__(self, anos, series, valores, z_historico, z_janela, variacao_anual, sinais, janela):
+        self.anos = anos
+        self.series = list(series)
+        self.valores = valores
+        self.z_historico = z_historico
+        self.z_janela = z_janela
+        self.variacao_anual = variacao_anual
+        self.sinais = sinais  # dict critério -> matriz booleana anos x séries
+        self.janela = janela
+
+    def marcadas(self, ultimos_anos=None):
+        """Matriz booleana das células com ao menos um critério, nos últimos anos"""
+        inicio = 0 if ultimos_anos is None else max(len(self.anos) - ultimos_anos, 0)
+        return np.logical_or.reduce([sinal[inicio:] for sinal in self.sinais.values()]), inicio
+
+    def alertas(self, ultimos_anos=1, limite=20, series=None):
+        """Alertas estruturados, um por (série, ano), dos mais fortes aos mais fracos.
+
+        A severidade é 'alta' quando dois ou mais critérios concordam.
+        """
+        marcadas, inicio = self.marcadas(ultimos_anos)
+        if series is not None:
+            permitidas = np.isin(self.series, list(series))
+            marcadas = marcadas & permitidas
+        linhas, colunas = np.nonzero(marcadas)
+        linhas = linhas + inicio
+
+        criterios = np.stack([sinal[linhas, colunas] for sinal in self.sinais.values()])
+        quantidade = criterios.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            pontuacao = np.nanmax(np.stack([
+                np.abs(self.z_historico[linhas, colunas]),
+                np.abs(self.z_janela[linhas, colunas]),
+                np.abs(self.variacao_anual[linhas, colunas]) / 100
+            ]), axis=0)
+        ordem = np.lexsort((-np.nan_to_num(pontuacao), -quantidade))[:limite]
+
+        nomes = list(self.sinais)
+        resultado = []
+        for i in ordem:
+            linha, coluna = linhas[i], colunas[i]
+            encontrados = [nome for nome, ativo in zip(nomes, criterios[:, i]) if ativo]
+            resultado.append({
+                'tipo': 'anomalia',
+                'serie': self.series[coluna],
+                'ano': int(self.anos[linha]),
+                'valor': float(self.valores[linha, coluna]),
+                'criterios': encontrados,
+                'z_historico': _numero(self.z_historico[linha, coluna]),
+                'z_janela': _numero(self.z_janela[linha, coluna]),
+                'variacao_anual': _numero(self.variacao_anual[linha, coluna]),
+                'descricao': self._descrever(linha, coluna, encontrados),
+                'severidade': 'alta' if quantidade[i] >= 2 else 'media'
+            })
+        return resultado
+
+    def _descrever(self, linha, coluna, criterios):
+        partes = []
+        if 'z_historico' in criterios:
+            partes.append(f"{self.z_historico[linha, coluna]:+.1f} desvios da média histórica")
+        if 'z_janela' in criterios:
+            partes.append(f"{self.z_janela[linha, coluna]:+.1f} desvios da média dos {self.janela} anos anteriores")
+        if 'variacao_anual' in criterios:
+            partes.append(f"{self.variacao_anual[linha, coluna]:+.1f}% sobre o ano anterior")
+        return (
+            f"{self.series[coluna]} em {int(self.anos[linha])}: {self.valores[linha, coluna]:,.0f} km² "
+            f"({'; '.join(partes)})"
+        )
+
+
+def _numero(valor):
+    return None if np.isnan(valor) else float(valor)
+
+
+def detectar_anomalias(anos, valores, series, limiar_z=3.0, janela=5, limiar_janela=3.0,
+                       limiar_variacao=50.0, minimo_anos=3):
+    """Aplica os três critérios de anomalia a todas as séries de uma vez.
+
+    Cada critério é uma operação sobre a matriz anos x séries inteira
+    (somas acumuladas para a janela móvel), sem laço por coluna; ausentes
+    são ignorados como nas reduções ``nan*`` do NumPy.
+    """
+    x = np.asarray(valores, dtype=np.float64)
+    presentes = ~np.isnan(x)
+    x0 = np.where(presentes, x, 0.0)
+    m = presentes.astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.nanmean(x, axis=0)
+        desvio = np.nanstd(x, axis=0, ddof=1)
+        z_historico = (x - media) / desvio
+
+        # Média e desvio dos ``janela`` anos anteriores, por soma acumulada
+        n = _somas_moveis(m, janela)
+        soma = _somas_moveis(x0, janela)
+        soma_quadrados = _somas_moveis(x0 * x0, janela)
+        media_janela = soma / n
+        variancia_janela = (soma_quadrados - n * media_janela ** 2) / (n - 1)
+        desvio_janela = np.sqrt(np.maximum(variancia_janela, 0))
+        z_janela = (x - media_janela) / desvio_janela
+        z_janela[(n < minimo_anos) | ~(desvio_janela > 0)] = np.nan
+
+        anterior = np.vstack([np.full((1, x.shape[1]), np.nan), x[:-1]])
+        diferenca = x - anterior
+        variacao_anual = np.where(anterior > 0, diferenca / anterior * 100, np.nan)
+        desvio_diferencas = np.nanstd(diferenca, axis=0, ddof=1)
+
+        sinais = {
+            'z_historico': np.abs(z_historico) >= limiar_z,
+            'z_janela': np.abs(z_janela) >= limiar_janela,
+            'variacao_anual': (np.abs(variacao_anual) >= limiar_variacao)
+                              & (np.abs(diferenca) >= desvio_diferencas)
+        }
+    return Anomalias(np.asarray(anos), series, x, z_historico, z_janela, variacao_anual, sinais, janela)
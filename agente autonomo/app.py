@@ -1,206 +1,593 @@
-from flask import Flask, render_template, request, send_file, jsonify, session, redirect, url_for
+import time
+# Início da partida, para medir o tempo até a aplicação ficar pronta (ver /metricas)
+INICIO_PARTIDA = time.perf_counter()
+from flask import Flask, render_template, request, send_file, jsonify, session, redirect, url_for, Response, stream_with_context, g, has_request_context
 import os
-from analise_desmatamento import (
-    carregar_dados,
-    analise_geral,
-    plotar_evolucao_amazonia_legal,
-    plotar_estados_mais_afetados,
-    analise_correlacao,
-    previsao_futura,
-    analise_detalhada
-)
+import re
+from analise_desmatamento import analise_geral, DADOS_GRAFICOS
 from agente_analise import AgenteAnaliseDesmatamento
+from cache_analises import CacheAnalises, hash_dataset, linhas_alteradas
+from armazenamento import salvar_dataset, carregar_dataset, carregar_valores, ler_manifesto, ultimo_dataset, PonteiroAtual
+from estatisticas import EstatisticasDataset
+from graficos import ServicoGraficos, TIPOS_GRAFICO
+from artefatos import ArmazemArtefatos, CODIFICACOES, nome_arquivo
+from ingestao import ler_csv
+from concurrent.futures import TimeoutError as PrazoEsgotado
+from previsoes import ServicoPrevisoes, MODELOS
 import json
-import time
+import gzip
 import threading
+import uuid
 import queue
-import openai
+from motor_perguntas import MotorPerguntas, FilaCheiaError, FilaCompartilhada
+from eventos import CanalRespostas, RetransmissorRespostas, formatar_sse
+from armazem_perguntas import ArmazemPerguntas
+from armazem_alertas import ArmazemAlertas
+from monitor_dados import MonitorDados
+from cache_respostas import CacheRespostas
+from llm import GatewayLLM, CircuitoAberto
+from construtor_prompt import RegistroTokens, estimar_tokens
+from instrumentacao import registro_metricas, etapa, Perfilador, FiltroTaxa
 import logging
-import base64
-from io import BytesIO
-import matplotlib.pyplot as plt
-import seaborn as sns
+import pandas as pd
+from contextlib import nullcontext
 
-# Configuração de logging
-logging.basicConfig(level=logging.DEBUG)
+# Configuração de logging: nível em AGENTE_LOG_NIVEL e, por mensagem, no máximo
+# AGENTE_LOG_LIMITE registros por minuto (o restante é contado e descartado)
+logging.basicConfig(level=os.environ.get('AGENTE_LOG_NIVEL', 'INFO').upper())
+filtro_logs = FiltroTaxa(int(os.environ.get('AGENTE_LOG_LIMITE', 20)))
+for handler in logging.getLogger().handlers:
+    handler.addFilter(filtro_logs)
 logger = logging.getLogger(__name__)
 
-# Configuração da API OpenAI
-openai.api_key = "sk-XXXXXXXXXXXXXXXXXXXXXXXX"
-
 # Configuração do Flask
 app = Flask(__name__, static_folder='static')
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config['PASTA_DATASETS'] = os.path.join(app.config['UPLOAD_FOLDER'], 'datasets')
+app.config['PASTA_GRAFICOS'] = os.path.join('static', 'graficos')
+app.config['PASTA_ARTEFATOS'] = os.path.join(app.config['UPLOAD_FOLDER'], 'artefatos')
+app.config['BANCO_PERGUNTAS'] = os.environ.get('AGENTE_BANCO', os.path.join(app.config['UPLOAD_FOLDER'], 'perguntas.db'))
+app.config['PROCESSOS_GRAFICOS'] = int(os.environ.get('AGENTE_PROCESSOS_GRAFICOS', 2))
+app.config['LIMITE_GRAFICOS'] = int(os.environ.get('AGENTE_LIMITE_GRAFICOS_MB', 512)) * 1024 * 1024
+app.config['IDADE_GRAFICOS'] = float(os.environ.get('AGENTE_IDADE_GRAFICOS_DIAS', 30)) * 86400
+app.config['PROCESSOS_PREVISAO'] = int(os.environ.get('AGENTE_PROCESSOS_PREVISAO', 2))
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('AGENTE_MAX_UPLOAD_MB', 512)) * 1024 * 1024
+app.config['WORKERS_PERGUNTAS'] = int(os.environ.get('AGENTE_WORKERS', 4))
+app.config['CAPACIDADE_FILA'] = int(os.environ.get('AGENTE_CAPACIDADE_FILA', 100))
+app.config['TIMEOUT_PERGUNTA'] = float(os.environ.get('AGENTE_TIMEOUT_PERGUNTA', 60))
+app.config['MODELO_LLM'] = os.environ.get('AGENTE_MODELO', 'gpt-3.5-turbo')
+app.config['TEMPERATURA_LLM'] = 0.7
+app.config['CHAVE_OPENAI'] = os.environ.get('OPENAI_API_KEY', "sk-XXXXXXXXXXXXXXXXXXXXXXXX")
+app.config['URL_LLM'] = os.environ.get('AGENTE_LLM_URL', 'https://api.openai.com/v1')
+app.config['CONCORRENCIA_LLM'] = int(os.environ.get('AGENTE_LLM_CONCORRENCIA', 8))
+app.config['TENTATIVAS_LLM'] = int(os.environ.get('AGENTE_LLM_TENTATIVAS', 4))
+app.config['CAPACIDADE_CACHE_RESPOSTAS'] = int(os.environ.get('AGENTE_CACHE_RESPOSTAS', 1000))
+app.config['TTL_CACHE_RESPOSTAS'] = float(os.environ.get('AGENTE_CACHE_TTL', 3600))
+app.config['SIMILARIDADE_CACHE'] = float(os.environ.get('AGENTE_CACHE_SIMILARIDADE', 0)) or None
+app.config['ORCAMENTO_PROMPT'] = int(os.environ.get('AGENTE_ORCAMENTO_PROMPT', 1500))
+app.config['MAX_TOKENS_RESPOSTA'] = int(os.environ.get('AGENTE_MAX_TOKENS_RESPOSTA', 1000))
+app.config['MEMORIA_DATASETS'] = int(os.environ.get('AGENTE_MEMORIA_DATASETS_MB', 1024)) * 1024 * 1024
+app.config['STREAM_TOKENS'] = os.environ.get('AGENTE_STREAM_TOKENS', '0') == '1'
+# Pasta observada pelo agente (vazia desativa o monitoramento)
+app.config['PASTA_MONITORADA'] = os.environ.get('AGENTE_PASTA_MONITORADA', os.path.join(app.config['UPLOAD_FOLDER'], 'monitorados'))
+app.config['ESPERA_MONITOR'] = float(os.environ.get('AGENTE_ESPERA_MONITOR', 2))
+app.config['INTERVALO_SONDAGEM'] = float(os.environ.get('AGENTE_INTERVALO_SONDAGEM', 5))
+# Meta de partida a frio (importações e inicialização, sem aquecimento): 1,5 s
+app.config['META_PARTIDA_MS'] = float(os.environ.get('AGENTE_META_PARTIDA_MS', 1500))
+# Carrega as bibliotecas pesadas já na partida, e não na primeira requisição que as usa
+app.config['AQUECER'] = os.environ.get('AGENTE_AQUECER', '0') == '1'
+# Requisições e perguntas acima deste tempo têm as pilhas amostradas salvas (0 desativa)
+app.config['PERFIL_LIMIAR_MS'] = float(os.environ.get('AGENTE_PERFIL_LIMIAR_MS', 0))
+app.config['PASTA_PERFIS'] = os.path.join(app.config['UPLOAD_FOLDER'], 'perfis')
+# Vários processos (servidor.py): fila de perguntas no banco, compartilhada entre eles.
+# AGENTE_WORKER_ID identifica o processo; só o 0 monitora a pasta de dados
+app.config['FILA_COMPARTILHADA'] = os.environ.get('AGENTE_FILA_COMPARTILHADA', '0') == '1'
+app.config['WORKER_ID'] = int(os.environ.get('AGENTE_WORKER_ID', 0))
+app.config['PRAZO_ENCERRAMENTO'] = float(os.environ.get('AGENTE_PRAZO_ENCERRAMENTO', 30))
 app.secret_key = 'chave_secreta_do_app'
 
 # Cria pasta de uploads se não existir
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
-# Cria pasta de gráficos se não existir
-if not os.path.exists('static/graficos'):
-    os.makedirs('static/graficos')
+# Serviço de gráficos (cria a pasta de cache se não existir)
+servico_graficos = ServicoGraficos(
+    app.config['PASTA_GRAFICOS'],
+    app.config['PROCESSOS_GRAFICOS'],
+    limite_bytes=app.config['LIMITE_GRAFICOS'],
+    idade_maxima=app.config['IDADE_GRAFICOS']
+)
+servico_previsoes = ServicoPrevisoes(app.config['PROCESSOS_PREVISAO'])
+armazem_artefatos = ArmazemArtefatos(app.config['PASTA_ARTEFATOS'])
+
+def carregar_agente(caminho_dataset):
+    """Recria o agente de uma versão salva, com a matriz das estatísticas mapeada em memória"""
+    df = carregar_dataset(caminho_dataset)
+    return AgenteAnaliseDesmatamento(df, estatisticas=EstatisticasDataset(df, valores=carregar_valores(caminho_dataset)))
+
+def carregar_agente_salvo(dataset_hash):
+    """Recria o agente de uma versão salva em disco (None se ela não existir)"""
+    caminho_dataset = os.path.join(app.config['PASTA_DATASETS'], dataset_hash)
+    if not re.fullmatch(r'[0-9a-f]{40}', dataset_hash) or not os.path.isdir(caminho_dataset):
+        return None
+    return carregar_agente(caminho_dataset)
 
 # Variáveis globais
-agente = None
-perguntas_queue = queue.Queue()
-respostas_completas = {}
+# Registro das versões do dataset em memória, por hash, com limite de memória
+# Com vários processos, o dataset atual é o apontado pelo arquivo ATUAL, que qualquer um deles pode trocar
+cache_analises = CacheAnalises(
+    app.config['MEMORIA_DATASETS'],
+    carregador=carregar_agente_salvo,
+    atual=PonteiroAtual(app.config['PASTA_DATASETS']).ler if app.config['FILA_COMPARTILHADA'] else None
+)
+armazem_perguntas = ArmazemPerguntas(app.config['BANCO_PERGUNTAS'])
+armazem_alertas = ArmazemAlertas(app.config['BANCO_PERGUNTAS'])
+canal_respostas = CanalRespostas()
+cliente_llm = GatewayLLM(
+    app.config['CHAVE_OPENAI'],
+    url_base=app.config['URL_LLM'],
+    modelo=app.config['MODELO_LLM'],
+    timeout=app.config['TIMEOUT_PERGUNTA'],
+    max_concorrencia=app.config['CONCORRENCIA_LLM'],
+    tentativas=app.config['TENTATIVAS_LLM']
+)
+cache_respostas = CacheRespostas(
+    capacidade=app.config['CAPACIDADE_CACHE_RESPOSTAS'],
+    ttl=app.config['TTL_CACHE_RESPOSTAS'],
+    limiar_similaridade=app.config['SIMILARIDADE_CACHE']
+)
+registro_tokens = RegistroTokens()
+perfilador = Perfilador(app.config['PASTA_PERFIS'], app.config['PERFIL_LIMIAR_MS'] / 1000) \
+    if app.config['PERFIL_LIMIAR_MS'] > 0 else None
+tempo_requisicoes = registro_metricas.histograma(
+    'agente_requisicao_segundos', 'Duração das requisições HTTP por rota e status', ('rota', 'status'))
+
+PLACEHOLDER_RESPOSTA = "Aguarde, sua pergunta está sendo analisada..."
 
 def limpar_sessao():
-    """Limpa a sessão atual"""
+    """Inicia uma nova conversa para o usuário atual, mantendo o dataset escolhido"""
+    # O histórico continua salvo no banco; apenas a sessão deste usuário é trocada
+    dataset = session.get('dataset')
     session.clear()
-    # Limpa também as respostas completas em memória
-    respostas_completas.clear()
-    print("\n🔄 Histórico de perguntas e respostas em memória limpo!\n")
+    if dataset is not None:
+        session['dataset'] = dataset
+
+def obter_sessao_id():
+    """Retorna o identificador da sessão, criando-o se necessário"""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def dataset_da_requisicao():
+    """Versão do dataset escolhida na requisição (parâmetro ``dataset``) ou na sessão.
 
-def gerar_imagem(prompt):
+    None indica o dataset atual do servidor.
+    """
+    dados = request.get_json(silent=True) if request.is_json else None
+    return request.values.get('dataset') or (dados or {}).get('dataset') or session.get('dataset')
+
+def gerar_imagem(prompt, prazo=None):
     """Gera uma imagem usando a API DALL-E"""
     try:
-        response = openai.Image.create(
-            prompt=prompt,
-            n=1,
-            size="512x512"
-        )
-        return response['data'][0]['url']
+        return cliente_llm.gerar_imagem(prompt, prazo=prazo)
     except Exception as e:
-        print(f"Erro ao gerar imagem: {str(e)}")
+        logger.error("Erro ao gerar imagem: %s", e)
         return None
 
-def gerar_grafico(df, tipo_grafico):
-    """Gera um gráfico baseado no tipo solicitado"""
+def gerar_grafico(dataset_hash, tipo_grafico):
+    """Agenda o gráfico no serviço de renderização e retorna sua URL"""
     try:
-        plt.figure(figsize=(10, 6))
-        
-        if tipo_grafico == "evolucao":
-            sns.lineplot(data=df, x='ano', y='desmatamento_km2')
-            plt.title('Evolução do Desmatamento na Amazônia Legal')
-            plt.xlabel('Ano')
-            plt.ylabel('Desmatamento (km²)')
-        elif tipo_grafico == "estados":
-            df_estados = df.groupby('estado')['desmatamento_km2'].sum().sort_values(ascending=False)
-            sns.barplot(x=df_estados.index, y=df_estados.values)
-            plt.title('Desmatamento por Estado')
-            plt.xticks(rotation=45)
-            plt.xlabel('Estado')
-            plt.ylabel('Desmatamento Total (km²)')
-        
-        # Cria o diretório static/graficos se não existir
-        if not os.path.exists('static/graficos'):
-            os.makedirs('static/graficos')
-        
-        # Gera um nome único para o arquivo
-        timestamp = int(time.time())
-        filename = f'grafico_{tipo_grafico}_{timestamp}.png'
-        filepath = os.path.join('static/graficos', filename)
-        
-        # Salva o gráfico
-        plt.savefig(filepath, format='png', bbox_inches='tight', dpi=300)
-        plt.close()
-        
-        # Retorna o caminho relativo para a imagem
-        return f'/static/graficos/{filename}'
+        caminho_dataset = os.path.join(app.config['PASTA_DATASETS'], dataset_hash)
+        servico_graficos.solicitar(dataset_hash, caminho_dataset, tipo_grafico)
+        return f'/grafico/{dataset_hash}/{tipo_grafico}'
     except Exception as e:
-        print(f"Erro ao gerar gráfico: {str(e)}")
+        logger.error("Erro ao gerar gráfico: %s", e)
         return None
 
-def processar_perguntas():
-    """Processa perguntas pendentes na fila"""
-    while True:
+def memoria_processo():
+    """Memória residente atual e de pico do processo, em bytes"""
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB no Linux
+    try:
+        with open('/proc/self/statm') as f:
+            residente = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        residente = None
+    return {'residente_bytes': residente, 'pico_bytes': pico}
+
+def aquecer():
+    """Importa antecipadamente as bibliotecas carregadas sob demanda.
+
+    matplotlib/seaborn (gráficos), SciPy (previsões), aiohttp
+    (LLM) e o tiktoken, se instalado. No servidor.py, cada worker as carrega ao
+    subir, antes de atender a primeira requisição.
+    """
+    inicio = time.perf_counter()
+    from analise_desmatamento import carregar_pyplot
+    from llm import _importar_aiohttp
+    import scipy.stats
+    carregar_pyplot()
+    _importar_aiohttp()
+    estimar_tokens('')
+    logger.info("🔥 Bibliotecas pré-carregadas em %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+def carregar_ultimo_dataset():
+    """Recarrega o dataset mais recente salvo em disco, se houver"""
+    caminho = ultimo_dataset(app.config['PASTA_DATASETS'])
+    if caminho is None:
+        return
+    try:
+        inicio = time.perf_counter()
+        manifesto = ler_manifesto(caminho)
+        cache_analises.construir(carregar_agente(caminho), manifesto['hash'])
+        logger.info("📂 Dataset %s recarregado em %.1f ms", manifesto['hash'][:12], (time.perf_counter() - inicio) * 1000)
+    except Exception as e:
+        logger.error("❌ Erro ao recarregar o dataset salvo: %s", e)
+
+def ativar_dataset(df, agregados=None, nome_original=None, ativar=True):
+    """Salva uma nova versão completa do dataset e, com ``ativar``, a torna a atual"""
+    dataset_hash = hash_dataset(df)
+    
+    logger.debug("Inicializando agente e gerando análises...")
+    with etapa('estatisticas'):
+        analise = cache_analises.construir(AgenteAnaliseDesmatamento(df, agregados), dataset_hash, ativar)
+    logger.debug("Análises disponíveis para o dataset %s", analise.dataset_hash[:12])
+    
+    # A matriz das estatísticas vai junto, para os outros processos a mapearem em memória
+    estatisticas = analise.agente.estatisticas
+    caminho = salvar_dataset(df, app.config['PASTA_DATASETS'], dataset_hash, nome_original,
+                             (estatisticas.series, estatisticas.valores), ativar)
+    logger.info("Dados carregados com sucesso (%d linhas) e salvos em: %s", len(df), caminho)
+    gerar_artefatos(analise)
+    
+    # Ajusta os modelos ARIMA em segundo plano para as consultas de previsão
+    servico_previsoes.solicitar(analise.dataset_hash, analise.agente.estatisticas, 'arima')
+    return analise
+
+def aplicar_atualizacao(novas, dataset_hash=None):
+    """Incorpora linhas novas ou corrigidas a uma versão do dataset (por padrão, a atual),
+    reaproveitando o que não mudou. A nova versão só passa a ser a atual se a de origem era.
+
+    Retorna (atualizacao, graficos_reaproveitados, respostas_mantidas).
+    """
+    with etapa('estatisticas'):
+        atualizacao = cache_analises.atualizar(novas, dataset_hash)
+    analise, anterior = atualizacao.analise, atualizacao.anterior
+    estatisticas = analise.agente.estatisticas
+    salvar_dataset(analise.df, app.config['PASTA_DATASETS'], analise.dataset_hash,
+                   ler_manifesto(os.path.join(app.config['PASTA_DATASETS'], anterior.dataset_hash)).get('nome_original'),
+                   (estatisticas.series, estatisticas.valores), atualizacao.ativada)
+    
+    # Gráficos e respostas que não dependem do que mudou passam para a nova versão
+    inalterados = set(TIPOS_GRAFICO) - atualizacao.graficos_afetados
+    graficos = servico_graficos.reaproveitar(anterior.dataset_hash, analise.dataset_hash, inalterados)
+    alteradas = set(atualizacao.series_alteradas)
+    
+    def resposta_valida(pergunta):
+        # Só perguntas sobre séries específicas que não mudaram, sem ano novo no dataset
+        citadas = set(analise.roteador.series_citadas(pergunta))
+        return bool(citadas) and not atualizacao.anos_novos \
+            and analise.agente.estatisticas.coluna_total not in alteradas and not citadas & alteradas
+    
+    mantidas = cache_respostas.migrar(anterior.dataset_hash, analise.dataset_hash, resposta_valida)
+    servico_previsoes.invalidar(anterior.dataset_hash)
+    servico_previsoes.solicitar(analise.dataset_hash, analise.agente.estatisticas, 'arima')
+    gerar_artefatos(analise)
+    return atualizacao, graficos, mantidas
+
+def gerar_artefatos(analise):
+    """Materializa os artefatos da versão do dataset (uma única vez) e retorna o índice.
+
+    Relatório, análise do agente, dados dos gráficos, previsão linear e a
+    página de resultado viram arquivos comprimidos servidos sem recálculo.
+    """
+    indice = armazem_artefatos.indice(analise.dataset_hash)
+    if indice is not None:
+        return indice
+    with etapa('gerar_artefatos'):
+        conteudos = {
+            'relatorio.txt': analise.analise_texto,
+            'analise.json': analise.agente.exportar_analise('json'),
+            'previsao.json': json.dumps(dict(analise.agente.prever().para_json(), dataset_hash=analise.dataset_hash),
+                                        ensure_ascii=False)
+        }
+        for tipo in DADOS_GRAFICOS:
+            conteudos[f'dados-{tipo}.json'] = json.dumps(analise.dados_grafico(tipo), ensure_ascii=False)
+        # Fora de uma requisição (monitor da pasta de dados), as URLs são montadas num contexto de teste
+        with nullcontext() if has_request_context() else app.test_request_context():
+            urls = {
+                nome: url_for('artefato', dataset_hash=analise.dataset_hash, arquivo=nome_arquivo(nome, conteudo))
+                for nome, conteudo in conteudos.items()
+            }
+            conteudos['resultado.html'] = render_template('resultado.html',
+                                                          analise=analise.analise_texto,
+                                                          analise_agente=analise.analise_agente,
+                                                          dataset_hash=analise.dataset_hash,
+                                                          artefatos=urls)
+        return armazem_artefatos.gravar(analise.dataset_hash, conteudos)
+
+def processar_arquivo_monitorado(caminho, conteudo_hash):
+    """Incorpora um CSV novo ou alterado da pasta monitorada e grava os alertas novos.
+
+    Se o arquivo só acrescenta anos ou corrige valores do dataset atual,
+    apenas as linhas diferentes passam pela atualização incremental; caso
+    contrário ele é carregado como uma nova versão completa.
+    """
+    inicio = time.perf_counter()
+    logger.info("👀 Alteração detectada em %s", caminho)
+    with etapa('carregar_csv'):
+        df, agregados = ler_csv(caminho)
+    anterior = cache_analises.obter()
+    novas = linhas_alteradas(anterior.df, df, anterior.agente.estatisticas.coluna_ano) if anterior is not None else None
+    if novas is not None and novas.empty:
+        logger.info("👀 Conteúdo igual ao dataset atual, nada a fazer")
+        armazem_alertas.registrar_arquivo(caminho, conteudo_hash, anterior.dataset_hash)
+        return
+    analise = None
+    if novas is not None:
         try:
-            if not perguntas_queue.empty():
-                pergunta_id, pergunta = perguntas_queue.get()
-                print(f"\n📝 Nova pergunta recebida: {pergunta}\n")
-                
-                try:
-                    # Obtém dados e análises
-                    df = agente.df
-                    analise_texto = analise_detalhada(df)
-                    analise_agente = agente.analisar_dados()
-                    
-                    # Verifica se a pergunta pede por uma imagem ou gráfico
-                    imagem_url = None
-                    if "gráfico" in pergunta.lower() or "grafico" in pergunta.lower():
-                        if "evolução" in pergunta.lower() or "evolucao" in pergunta.lower():
-                            imagem_url = gerar_grafico(df, "evolucao")
-                        elif "estados" in pergunta.lower():
-                            imagem_url = gerar_grafico(df, "estados")
-                        else:
-                            imagem_url = gerar_imagem(f"Gráfico mostrando {pergunta}")
-                    elif "imagem" in pergunta.lower() or "foto" in pergunta.lower():
-                        imagem_url = gerar_imagem(pergunta)
-                    
-                    # Prepara contexto para o ChatGPT
-                    contexto = f"""
-                    Você é o {agente.nome}, um especialista autônomo em análise de dados de desmatamento da Amazônia. {agente.descricao} Suas respostas devem ser baseadas nas análises fornecidas e devem ser claras e objetivas.
-                    
-                    Análise detalhada dos dados:
-                    {analise_texto}
-                    
-                    Análise do agente:
-                    {analise_agente}
-                    
-                    Pergunta: {pergunta}
-                    
-                    Por favor, responda de forma clara e objetiva, utilizando as análises fornecidas.
-                    """
-                    
-                    print("🤖 Enviando pergunta para o ChatGPT...")
-                    
-                    try:
-                        # Consulta o ChatGPT
-                        response = openai.ChatCompletion.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": f"Você é o {agente.nome}, um especialista autônomo em análise de dados de desmatamento da Amazônia. {agente.descricao} Suas respostas devem ser baseadas nas análises fornecidas e devem ser claras e objetivas."
-                                },
-                                {
-                                    "role": "user",
-                                    "content": contexto
-                                }
-                            ],
-                            temperature=0.7,
-                            max_tokens=1000
-                        )
-                        
-                        resposta = response.choices[0].message.content
-                        print(f"\n💬 Resposta do ChatGPT:\n{resposta}\n")
-                        
-                        # Se houver uma imagem, adiciona à resposta
-                        if imagem_url:
-                            if imagem_url.startswith('/static/'):
-                                # É um gráfico local
-                                resposta = f"{resposta}\n\n<img src='{imagem_url}' alt='Gráfico gerado' style='max-width: 100%; height: auto;'>"
-                            else:
-                                # É uma imagem do DALL-E
-                                resposta = f"{resposta}\n\n<img src='{imagem_url}' alt='Imagem gerada' style='max-width: 100%; height: auto;'>"
-                        
-                        # Armazena a resposta no dicionário global
-                        respostas_completas[pergunta_id] = resposta
-                        print("✅ Resposta armazenada em memória!")
-                            
-                    except Exception as e:
-                        erro_msg = f"Erro ao consultar ChatGPT: {str(e)}"
-                        print(f"\n❌ {erro_msg}\n")
-                        respostas_completas[pergunta_id] = erro_msg
-                        print("❌ Erro de consulta registrado em memória!")
-                            
-                except Exception as e:
-                    erro_msg = f"Erro ao processar pergunta: {str(e)}"
-                    print(f"\n❌ {erro_msg}\n")
-                    respostas_completas[pergunta_id] = erro_msg
-                    print("❌ Erro de processamento registrado em memória!")
-                            
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"\n❌ Erro na thread de processamento: {str(e)}\n")
-            time.sleep(0.5)
+            analise = aplicar_atualizacao(novas)[0].analise
+        except ValueError as e:
+            # Por exemplo, anos intermediários novos: recarrega o arquivo inteiro
+            logger.warning("⚠️ Atualização incremental recusada (%s), carregando o arquivo completo", e)
+    if analise is None:
+        analise = ativar_dataset(df, agregados, os.path.basename(caminho))
+    
+    alertas = analise.agente.monitorar_mudancas(anterior.agente if anterior is not None else None)
+    armazem_alertas.registrar(analise.dataset_hash, caminho, alertas)
+    armazem_alertas.registrar_arquivo(caminho, conteudo_hash, analise.dataset_hash)
+    logger.info("👀 Dataset %s ativo, %d alerta(s) novo(s) em %.1f ms",
+                analise.dataset_hash[:12], len(alertas), (time.perf_counter() - inicio) * 1000)
 
-# Inicia a thread de processamento
-thread_perguntas = threading.Thread(target=processar_perguntas, daemon=True)
-thread_perguntas.start()
+def processar_pergunta(pergunta_id, pergunta, dataset_hash=None, prazo=None):
+    """Processa uma pergunta da fila e retorna a resposta.
+    
+    ``prazo`` (em ``time.monotonic()``) é o limite dado pelo motor de perguntas:
+    passado esse instante a resposta seria descartada, então o trabalho é abandonado.
+    """
+    logger.debug("📝 Nova pergunta recebida: %s", pergunta)
+    
+    # Obtém dados e análises já calculadas para a versão do dataset consultada
+    analise = cache_analises.obter(dataset_hash)
+    if analise is None:
+        return "Erro ao processar pergunta: Agente não inicializado"
+    
+    # Verifica se a pergunta pede por uma imagem ou gráfico
+    imagem_url = None
+    if "gráfico" in pergunta.lower() or "grafico" in pergunta.lower():
+        if "evolução" in pergunta.lower() or "evolucao" in pergunta.lower():
+            imagem_url = gerar_grafico(analise.dataset_hash, "evolucao")
+        elif "estados" in pergunta.lower():
+            imagem_url = gerar_grafico(analise.dataset_hash, "estados")
+        else:
+            imagem_url = gerar_imagem(f"Gráfico mostrando {pergunta}", prazo)
+    elif "imagem" in pergunta.lower() or "foto" in pergunta.lower():
+        imagem_url = gerar_imagem(pergunta, prazo)
+    
+    modelo = app.config['MODELO_LLM']
+    temperatura = app.config['TEMPERATURA_LLM']
+    series = analise.roteador.series_citadas(pergunta)
+    
+    try:
+        # Perguntas factuais são respondidas direto das estatísticas, sem o ChatGPT
+        resposta = analise.roteador.responder(pergunta)
+        if resposta is not None:
+            logger.debug("📊 Resposta calculada a partir dos dados")
+        else:
+            resposta = cache_respostas.obter(analise.dataset_hash, pergunta, modelo, temperatura, series)
+            if resposta is not None:
+                logger.debug("⚡ Resposta obtida do cache")
+        if resposta is None:
+            logger.debug("🤖 Enviando pergunta para o ChatGPT...")
+            sessao = armazem_perguntas.sessao_da_pergunta(pergunta_id) if app.config['STREAM_TOKENS'] else None
+            
+            # Apenas as estatísticas relevantes para a pergunta, dentro do orçamento de tokens
+            with etapa('montar_prompt'):
+                mensagens, max_tokens, tokens_estimados = analise.construtor_prompt.montar(
+                    pergunta,
+                    orcamento=app.config['ORCAMENTO_PROMPT'],
+                    max_resposta=app.config['MAX_TOKENS_RESPOSTA']
+                )
+            
+            # Consulta o ChatGPT
+            uso = {}
+            inicio = time.perf_counter()
+            with etapa('chamada_llm'):
+                resposta = cliente_llm.completar(
+                    mensagens,
+                    temperatura=temperatura,
+                    max_tokens=max_tokens,
+                    ao_receber=transmissor_tokens(pergunta_id, sessao) if sessao else None,
+                    uso=uso,
+                    prazo=prazo
+                )
+            latencia = time.perf_counter() - inicio
+            tokens_prompt = uso.get('tokens_prompt', tokens_estimados)
+            tokens_resposta = uso.get('tokens_resposta', estimar_tokens(resposta))
+            registro_tokens.registrar(tokens_prompt, tokens_resposta, latencia)
+            armazem_perguntas.registrar_uso(pergunta_id, tokens_prompt, tokens_resposta, latencia * 1000)
+            logger.debug("📏 Tokens: %d no prompt, %d na resposta (%.0f ms)", tokens_prompt, tokens_resposta, latencia * 1000)
+            cache_respostas.armazenar(analise.dataset_hash, pergunta, modelo, temperatura, resposta, series)
+        logger.debug("💬 Resposta: %s", resposta)
+        
+        # Se houver uma imagem, adiciona à resposta
+        if imagem_url:
+            if imagem_url.startswith('/'):
+                # É um gráfico local
+                resposta = f"{resposta}\n\n<img src='{imagem_url}' alt='Gráfico gerado' style='max-width: 100%; height: auto;'>"
+            else:
+                # É uma imagem do DALL-E
+                resposta = f"{resposta}\n\n<img src='{imagem_url}' alt='Imagem gerada' style='max-width: 100%; height: auto;'>"
+        return resposta
+            
+    except CircuitoAberto:
+        logger.warning("⚠️ ChatGPT indisponível, circuito aberto")
+        return "O serviço de respostas está temporariamente indisponível. Tente novamente em instantes."
+    except Exception as e:
+        erro_msg = f"Erro ao consultar ChatGPT: {str(e)}"
+        logger.error("❌ Erro ao consultar ChatGPT: %s", e)
+        return erro_msg
+
+def transmissor_tokens(pergunta_id, sessao, intervalo=0.1):
+    """Cria o callback que repassa os tokens do ChatGPT à sessão via SSE em lotes"""
+    pendente = []
+    ultimo_envio = [time.monotonic()]
+    
+    def receber(texto):
+        pendente.append(texto)
+        if time.monotonic() - ultimo_envio[0] >= intervalo:
+            canal_respostas.publicar(sessao, 'parcial', {'id': pergunta_id, 'texto': ''.join(pendente)})
+            pendente.clear()
+            ultimo_envio[0] = time.monotonic()
+    return receber
+
+def armazenar_resposta(pergunta_id, resposta):
+    """Grava a resposta no banco e a envia às conexões da sessão"""
+    with etapa('atualizar_sessao'):
+        sessao = armazem_perguntas.registrar_resposta(pergunta_id, resposta)
+        if sessao is not None:
+            canal_respostas.publicar(sessao, 'resposta', {'id': pergunta_id, 'resposta': resposta})
+
+def perfilado(funcao, nome):
+    """Executa ``funcao`` sob o perfilador, quando ativo"""
+    if perfilador is None:
+        return funcao
+    
+    def executar(*args, **kwargs):
+        with perfilador.perfilar(nome):
+            return funcao(*args, **kwargs)
+    return executar
+
+# Inicia o pool de workers de perguntas
+fila_perguntas = None
+retransmissor_respostas = None
+if app.config['FILA_COMPARTILHADA']:
+    # Uma pergunta em execução além do timeout já foi expirada pelo dono: se
+    # ainda estiver reservada, o processo morreu e ela volta para a fila
+    fila_perguntas = FilaCompartilhada(armazem_perguntas, app.config['CAPACIDADE_FILA'],
+                                       prazo_orfas=2 * app.config['TIMEOUT_PERGUNTA'])
+    retransmissor_respostas = RetransmissorRespostas(canal_respostas, armazem_perguntas, fila_perguntas.dono)
+motor_perguntas = MotorPerguntas(
+    perfilado(processar_pergunta, 'pergunta'),
+    armazenar_resposta,
+    num_workers=app.config['WORKERS_PERGUNTAS'],
+    capacidade=app.config['CAPACIDADE_FILA'],
+    timeout=app.config['TIMEOUT_PERGUNTA'],
+    fila=fila_perguntas
+)
+# Monitor da pasta de dados: processa CSVs novos ou alterados em segundo plano
+monitor_dados = None
+if app.config['PASTA_MONITORADA'] and app.config['WORKER_ID'] == 0:
+    monitor_dados = MonitorDados(
+        app.config['PASTA_MONITORADA'],
+        processar_arquivo_monitorado,
+        hashes=armazem_alertas.hashes_processados(),
+        espera=app.config['ESPERA_MONITOR'],
+        intervalo_sondagem=app.config['INTERVALO_SONDAGEM']
+    )
+# Processos do pool de gráficos importam este módulo como __mp_main__ e não
+# devem iniciar os workers nem recarregar o dataset
+if __name__ != '__mp_main__':
+    motor_perguntas.iniciar()
+    if retransmissor_respostas is not None:
+        retransmissor_respostas.iniciar()
+    carregar_ultimo_dataset()
+    # Aplica os limites da pasta de gráficos já na partida, sem atrasá-la
+    threading.Thread(target=servico_graficos.coletar, name='coleta-graficos', daemon=True).start()
+    # Os processos dos pools (spawn) reimportam o app: sobem agora, e não na primeira requisição
+    servico_graficos.aquecer()
+    servico_previsoes.aquecer()
+    if app.config['AQUECER']:
+        aquecer()
+
+# Medidores lidos apenas quando /metrics é consultada; os que leem as métricas
+# do mesmo componente usam um único retrato por coleta
+metricas_motor = registro_metricas.instantaneo(motor_perguntas.metricas)
+metricas_llm = registro_metricas.instantaneo(cliente_llm.metricas)
+registro_metricas.medidor('agente_fila_profundidade', 'Perguntas aguardando um worker',
+                          lambda: metricas_motor()['profundidade_fila'])
+registro_metricas.medidor('agente_perguntas_em_execucao', 'Perguntas sendo processadas',
+                          lambda: metricas_motor()['em_execucao'])
+registro_metricas.medidor('agente_perguntas_total', 'Perguntas por desfecho',
+                          lambda: metricas_motor()['contadores'], 'counter', 'desfecho')
+registro_metricas.medidor('agente_cache_respostas_total', 'Consultas ao cache de respostas por resultado',
+                          lambda: {chave: valor for chave, valor in cache_respostas.metricas().items()
+                                   if chave in ('acertos', 'acertos_similares', 'falhas')}, 'counter', 'resultado')
+registro_metricas.medidor('agente_tokens_llm_total', 'Tokens enviados ao LLM e recebidos dele',
+                          lambda: {'prompt': registro_tokens.tokens_prompt, 'resposta': registro_tokens.tokens_resposta},
+                          'counter', 'tipo')
+registro_metricas.medidor('agente_llm_eventos_total', 'Chamadas ao LLM, agrupamentos, novas tentativas e falhas',
+                          lambda: {chave: valor for chave, valor in metricas_llm().items()
+                                   if chave not in ('max_concorrencia', 'em_andamento', 'circuito')}, 'counter', 'evento')
+registro_metricas.medidor('agente_llm_em_andamento', 'Chamadas ao LLM em andamento',
+                          lambda: metricas_llm()['em_andamento'])
+registro_metricas.medidor('agente_conexoes_sse', 'Conexões SSE abertas', canal_respostas.total_conexoes)
+registro_metricas.medidor('agente_datasets_memoria_bytes', 'Memória estimada das versões de dataset carregadas',
+                          lambda: cache_analises.metricas()['memoria_bytes'])
+registro_metricas.medidor('agente_graficos_em_renderizacao', 'Gráficos sendo renderizados',
+                          lambda: servico_graficos.metricas()['em_renderizacao'])
+registro_metricas.medidor('agente_memoria_residente_bytes', 'Memória residente do processo',
+                          lambda: memoria_processo()['residente_bytes'])
+registro_metricas.medidor('agente_logs_suprimidos_total', 'Registros de log descartados pelo limite de taxa',
+                          lambda: filtro_logs.suprimidos, 'counter')
+registro_metricas.medidor('agente_partida_segundos', 'Tempo até a aplicação ficar pronta',
+                          lambda: partida['tempo_ms'] / 1000)
+
+partida = {
+    'tempo_ms': (time.perf_counter() - INICIO_PARTIDA) * 1000,
+    'meta_ms': app.config['META_PARTIDA_MS'],
+    'aquecida': app.config['AQUECER']
+}
+if __name__ != '__mp_main__':
+    logger.info("🚀 Aplicação pronta em %.0f ms", partida['tempo_ms'])
+    if partida['tempo_ms'] > partida['meta_ms'] and not partida['aquecida']:
+        logger.warning("⚠️ Partida acima da meta de %.0f ms", partida['meta_ms'])
+    if monitor_dados is not None:
+        monitor_dados.iniciar()
+
+def encerrar(prazo=None):
+    """Encerramento gracioso do processo (chamado pelo servidor.py ao parar um worker).
+
+    Para o monitor, drena o motor de perguntas (as não concluídas no prazo
+    voltam para a fila compartilhada) e encerra os pools de processos.
+    Retorna True se todas as perguntas aceitas foram respondidas.
+    """
+    if prazo is None:
+        prazo = app.config['PRAZO_ENCERRAMENTO']
+    if monitor_dados is not None:
+        monitor_dados.parar()
+    concluido = motor_perguntas.encerrar(prazo)
+    if retransmissor_respostas is not None:
+        retransmissor_respostas.parar()
+    servico_graficos.encerrar()
+    servico_previsoes.encerrar()
+    logger.info("Processo %s encerrado%s", os.getpid(), '' if concluido else ' com perguntas devolvidas à fila')
+    return concluido
+
+# Rotas de conexão longa (SSE) ficam fora do histograma de tempos e do perfilador
+ROTAS_NAO_MEDIDAS = {'eventos_perguntas', 'static'}
+
+@app.before_request
+def iniciar_medicao():
+    if request.endpoint in ROTAS_NAO_MEDIDAS:
+        return
+    g.inicio_requisicao = time.perf_counter()
+    if perfilador is not None:
+        g.perfil = perfilador.iniciar()
+
+@app.after_request
+def registrar_medicao(response):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+        tempo_requisicoes.observar(time.perf_counter() - inicio, rota, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finalizar_perfil(erro=None):
+    marcador = g.pop('perfil', None)
+    if marcador is not None:
+        perfilador.finalizar(marcador, f'{request.method} {request.path}')
 
 @app.route('/')
 def index():
@@ -210,149 +597,374 @@ def index():
 
 @app.route('/perguntas')
 def perguntas():
-    """Rota para exibir e atualizar perguntas"""
+    """Rota para exibir e paginar o histórico de perguntas da sessão"""
+    ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     try:
-        print(f"\n🔍 Requisição para /perguntas. X-Requested-With: {request.headers.get('X-Requested-With')}\n")
-        respostas_sessao = session.get('respostas', [])
-        
-        # Itera sobre as perguntas na sessão e verifica se já temos a resposta completa
-        respostas_para_enviar = []
-        atualizou_sessao = False
-        # Precisamos de uma cópia para iterar, pois podemos modificar respostas_sessao
-        copia_respostas_sessao = list(respostas_sessao)
+        sessao = obter_sessao_id()
+        limite = min(max(request.args.get('limite', 50, type=int), 1), 200)
+        antes_de = request.args.get('antes')
+        registros, cursor = armazem_perguntas.listar(sessao, limite, antes_de)
         
-        # Mantemos a ordem original (mais antiga no topo, mais recente no final)
-        for p_id, pergunta, resposta_placeholder in copia_respostas_sessao:
-            # Corrige a verificação para usar pergunta_id
-            if p_id in respostas_completas:
-                resposta_real = respostas_completas.pop(p_id) # Usa p_id como chave
-                respostas_para_enviar.append({'pergunta': pergunta, 'resposta': resposta_real})
-                # Atualiza a sessão para refletir a resposta real
-                for i, (current_p_id, current_p, current_r) in enumerate(respostas_sessao):
-                    if current_p_id == p_id:
-                        respostas_sessao[i] = (current_p_id, current_p, resposta_real)
-                        atualizou_sessao = True
-                        break
-            else:
-                respostas_para_enviar.append({'pergunta': pergunta, 'resposta': resposta_placeholder})
-        
-        if atualizou_sessao:
-            session['respostas'] = respostas_sessao
-            session.modified = True
-            print("✅ Sessão atualizada com respostas completas!")
-
-        # Nao inverte mais aqui, pois o frontend vai adicionar no final e rolar para baixo
-        # respostas_para_enviar.reverse() 
+        # Mais antiga no topo, mais recente no final
+        respostas_para_enviar = [
+            {
+                'id': registro['id'],
+                'pergunta': registro['pergunta'],
+                'resposta': registro['resposta'] if registro['resposta'] is not None else PLACEHOLDER_RESPOSTA
+            }
+            for registro in registros
+        ]
         
         # Verifica se a requisição é uma chamada AJAX
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            print("✅ Backend detectou AJAX. Enviando JSON...")
-            response = jsonify(respostas_para_enviar)
-            response.headers['Content-Type'] = 'application/json'
-            return response
+        if ajax:
+            return jsonify({'perguntas': respostas_para_enviar, 'anteriores': cursor})
         
         # Se não for AJAX, renderiza o template completo
-        print("🌐 Backend não detectou AJAX. Renderizando HTML...")
-        return render_template('perguntas.html', respostas=respostas_para_enviar) # Passa o novo formato
+        return render_template('perguntas.html', respostas=respostas_para_enviar)
+    except ValueError:
+        # Cursor de paginação malformado
+        if ajax:
+            return jsonify({'error': 'Parâmetro "antes" inválido'}), 400
+        return render_template('perguntas.html', error='Parâmetro "antes" inválido')
     except Exception as e:
-        print(f"\n❌ Erro na rota /perguntas: {str(e)}\n")
+        logger.error("❌ Erro na rota /perguntas: %s", e)
         # Em caso de erro em requisição AJAX, retorna JSON de erro
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            print("❌ Erro na rota /perguntas (AJAX). Enviando JSON de erro...")
+        if ajax:
             return jsonify({'error': str(e)}), 500
         # Em caso de erro em requisição normal, renderiza o template com erro
-        print("❌ Erro na rota /perguntas (HTML). Renderizando HTML de erro...")
         return render_template('perguntas.html', error=str(e))
 
+@app.route('/perguntas/eventos')
+def eventos_perguntas():
+    """Canal SSE que entrega cada resposta assim que um worker a conclui"""
+    sessao = obter_sessao_id()
+    fila = canal_respostas.assinar(sessao)
+    
+    def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento, dados = fila.get(timeout=15)
+                except queue.Empty:
+                    # Comentário periódico mantém a conexão aberta em proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                yield formatar_sse(evento, dados)
+        finally:
+            canal_respostas.cancelar(sessao, fila)
+    
+    return Response(
+        stream_with_context(gerar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/perguntar', methods=['POST'])
 def perguntar():
     """Rota para receber novas perguntas"""
     try:
-        global agente
-        
-        if agente is None:
-            print("\n❌ Erro: Agente não inicializado\n")
+        dataset_hash = dataset_da_requisicao()
+        analise = cache_analises.obter(dataset_hash)
+        if analise is None:
+            if dataset_hash is not None:
+                return jsonify({'error': 'Dataset não encontrado'}), 404
+            logger.warning("❌ Erro: Agente não inicializado")
             return jsonify({'error': 'Agente não inicializado'}), 400
             
         pergunta = request.form.get('pergunta')
         if not pergunta:
-            print("\n❌ Erro: Pergunta vazia\n")
+            logger.debug("❌ Erro: Pergunta vazia")
             return jsonify({'error': 'Pergunta não fornecida'}), 400
             
-        # Gera ID único e armazena pergunta
-        pergunta_id = str(int(time.time())) # ID único para a pergunta
-        respostas = session.get('respostas', [])
-        respostas.append((pergunta_id, pergunta, "Aguarde, sua pergunta está sendo analisada...")) # Armazena ID, pergunta e placeholder
-        session['respostas'] = respostas
-        session.modified = True
-        
-        # Adiciona à fila
-        perguntas_queue.put((pergunta_id, pergunta))
-        print(f"\n📨 Pergunta adicionada à fila: {pergunta}\n")
+        # Registra a pergunta no banco (gera o ID) e adiciona à fila
+        pergunta_id = armazem_perguntas.registrar_pergunta(obter_sessao_id(), pergunta, analise.dataset_hash)
+        try:
+            motor_perguntas.submeter(pergunta_id, pergunta, analise.dataset_hash)
+        except FilaCheiaError:
+            armazem_perguntas.remover(pergunta_id)
+            logger.warning("⚠️ Fila de perguntas cheia, pergunta recusada")
+            response = jsonify({'error': 'Muitas perguntas em processamento. Tente novamente em instantes.'})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        logger.debug("📨 Pergunta adicionada à fila: %s", pergunta)
         
-        return jsonify({'status': 'success', 'message': 'Pergunta recebida com sucesso'})
+        return jsonify({'status': 'success', 'message': 'Pergunta recebida com sucesso', 'id': pergunta_id,
+                        'dataset': analise.dataset_hash})
     except Exception as e:
-        print(f"\n❌ Erro na rota /perguntar: {str(e)}\n")
+        logger.error("❌ Erro na rota /perguntar: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Rota para upload de arquivo CSV"""
-    global agente
-    print("Iniciando upload de arquivo...")
+    logger.debug("Iniciando upload de arquivo...")
     
     if 'file' not in request.files:
-        print("Nenhum arquivo encontrado na requisição")
+        logger.debug("Nenhum arquivo encontrado na requisição")
         return 'Nenhum arquivo selecionado', 400
         
     file = request.files['file']
     if file.filename == '':
-        print("Nome do arquivo vazio")
+        logger.debug("Nome do arquivo vazio")
         return 'Nenhum arquivo selecionado', 400
         
     if file and file.filename.endswith('.csv'):
-        print(f"Processando arquivo: {file.filename}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'prodes_desmatamento.csv')
-        file.save(filepath)
-        print(f"Arquivo salvo em: {filepath}")
-        
+        logger.info("Processando arquivo: %s", file.filename)
         try:
-            print("Carregando dados...")
-            df = carregar_dados()
-            print("Dados carregados com sucesso")
-            
-            print("Gerando análises...")
-            analise_geral(df)
-            plotar_evolucao_amazonia_legal(df)
-            plotar_estados_mais_afetados(df)
-            analise_correlacao(df)
-            previsao_futura(df)
+            logger.debug("Carregando dados...")
+            # Lê o upload em blocos e salva a versão em formato colunar
+            with etapa('carregar_csv'):
+                df, agregados = ler_csv(file.stream)
             
-            print("Inicializando agente...")
-            agente = AgenteAnaliseDesmatamento(df)
-            analise_agente = agente.analisar_dados()
-            print("Análise do agente concluída")
+            # O resumo descritivo só interessa à depuração (e é caro com muitas séries)
+            if logger.isEnabledFor(logging.DEBUG):
+                analise_geral(df)
             
-            print("Gerando análise detalhada...")
-            analise_texto = analise_detalhada(df)
+            # O envio só substitui o dataset atual do servidor se a sessão estava nele
+            origem, atual = dataset_da_requisicao(), cache_analises.obter()
+            ativar = origem is None or atual is None or origem == atual.dataset_hash
+            analise = ativar_dataset(df, agregados, file.filename, ativar)
+            # As perguntas desta sessão passam a consultar o dataset enviado
+            session['dataset'] = analise.dataset_hash
             
-            print("Renderizando template...")
-            return render_template('resultado.html', 
-                                 analise=analise_texto,
-                                 analise_agente=analise_agente)
+            # A página já foi gerada com os artefatos: recarregá-la não reenvia o arquivo
+            return redirect(url_for('resultado', dataset_hash=analise.dataset_hash), code=303)
         except Exception as e:
-            print(f"Erro durante o processamento: {str(e)}")
+            logger.error("Erro durante o processamento: %s", e)
             return f'Erro ao processar o arquivo: {str(e)}', 500
             
-    print("Arquivo inválido")
+    logger.debug("Arquivo inválido")
     return 'Arquivo inválido. Por favor, envie um arquivo CSV.', 400
 
+@app.route('/dados/anexar', methods=['POST'])
+def anexar_dados():
+    """Rota para anexar novos anos (ou corrigir anos existentes) sem reenviar o CSV completo"""
+    try:
+        inicio = time.perf_counter()
+        if 'file' in request.files:
+            with etapa('carregar_csv'):
+                novas, _ = ler_csv(request.files['file'].stream)
+        else:
+            dados = request.get_json(silent=True) or {}
+            if not dados.get('linhas'):
+                return jsonify({'error': 'Envie um CSV em "file" ou um JSON com "linhas"'}), 400
+            novas = pd.DataFrame(dados['linhas'])
+        
+        atualizacao, graficos, mantidas = aplicar_atualizacao(novas, dataset_da_requisicao())
+        analise = atualizacao.analise
+        if 'dataset' in session:
+            session['dataset'] = analise.dataset_hash
+        tempo_ms = (time.perf_counter() - inicio) * 1000
+        logger.info("📈 Dataset atualizado para %s em %.1f ms", analise.dataset_hash[:12], tempo_ms)
+        return jsonify({
+            'dataset_hash': analise.dataset_hash,
+            'dataset_anterior': atualizacao.anterior.dataset_hash,
+            'anos_novos': atualizacao.anos_novos,
+            'anos_corrigidos': atualizacao.anos_corrigidos,
+            'series_alteradas': atualizacao.series_alteradas,
+            'graficos_invalidados': sorted(atualizacao.graficos_afetados),
+            'graficos_reaproveitados': graficos,
+            'respostas_mantidas': mantidas,
+            'tempo_ms': tempo_ms
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("❌ Erro na rota /dados/anexar: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metricas')
+def metricas():
+    """Rota com as métricas do processamento de perguntas"""
+    return jsonify({
+        'perguntas': motor_perguntas.metricas(),
+        'cache_respostas': cache_respostas.metricas(),
+        'tokens_llm': registro_tokens.resumo(),
+        'llm': cliente_llm.metricas(),
+        'conexoes_sse': canal_respostas.total_conexoes(),
+        'datasets': cache_analises.metricas(),
+        'graficos': servico_graficos.metricas(),
+        'artefatos': armazem_artefatos.metricas(),
+        'memoria_processo': memoria_processo(),
+        'partida': partida,
+        'processo': {'pid': os.getpid(), 'worker': app.config['WORKER_ID'],
+                     'fila_compartilhada': app.config['FILA_COMPARTILHADA']},
+        'monitor': monitor_dados.metricas() if monitor_dados is not None else None
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Rota com as métricas no formato texto do Prometheus"""
+    return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/alertas')
+def alertas():
+    """Rota com os alertas gerados pelo monitoramento da pasta de dados"""
+    limite = min(max(request.args.get('limite', 50, type=int), 1), 500)
+    depois_de = request.args.get('depois', type=int)
+    return jsonify({'alertas': armazem_alertas.listar(limite, depois_de)})
+
+@app.route('/grafico/<dataset_hash>/<tipo>')
+def grafico(dataset_hash, tipo):
+    """Rota que serve gráficos do cache, renderizando-os se necessário"""
+    nivel = 'previa' if request.args.get('previa') else 'completo'
+    caminho_dataset = os.path.join(app.config['PASTA_DATASETS'], dataset_hash)
+    if tipo not in TIPOS_GRAFICO or not re.fullmatch(r'[0-9a-f]{40}', dataset_hash) \
+            or not os.path.isdir(caminho_dataset):
+        return 'Gráfico não encontrado', 404
+    try:
+        arquivo = servico_graficos.obter(dataset_hash, caminho_dataset, tipo, nivel,
+                                         timeout=app.config['TIMEOUT_PERGUNTA'])
+    except PrazoEsgotado:
+        logger.warning("Gráfico %s de %s não ficou pronto em %.1f s", tipo, dataset_hash[:12], app.config['TIMEOUT_PERGUNTA'])
+        return 'O gráfico ainda está sendo gerado. Tente novamente em instantes.', 503
+    except Exception as e:
+        logger.error("Erro ao renderizar gráfico: %s", e)
+        return 'Erro ao gerar gráfico', 500
+    # O conteúdo é imutável para cada (dataset, tipo, nível)
+    return send_file(os.path.abspath(arquivo), max_age=31536000)
+
+def nao_modificado(etag):
+    """Resposta 304 quando o cliente já tem a versão identificada pela ETag"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def responder_dados_grafico(analise, tipo, imutavel):
+    """Resposta JSON com ETag do gráfico, respondendo 304 se o cliente já o tiver"""
+    response = jsonify(analise.dados_grafico(tipo))
+    response.set_etag(f'{analise.dataset_hash}-{tipo}')
+    if imutavel:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def servir_artefato(dataset_hash, arquivo, imutavel):
+    """Serve a variante comprimida aceita pelo cliente, respondendo 304 pela ETag"""
+    aceitas = [codificacao for codificacao, _ in CODIFICACOES if request.accept_encodings[codificacao]]
+    encontrado = armazem_artefatos.localizar(dataset_hash, arquivo, aceitas)
+    if encontrado is None:
+        return 'Artefato não encontrado', 404
+    caminho, codificacao, tipo = encontrado
+    # O nome já contém o hash do conteúdo; a codificação distingue as variantes
+    etag = f'{arquivo}-{codificacao or "identity"}'
+    response = nao_modificado(etag)
+    if response is None:
+        if codificacao is None:
+            with open(caminho, 'rb') as f:
+                response = app.response_class(gzip.decompress(f.read()), content_type=tipo)
+        else:
+            response = send_file(os.path.abspath(caminho), mimetype=tipo, conditional=False, etag=False)
+            response.headers['Content-Encoding'] = codificacao
+        response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if imutavel else 'no-cache'
+    return response
+
+@app.route('/resultado/<dataset_hash>')
+def resultado(dataset_hash):
+    """Rota com a página de resultado pré-gerada de uma versão do dataset"""
+    indice = armazem_artefatos.indice(dataset_hash)
+    if indice is None:
+        # Versão anterior aos artefatos (ou gerada em outro processo ainda sem eles)
+        analise = cache_analises.obter(dataset_hash)
+        if analise is None:
+            return 'Dataset não encontrado', 404
+        indice = gerar_artefatos(analise)
+    # Endereço fixo por versão: revalidado a cada visita, mas sem recálculo
+    return servir_artefato(dataset_hash, indice['resultado.html']['arquivo'], imutavel=False)
+
+@app.route('/artefatos/<dataset_hash>/<arquivo>')
+def artefato(dataset_hash, arquivo):
+    """Rota com os artefatos pré-calculados, imutáveis (o nome muda com o conteúdo)"""
+    return servir_artefato(dataset_hash, arquivo, imutavel=True)
+
+@app.route('/api/dados/<tipo>')
+def dados_grafico_atual(tipo):
+    """Rota com os dados de um gráfico do dataset da sessão (ou do atual)"""
+    analise = cache_analises.obter(dataset_da_requisicao())
+    if analise is None:
+        return jsonify({'error': 'Nenhum dataset carregado'}), 404
+    if tipo not in DADOS_GRAFICOS:
+        return jsonify({'error': 'Gráfico não encontrado'}), 404
+    return nao_modificado(f'{analise.dataset_hash}-{tipo}') or \
+        responder_dados_grafico(analise, tipo, imutavel=False)
+
+@app.route('/api/dados/<dataset_hash>/<tipo>')
+def dados_grafico(dataset_hash, tipo):
+    """Rota com os dados de um gráfico de uma versão específica do dataset"""
+    if tipo not in DADOS_GRAFICOS:
+        return jsonify({'error': 'Gráfico não encontrado'}), 404
+    # A ETag depende só da versão e do tipo: revalidações não recalculam nada
+    response = nao_modificado(f'{dataset_hash}-{tipo}')
+    if response is not None:
+        return response
+    analise = cache_analises.obter(dataset_hash)
+    if analise is None:
+        return jsonify({'error': 'Dataset não encontrado'}), 404
+    return responder_dados_grafico(analise, tipo, imutavel=True)
+
+@app.route('/api/previsao')
+def previsao():
+    """Rota com a previsão das séries do dataset escolhido ou do atual (modelo linear ou ARIMA)"""
+    analise = cache_analises.obter(dataset_da_requisicao())
+    if analise is None:
+        return jsonify({'error': 'Nenhum dataset carregado'}), 404
+    modelo = request.args.get('modelo', 'linear')
+    horizonte = request.args.get('horizonte', 5, type=int)
+    confianca = request.args.get('confianca', 0.95, type=float)
+    estatisticas = analise.agente.estatisticas
+    series = [serie for serie in request.args.get('series', '').split(',') if serie]
+    if modelo not in MODELOS or not 1 <= horizonte <= 20 or not 0.5 <= confianca < 1:
+        return jsonify({'error': 'Parâmetros inválidos'}), 400
+    desconhecidas = [serie for serie in series if serie not in estatisticas.series]
+    if desconhecidas:
+        return jsonify({'error': f"Séries desconhecidas: {', '.join(desconhecidas)}"}), 404
+    try:
+        resultado = servico_previsoes.obter(analise.dataset_hash, estatisticas, modelo, horizonte, confianca,
+                                            timeout=app.config['TIMEOUT_PERGUNTA'])
+    except PrazoEsgotado:
+        logger.warning("Previsão %s de %s não ficou pronta em %.1f s", modelo, analise.dataset_hash[:12], app.config['TIMEOUT_PERGUNTA'])
+        return jsonify({'error': 'A previsão ainda está sendo calculada. Tente novamente em instantes.'}), 503
+    except Exception as e:
+        logger.error("Erro ao calcular previsão: %s", e)
+        return jsonify({'error': 'Erro ao calcular previsão'}), 500
+    return jsonify(dict(resultado.para_json(series or None), dataset_hash=analise.dataset_hash))
+
+@app.route('/api/consulta')
+def consulta():
+    """Soma, média, variação e extremos das séries escolhidas entre dois anos.
+
+    Parâmetros: ``series`` (separadas por vírgula; padrão, todos os estados),
+    ``inicio`` e ``fim`` (anos, inclusive; padrão, o período todo) e
+    ``medidas`` (soma, media, variacao, minimo, maximo).
+    """
+    analise = cache_analises.obter(dataset_da_requisicao())
+    if analise is None:
+        return jsonify({'error': 'Nenhum dataset carregado'}), 404
+    series = [serie for serie in request.args.get('series', '').split(',') if serie] or None
+    medidas = [medida for medida in request.args.get('medidas', '').split(',') if medida] or None
+    inicio = request.args.get('inicio', type=int)
+    fim = request.args.get('fim', type=int)
+    try:
+        resultado = analise.agente.estatisticas.consultar(series, inicio, fim, medidas)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(resultado, dataset_hash=analise.dataset_hash))
+
 @app.route('/imagem/<nome_arquivo>')
 def mostrar_imagem(nome_arquivo):
     """Rota para exibir imagens"""
     return send_file(nome_arquivo)
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento; em produção use servidor.py (vários processos)
     print("\nSistema de perguntas e respostas iniciado!")
     print("Aguardando perguntas...\n")
     app.run(debug=True) 
\ No newline at end of file
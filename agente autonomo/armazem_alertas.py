@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS alertas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset_hash TEXT NOT NULL,
+    origem TEXT,
+    tipo TEXT NOT NULL,
+    severidade TEXT,
+    descricao TEXT NOT NULL,
+    dados TEXT NOT NULL,
+    criado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alertas_criado ON alertas (criado_em);
+CREATE TABLE IF NOT EXISTS arquivos_monitorados (
+    caminho TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    dataset_hash TEXT,
+    processado_em REAL NOT NULL
+);
+"""
+
+
+class ArmazemAlertas:
+    """Alertas gerados pelo monitoramento e último hash processado de cada arquivo, em SQLite (WAL)"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._local = threading.local()
+        with self._conexao() as conexao:
+            conexao.executescript(ESQUEMA)
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexao = conexao
+        return conexao
+
+    def registrar(self, dataset_hash, origem, alertas):
+        """Grava os alertas de uma versão do dataset; retorna quantos foram gravados"""
+        agora = time.time()
+        with self._conexao() as conexao:
+            conexao.executemany(
+                'INSERT INTO alertas (dataset_hash, origem, tipo, severidade, descricao, dados, criado_em) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (dataset_hash, origem, alerta['tipo'], alerta.get('severidade'), alerta['descricao'],
+                     json.dumps(alerta, ensure_ascii=False, default=float), agora)
+                    for alerta in alertas
+                ]
+            )
+        return len(alertas)
+
+    def listar(self, limite=50, depois_de=None):
+        """Alertas mais recentes primeiro; ``depois_de`` filtra pelo ID (para consultas incrementais)"""
+        parametros = []
+        filtro = ''
+        if depois_de is not None:
+            filtro = 'WHERE id > ?'
+            parametros.append(depois_de)
+        parametros.append(limite)
+        linhas = self._conexao().execute(
+            f'SELECT id, dataset_hash, origem, dados, criado_em FROM alertas {filtro} ORDER BY id DESC LIMIT ?',
+            parametros
+        ).fetchall()
+        return [
+            dict(json.loads(linha['dados']), id=linha['id'], dataset_hash=linha['dataset_hash'],
+                 origem=linha['origem'], criado_em=linha['criado_em'])
+            for linha in linhas
+        ]
+
+    def hashes_processados(self):
+        """Último hash processado de cada arquivo monitorado"""
+        linhas = self._conexao().execute('SELECT caminho, hash FROM arquivos_monitorados').fetchall()
+        return {linha['caminho']: linha['hash'] for linha in linhas}
+
+    def registrar_arquivo(self, caminho, conteudo_hash, dataset_hash):
+        """Marca o conteúdo do arquivo como processado"""
+        with self._conexao() as conexao:
+            conexao.execute(
+                'INSERT OR REPLACE INTO arquivos_monitorados (caminho, hash, dataset_hash, processado_em) '
+                'VALUES (?, ?, ?, ?)',
+                (caminho, conteudo_hash, dataset_hash, time.time())
+            )
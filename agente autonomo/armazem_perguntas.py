@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS perguntas (
+    id TEXT PRIMARY KEY,
+    sessao TEXT NOT NULL,
+    pergunta TEXT NOT NULL,
+    resposta TEXT,
+    status TEXT NOT NULL DEFAULT 'pendente',
+    criada_em REAL NOT NULL,
+    respondida_em REAL,
+    tokens_prompt INTEGER,
+    tokens_resposta INTEGER,
+    latencia_ms REAL,
+    dataset_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_perguntas_sessao ON perguntas (sessao, criada_em);
+CREATE INDEX IF NOT EXISTS idx_perguntas_criada ON perguntas (criada_em);
+CREATE INDEX IF NOT EXISTS idx_perguntas_respondida ON perguntas (respondida_em);
+"""
+
+# Colunas acrescentadas depois da criação da tabela (uso do LLM, dataset
+# consultado e o processo que reservou a pergunta na fila compartilhada)
+COLUNAS_NOVAS = [
+    ('tokens_prompt', 'INTEGER'), ('tokens_resposta', 'INTEGER'), ('latencia_ms', 'REAL'), ('dataset_hash', 'TEXT'),
+    ('dono', 'TEXT'), ('iniciada_em', 'REAL')
+]
+
+# Índices parciais da fila: só as perguntas ainda não respondidas entram neles
+INDICES_FILA = (
+    "CREATE INDEX IF NOT EXISTS idx_perguntas_pendentes ON perguntas (criada_em) WHERE status = 'pendente'",
+    "CREATE INDEX IF NOT EXISTS idx_perguntas_em_execucao ON perguntas (dono) WHERE status = 'em_execucao'"
+)
+
+
+class ArmazemPerguntas:
+    """Perguntas e respostas persistidas em SQLite no modo WAL.
+
+    Cada thread usa sua própria conexão; o WAL permite que vários processos
+    leiam enquanto outro grava, de modo que as respostas sobrevivem a
+    reinícios e podem ser compartilhadas entre processos.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._local = threading.local()
+        with self._conexao() as conexao:
+            conexao.executescript(ESQUEMA)
+            # Bancos criados antes das colunas novas; a transação exclusiva impede
+            # que os processos do servidor.py, subindo juntos, migrem ao mesmo tempo
+            conexao.execute('BEGIN IMMEDIATE')
+            existentes = {linha['name'] for linha in conexao.execute('PRAGMA table_info(perguntas)')}
+            for coluna, tipo in COLUNAS_NOVAS:
+                if coluna not in existentes:
+                    conexao.execute(f'ALTER TABLE perguntas ADD COLUMN {coluna} {tipo}')
+            for indice in INDICES_FILA:
+                conexao.execute(indice)
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.row_factory = sqlite3.Row
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexao = conexao
+        return conexao
+
+    def registrar_pergunta(self, sessao, pergunta, dataset_hash=None):
+        """Grava uma nova pergunta pendente (sobre a versão do dataset informada) e retorna seu ID"""
+        pergunta_id = uuid.uuid4().hex
+        with self._conexao() as conexao:
+            conexao.execute(
+                'INSERT INTO perguntas (id, sessao, pergunta, criada_em, dataset_hash) VALUES (?, ?, ?, ?, ?)',
+                (pergunta_id, sessao, pergunta, time.time(), dataset_hash)
+            )
+        return pergunta_id
+
+    def registrar_resposta(self, pergunta_id, resposta, status='respondida'):
+        """Grava a resposta de uma pergunta e retorna a sessão dona dela (ou None)"""
+        with self._conexao() as conexao:
+            conexao.execute(
+                'UPDATE perguntas SET resposta = ?, status = ?, respondida_em = ? WHERE id = ?',
+                (resposta, status, time.time(), pergunta_id)
+            )
+        return self.sessao_da_pergunta(pergunta_id)
+
+    def registrar_uso(self, pergunta_id, tokens_prompt, tokens_resposta, latencia_ms):
+        """Grava os tokens e a latência da chamada ao LLM que respondeu a pergunta"""
+        with self._conexao() as conexao:
+            conexao.execute(
+                'UPDATE perguntas SET tokens_prompt = ?, tokens_resposta = ?, latencia_ms = ? WHERE id = ?',
+                (tokens_prompt, tokens_resposta, latencia_ms, pergunta_id)
+            )
+
+    def remover(self, pergunta_id):
+        """Remove uma pergunta (por exemplo, recusada por falta de espaço na fila)"""
+        with self._conexao() as conexao:
+            conexao.execute('DELETE FROM perguntas WHERE id = ?', (pergunta_id,))
+
+    def reservar(self, dono):
+        """Passa a pergunta pendente mais antiga para 'em_execucao' em nome do ``dono`` e a retorna (ou None).
+
+        A leitura e a marcação acontecem na mesma transação exclusiva, de modo
+        que dois processos nunca reservam a mesma pergunta.
+        """
+        conexao = self._conexao()
+        # Consulta sem bloqueio antes: workers ociosos não disputam a trava de escrita
+        if conexao.execute("SELECT 1 FROM perguntas WHERE status = 'pendente' LIMIT 1").fetchone() is None:
+            return None
+        with conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            linha = conexao.execute(
+                "SELECT id, pergunta, dataset_hash, criada_em FROM perguntas "
+                "WHERE status = 'pendente' ORDER BY criada_em LIMIT 1"
+            ).fetchone()
+            if linha is not None:
+                conexao.execute(
+                    "UPDATE perguntas SET status = 'em_execucao', dono = ?, iniciada_em = ? WHERE id = ?",
+                    (dono, time.time(), linha['id'])
+                )
+        return dict(linha) if linha else None
+
+    def pendentes(self):
+        """Número de perguntas aguardando na fila compartilhada"""
+        return self._conexao().execute("SELECT COUNT(*) FROM perguntas WHERE status = 'pendente'").fetchone()[0]
+
+    def devolver(self, dono=None, iniciadas_antes=None):
+        """Volta para 'pendente' as perguntas em execução do ``dono`` (ou de todos), opcionalmente
+        só as iniciadas antes do instante informado; retorna quantas foram devolvidas"""
+        filtros = ["status = 'em_execucao'"]
+        parametros = []
+        if dono is not None:
+            filtros.append('dono = ?')
+            parametros.append(dono)
+        if iniciadas_antes is not None:
+            filtros.append('iniciada_em < ?')
+            parametros.append(iniciadas_antes)
+        with self._conexao() as conexao:
+            cursor = conexao.execute(
+                f"UPDATE perguntas SET status = 'pendente', dono = NULL, iniciada_em = NULL WHERE {' AND '.join(filtros)}",
+                parametros
+            )
+        return cursor.rowcount
+
+    def donos_em_execucao(self):
+        """Processos com perguntas reservadas"""
+        linhas = self._conexao().execute(
+            "SELECT DISTINCT dono FROM perguntas WHERE status = 'em_execucao'"
+        ).fetchall()
+        return [linha['dono'] for linha in linhas]
+
+    def respostas_desde(self, instante, limite=500):
+        """Respostas gravadas depois do instante informado, da mais antiga para a mais nova"""
+        linhas = self._conexao().execute(
+            'SELECT id, sessao, resposta, dono, respondida_em FROM perguntas '
+            'WHERE respondida_em > ? ORDER BY respondida_em LIMIT ?',
+            (instante, limite)
+        ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def sessao_da_pergunta(self, pergunta_id):
+        """Retorna a sessão que fez a pergunta"""
+        linha = self._conexao().execute(
+            'SELECT sessao FROM perguntas WHERE id = ?', (pergunta_id,)
+        ).fetchone()
+        return linha['sessao'] if linha else None
+
+    def obter(self, pergunta_id):
+        """Retorna uma pergunta como dicionário ou None"""
+        linha = self._conexao().execute(
+            'SELECT * FROM perguntas WHERE id = ?', (pergunta_id,)
+        ).fetchone()
+        return dict(linha) if linha else None
+
+    def listar(self, sessao, limite=50, antes_de=None):
+        """Página do histórico da sessão, em ordem cronológica.
+
+        Retorna as ``limite`` perguntas mais recentes anteriores ao cursor
+        ``antes_de`` e o cursor para a página anterior (None se não houver).
+        O cursor ("criada_em:id") ordena pelo instante e desempata pelo ID,
+        de modo que perguntas criadas no mesmo instante não se perdem entre
+        páginas; um cursor só com o instante também é aceito.
+        """
+        parametros = [sessao]
+        filtro = ''
+        if antes_de is not None:
+            instante, _, pergunta_id = str(antes_de).partition(':')
+            filtro = 'AND (criada_em, id) < (?, ?)'
+            parametros += [float(instante), pergunta_id]
+        parametros.append(limite + 1)
+        linhas = self._conexao().execute(
+            f'SELECT id, pergunta, resposta, status, criada_em FROM perguntas '
+            f'WHERE sessao = ? {filtro} ORDER BY criada_em DESC, id DESC LIMIT ?',
+            parametros
+        ).fetchall()
+        cursor = None
+        if len(linhas) > limite:
+            ultima = linhas[limite - 1]
+            cursor = f"{ultima['criada_em']!r}:{ultima['id']}"
+        return [dict(linha) for linha in reversed(linhas[:limite])], cursor
@@ -0,0 +1,165 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+ARQUIVO_ATUAL = 'ATUAL'
+ARQUIVO_VALORES = 'valores.npy'
+
+
+def _gravar_atomico(caminho, conteudo):
+    """Grava um arquivo de texto substituindo o anterior de forma atômica"""
+    pasta = os.path.dirname(caminho) or '.'
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def salvar_dataset(df, diretorio_base, dataset_hash, nome_original=None, valores=None, ativar=True):
+    """Converte o DataFrame em arquivos .npy por coluna com um manifesto.
+
+    Cada versão fica em ``diretorio_base/<dataset_hash>``; se ela já existir,
+    nada é regravado. ``valores`` é um par opcional (colunas, matriz) com a
+    matriz float64 das séries usada pelas estatísticas, gravada junto para
+    ser mapeada em memória por ``carregar_valores``. Com ``ativar``, o
+    arquivo ``ATUAL`` passa a apontar para essa versão. Retorna o caminho
+    da versão salva.
+    """
+    os.makedirs(diretorio_base, exist_ok=True)
+    destino = os.path.join(diretorio_base, dataset_hash)
+
+    if not os.path.exists(os.path.join(destino, ARQUIVO_MANIFESTO)):
+        temporario = tempfile.mkdtemp(dir=diretorio_base, prefix='.tmp-')
+        try:
+            colunas = []
+            for i, nome in enumerate(df.columns):
+                serie = df[nome]
+                arquivo = f'{i:05d}.npy'
+                coluna = {'nome': str(nome), 'arquivo': arquivo, 'dtype': str(serie.dtype)}
+                if isinstance(serie.dtype, pd.CategoricalDtype):
+                    coluna['tipo'] = 'categoria'
+                    coluna['categorias'] = serie.cat.categories.tolist()
+                    coluna['ordenada'] = bool(serie.cat.ordered)
+                    np.save(os.path.join(temporario, arquivo), serie.cat.codes.to_numpy())
+                elif pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+                    coluna['tipo'] = 'numerico'
+                    np.save(os.path.join(temporario, arquivo), serie.to_numpy())
+                else:
+                    # Texto vira unicode de largura fixa, que também pode ser mapeado em memória
+                    coluna['tipo'] = 'texto'
+                    np.save(os.path.join(temporario, arquivo), serie.astype(str).to_numpy(dtype=str))
+                colunas.append(coluna)
+
+            manifesto = {
+                'hash': dataset_hash,
+                'nome_original': nome_original,
+                'linhas': len(df),
+                'colunas': colunas,
+                'criado_em': time.time()
+            }
+            if valores is not None:
+                series, matriz = valores
+                np.save(os.path.join(temporario, ARQUIVO_VALORES), np.asarray(matriz, dtype=np.float64))
+                manifesto['valores'] = {'arquivo': ARQUIVO_VALORES, 'colunas': [str(serie) for serie in series]}
+            with open(os.path.join(temporario, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, ensure_ascii=False, indent=2)
+            os.replace(temporario, destino)
+        except OSError:
+            shutil.rmtree(temporario, ignore_errors=True)
+            # Outro processo pode ter gravado a mesma versão ao mesmo tempo
+            if not os.path.exists(os.path.join(destino, ARQUIVO_MANIFESTO)):
+                raise
+
+    if ativar:
+        _gravar_atomico(os.path.join(diretorio_base, ARQUIVO_ATUAL), dataset_hash)
+    return destino
+
+
+def ler_manifesto(caminho):
+    """Lê o manifesto de uma versão salva"""
+    with open(os.path.join(caminho, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def carregar_dataset(caminho, mmap=True):
+    """Reconstrói o DataFrame de uma versão salva.
+
+    Com ``mmap=True`` as colunas numéricas são mapeadas em memória somente
+    para leitura, de modo que vários processos compartilham as mesmas páginas
+    em vez de cada um manter sua cópia.
+    """
+    manifesto = ler_manifesto(caminho)
+    modo = 'r' if mmap else None
+    dados = {}
+    for coluna in manifesto['colunas']:
+        valores = np.load(os.path.join(caminho, coluna['arquivo']), mmap_mode=modo)
+        if coluna['tipo'] == 'categoria':
+            dados[coluna['nome']] = pd.Categorical.from_codes(
+                valores, categories=coluna['categorias'], ordered=coluna['ordenada']
+            )
+        elif coluna['tipo'] == 'texto':
+            dados[coluna['nome']] = np.asarray(valores).astype(object)
+        else:
+            dados[coluna['nome']] = valores
+    return pd.DataFrame(dados, copy=False)
+
+
+def carregar_valores(caminho):
+    """Par (colunas, matriz) gravado com a versão, com a matriz mapeada em memória
+    somente para leitura; None se a versão foi salva sem ela"""
+    valores = ler_manifesto(caminho).get('valores')
+    if valores is None:
+        return None
+    return valores['colunas'], np.load(os.path.join(caminho, valores['arquivo']), mmap_mode='r')
+
+
+class PonteiroAtual:
+    """Versão apontada pelo arquivo ``ATUAL``, relido só quando é substituído.
+
+    Com vários processos (servidor.py), cada um segue a versão atual gravada
+    por qualquer outro sem reler o arquivo a cada consulta.
+    """
+
+    def __init__(self, diretorio_base):
+        self.caminho = os.path.join(diretorio_base, ARQUIVO_ATUAL)
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._hash = None
+
+    def ler(self):
+        """Hash da versão atual ou None se nenhuma foi salva"""
+        try:
+            estado = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        # _gravar_atomico troca o arquivo: inode e mtime mudam a cada gravação
+        assinatura = (estado.st_ino, estado.st_mtime_ns)
+        with self._lock:
+            if assinatura != self._assinatura:
+                try:
+                    with open(self.caminho, encoding='utf-8') as f:
+                        self._hash = f.read().strip() or None
+                except FileNotFoundError:
+                    return None
+                self._assinatura = assinatura
+            return self._hash
+
+
+def ultimo_dataset(diretorio_base):
+    """Retorna o caminho da versão mais recente salva ou None"""
+    try:
+        with open(os.path.join(diretorio_base, ARQUIVO_ATUAL), encoding='utf-8') as f:
+            dataset_hash = f.read().strip()
+    except FileNotFoundError:
+        return None
+    caminho = os.path.join(diretorio_base, dataset_hash)
+    if not os.path.exists(os.path.join(caminho, ARQUIVO_MANIFESTO)):
+        return None
+    return caminho
@@ -0,0 +1,140 @@
+"""Artefatos pré-calculados de cada versão do dataset, servidos como arquivos estáticos.
+
+Logo após a ingestão, tudo o que deriva de uma versão (relatório, análise do
+agente, dados dos gráficos, previsões e a página de resultado) é gravado já
+comprimido, com o hash do conteúdo no nome do arquivo. Como o nome muda
+sempre que o conteúdo muda, os arquivos podem ser servidos com cache de longa
+duração e nenhuma requisição precisa recalculá-los.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, apenas gzip
+    brotli = None
+
+ARQUIVO_INDICE = 'indice.json'
+
+TIPOS_CONTEUDO = {
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+    '.txt': 'text/plain; charset=utf-8'
+}
+
+# Codificações na ordem de preferência, com a extensão de cada variante
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+_NOME_ARQUIVO = re.compile(r'[\w-]+\.[0-9a-f]{16}\.\w+')
+_HASH_DATASET = re.compile(r'[0-9a-f]{40}')
+
+
+def _bytes(conteudo):
+    return conteudo.encode('utf-8') if isinstance(conteudo, str) else conteudo
+
+
+def nome_arquivo(nome, conteudo):
+    """Nome do arquivo com o hash do conteúdo: ``relatorio.txt`` -> ``relatorio.<hash>.txt``"""
+    base, extensao = os.path.splitext(nome)
+    return f'{base}.{hashlib.sha1(_bytes(conteudo)).hexdigest()[:16]}{extensao}'
+
+
+def _gravar_atomico(caminho, dados):
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'wb') as f:
+        f.write(dados)
+    os.replace(temporario, caminho)
+
+
+class ArmazemArtefatos:
+    """Arquivos comprimidos dos artefatos, uma pasta por versão do dataset.
+
+    Cada versão tem um ``indice.json`` (gravado por último) que associa o
+    nome lógico do artefato (``relatorio.txt``) ao arquivo com hash; a
+    presença do índice indica que os artefatos da versão estão completos.
+    """
+
+    def __init__(self, pasta, nivel_gzip=6, qualidade_brotli=9):
+        self.pasta = pasta
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+        self._lock = threading.Lock()
+        self._indices = {}
+        os.makedirs(pasta, exist_ok=True)
+
+    def _pasta_versao(self, dataset_hash):
+        if not _HASH_DATASET.fullmatch(dataset_hash):
+            raise ValueError(f"Hash de dataset inválido: {dataset_hash}")
+        return os.path.join(self.pasta, dataset_hash)
+
+    def indice(self, dataset_hash):
+        """Índice dos artefatos da versão, ou None se ainda não foram gerados"""
+        if not _HASH_DATASET.fullmatch(dataset_hash):
+            return None
+        with self._lock:
+            indice = self._indices.get(dataset_hash)
+        if indice is not None:
+            return indice
+        try:
+            with open(os.path.join(self._pasta_versao(dataset_hash), ARQUIVO_INDICE), encoding='utf-8') as f:
+                indice = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._indices[dataset_hash] = indice
+        return indice
+
+    def gravar(self, dataset_hash, conteudos):
+        """Grava os artefatos (nome lógico -> texto ou bytes) e retorna o índice da versão"""
+        pasta = self._pasta_versao(dataset_hash)
+        os.makedirs(pasta, exist_ok=True)
+        indice = {}
+        for nome, conteudo in conteudos.items():
+            dados = _bytes(conteudo)
+            arquivo = nome_arquivo(nome, dados)
+            caminho = os.path.join(pasta, arquivo)
+            item = {
+                'arquivo': arquivo,
+                'tipo': TIPOS_CONTEUDO.get(os.path.splitext(nome)[1], 'application/octet-stream'),
+                'tamanho': len(dados)
+            }
+            # Arquivos com o mesmo nome têm o mesmo conteúdo: não há o que regravar
+            if not os.path.exists(caminho + '.gz'):
+                # mtime fixo: a mesma entrada gera sempre os mesmos bytes
+                _gravar_atomico(caminho + '.gz', gzip.compress(dados, self.nivel_gzip, mtime=0))
+            item['tamanho_gzip'] = os.path.getsize(caminho + '.gz')
+            if brotli is not None:
+                if not os.path.exists(caminho + '.br'):
+                    _gravar_atomico(caminho + '.br', brotli.compress(dados, quality=self.qualidade_brotli))
+                item['tamanho_br'] = os.path.getsize(caminho + '.br')
+            indice[nome] = item
+        _gravar_atomico(os.path.join(pasta, ARQUIVO_INDICE), json.dumps(indice, indent=2).encode('utf-8'))
+        with self._lock:
+            self._indices[dataset_hash] = indice
+        return indice
+
+    def localizar(self, dataset_hash, arquivo, aceitas=('br', 'gzip')):
+        """Variante comprimida a servir: (caminho, codificação, tipo de conteúdo) ou None.
+
+        Quando o cliente não aceita nenhuma codificação, a codificação é None
+        e o caminho aponta para a variante gzip, a ser descomprimida.
+        """
+        if not _NOME_ARQUIVO.fullmatch(arquivo) or not _HASH_DATASET.fullmatch(dataset_hash):
+            return None
+        base = os.path.join(self.pasta, dataset_hash, arquivo)
+        tipo = TIPOS_CONTEUDO.get(os.path.splitext(arquivo)[1], 'application/octet-stream')
+        for codificacao, extensao in CODIFICACOES:
+            if codificacao in aceitas and os.path.exists(base + extensao):
+                return base + extensao, codificacao, tipo
+        if os.path.exists(base + '.gz'):
+            return base + '.gz', None, tipo
+        return None
+
+    def metricas(self):
+        """Versões com artefatos conhecidas em memória"""
+        with self._lock:
+            return {'versoes': len(self._indices), 'brotli': brotli is not None}
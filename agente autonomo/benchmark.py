@@ -0,0 +1,466 @@
+"""Benchmarks das análises e teste de carga do fluxo de perguntas.
+
+Microbenchmarks das funções de análise em datasets sintéticos de 9 a 10.000
+séries:
+
+    python benchmark.py micro --tamanhos 9,100,1000,10000 --saida micro.json
+
+Carga ponta a ponta (/perguntar → workers → resposta via SSE) com sessões
+concorrentes. Sem ``--url``, sobe o app e o LLM falso (``llm_falso.py``) em
+subprocessos, numa pasta temporária:
+
+    python benchmark.py carga --sessoes 20 --perguntas 10 --saida carga.json
+
+Comparação entre duas execuções (sai com código 1 se houver regressão):
+
+    python benchmark.py comparar base.json carga.json --tolerancia 0.1
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+CSV_PADRAO = os.path.join(PASTA, 'prodes_desmatamento.csv')
+
+# Perguntas da carga: factuais (respondidas pelas estatísticas) e abertas (LLM)
+PERGUNTAS_PADRAO = [
+    'Qual o total desmatado no PA?',
+    'Qual a média anual de desmatamento no MT?',
+    'Quais estados tiveram maior desmatamento?',
+    'Por que o desmatamento aumentou nos últimos anos?',
+    'Que políticas públicas ajudariam a reduzir o desmatamento no AM?',
+    'Compare a tendência recente do RO com a da Amazônia Legal.'
+]
+
+
+def dataset_sintetico(num_series, anos=range(1988, 2025), semente=0):
+    """DataFrame no formato do PRODES com ``num_series`` estados sintéticos e o total"""
+    gerador = np.random.default_rng(semente)
+    anos = np.asarray(list(anos))
+    base = gerador.lognormal(6, 1, size=num_series)
+    tendencia = gerador.normal(0, 0.03, size=num_series)
+    ruido = gerador.lognormal(0, 0.3, size=(len(anos), num_series))
+    valores = np.round(base * np.exp(np.outer(np.arange(len(anos)), tendencia)) * ruido)
+    largura = len(str(num_series))
+    df = pd.DataFrame(valores, columns=[f'E{i:0{largura}d}' for i in range(num_series)])
+    df.insert(0, 'Ano/Estados', anos)
+    df['AMZ LEGAL'] = valores.sum(axis=1)
+    return df
+
+
+def versao_codigo():
+    """Commit atual do repositório, se disponível"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def ambiente():
+    return {
+        'versao': versao_codigo(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def percentis(amostras_ms):
+    """p50/p95/p99, média e máximo de uma lista de tempos em ms"""
+    if not amostras_ms:
+        return None
+    valores = np.asarray(amostras_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'media': float(valores.mean()),
+        'max': float(valores.max()),
+        'amostras': len(valores)
+    }
+
+
+def salvar(resultado, saida):
+    print(json.dumps({chave: valor for chave, valor in resultado.items() if chave != 'resultados'},
+                     indent=2, ensure_ascii=False))
+    if saida:
+        with open(saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Resultados salvos em {saida}")
+
+
+# ---------------------------------------------------------------- microbenchmarks
+
+def medir(funcao, repeticoes, preparar=None):
+    """Tempos (ms) de ``repeticoes`` chamadas; ``preparar`` roda fora da medição e
+    seu retorno é passado à função"""
+    tempos = []
+    for _ in range(repeticoes):
+        argumento = preparar() if preparar is not None else None
+        inicio = time.perf_counter()
+        funcao(argumento) if preparar is not None else funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def microbenchmarks(tamanhos, repeticoes=3, graficos=True):
+    """Mede as funções de análise e de gráfico para cada número de séries"""
+    from analise_desmatamento import (carregar_dados, analise_detalhada, plotar_evolucao_amazonia_legal,
+                                      plotar_estados_mais_afetados, analise_correlacao, previsao_futura)
+    from agente_analise import AgenteAnaliseDesmatamento
+    from consultas import IndiceIntervalos
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for num_series in tamanhos:
+            caminho = os.path.join(pasta, f'sintetico_{num_series}.csv')
+            dataset_sintetico(num_series).to_csv(caminho, sep=';', index=False)
+            df = carregar_dados(caminho)
+            agente = AgenteAnaliseDesmatamento(df)
+            est = agente.estatisticas
+
+            casos = [
+                ('carregar_dados', lambda: carregar_dados(caminho), None),
+                ('analise_detalhada', lambda: analise_detalhada(df), None),
+                ('AgenteAnaliseDesmatamento', lambda: AgenteAnaliseDesmatamento(df), None),
+                # Agente novo a cada repetição: mede a análise completa, não a repetição deduplicada
+                ('analisar_dados', lambda novo: novo.analisar_dados(), lambda: AgenteAnaliseDesmatamento(df)),
+                ('analisar_dados (agente pronto)', lambda: agente.analisar_dados(), None),
+                ('IndiceIntervalos', lambda: IndiceIntervalos(est.anos, est.valores, est.series), None),
+                ('consultar (todas as séries)', lambda: est.consultar(est.series, 2004, 2012), None)
+            ]
+            if graficos:
+                imagem = os.path.join(pasta, 'grafico.png')
+                casos += [
+                    (funcao.__name__, lambda funcao=funcao: funcao(df, imagem), None)
+                    for funcao in (plotar_evolucao_amazonia_legal, plotar_estados_mais_afetados,
+                                   analise_correlacao, previsao_futura)
+                ]
+                # A primeira figura também paga a importação do matplotlib
+                plotar_evolucao_amazonia_legal(df, imagem)
+
+            for nome, funcao, preparar in casos:
+                tempos = medir(funcao, repeticoes, preparar)
+                resultados.append({
+                    'nome': nome,
+                    'series': num_series,
+                    'mediana_ms': float(np.median(tempos)),
+                    'min_ms': min(tempos),
+                    'amostras_ms': tempos
+                })
+                print(f"{nome:<32} {num_series:>6} séries  mediana {np.median(tempos):10.2f} ms  "
+                      f"mín {min(tempos):10.2f} ms")
+    return resultados
+
+
+# ---------------------------------------------------------------- carga
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def aguardar_servidor(url, processo=None, timeout=60):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo is not None and processo.poll() is not None:
+            raise RuntimeError(f'Processo encerrado antes de responder em {url}')
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise TimeoutError(f'{url} não respondeu em {timeout} s')
+
+
+def iniciar_servidores(pasta, latencia_llm, workers):
+    """Sobe o LLM falso e o app (sem o reloader do modo debug); retorna (url, processos)"""
+    porta_llm, porta_app = porta_livre(), porta_livre()
+    saida = open(os.path.join(pasta, 'servidores.log'), 'w')
+    llm = subprocess.Popen(
+        [sys.executable, os.path.join(PASTA, 'llm_falso.py'), '--porta', str(porta_llm),
+         '--latencia', str(latencia_llm)],
+        cwd=pasta, stdout=saida, stderr=subprocess.STDOUT
+    )
+    ambiente_app = dict(
+        os.environ,
+        PYTHONPATH=PASTA,
+        AGENTE_LLM_URL=f'http://127.0.0.1:{porta_llm}/v1',
+        AGENTE_PASTA_MONITORADA='',
+        AGENTE_WORKERS=str(workers)
+    )
+    app = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(porta_app), '--with-threads'],
+        cwd=pasta, env=ambiente_app, stdout=saida, stderr=subprocess.STDOUT
+    )
+    processos = [llm, app]
+    try:
+        aguardar_servidor(f'http://127.0.0.1:{porta_llm}/estatisticas', llm)
+        aguardar_servidor(f'http://127.0.0.1:{porta_app}/metricas', app)
+    except Exception:
+        parar_servidores(processos)
+        raise
+    return f'http://127.0.0.1:{porta_app}', processos
+
+
+def parar_servidores(processos):
+    for processo in processos:
+        processo.terminate()
+    for processo in processos:
+        try:
+            processo.wait(10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+
+def enviar_csv(url, caminho):
+    """Envia o CSV pelo /upload e retorna o hash do dataset ativado"""
+    fronteira = uuid.uuid4().hex
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    corpo = (
+        f'--{fronteira}\r\nContent-Disposition: form-data; name="file"; filename="{os.path.basename(caminho)}"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'
+    ).encode() + conteudo + f'\r\n--{fronteira}--\r\n'.encode()
+    requisicao = urllib.request.Request(f'{url}/upload', data=corpo,
+                                        headers={'Content-Type': f'multipart/form-data; boundary={fronteira}'})
+    with urllib.request.urlopen(requisicao, timeout=300) as resposta:
+        resposta.read()
+    with urllib.request.urlopen(f'{url}/metricas', timeout=10) as resposta:
+        return json.load(resposta)['datasets']['atual']
+
+
+class Sessao(threading.Thread):
+    """Usuário virtual: mantém uma conexão SSE e envia perguntas em sequência,
+    esperando cada resposta antes da próxima"""
+
+    def __init__(self, url, dataset_hash, perguntas, pausa, timeout, unicas):
+        super().__init__(daemon=True)
+        self.url = url
+        self.dataset_hash = dataset_hash
+        self.perguntas = perguntas
+        self.pausa = pausa
+        self.timeout = timeout
+        self.unicas = unicas
+        self.cliente = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.chegadas = {}
+        self.condicao = threading.Condition()
+        self.envio_ms = []
+        self.latencia_ms = []
+        self.recusadas = 0
+        self.erros = 0
+        self.sem_resposta = 0
+
+    def _ouvir(self, conexao):
+        """Registra o instante de chegada de cada resposta recebida pelo SSE"""
+        evento = None
+        try:
+            for linha in conexao:
+                linha = linha.decode('utf-8').rstrip('\r\n')
+                if linha.startswith('event:'):
+                    evento = linha[6:].strip()
+                elif linha.startswith('data:') and evento == 'resposta':
+                    dados = json.loads(linha[5:])
+                    with self.condicao:
+                        self.chegadas[dados['id']] = time.perf_counter()
+                        self.condicao.notify_all()
+        except (OSError, ValueError):
+            pass
+
+    def run(self):
+        # A conexão SSE também cria o cookie da sessão usado pelas perguntas. Ela
+        # não é fechada aqui: close() esperaria a leitura em andamento na outra
+        # thread (até o próximo keep-alive); cai quando o processo termina
+        conexao = self.cliente.open(f'{self.url}/perguntas/eventos', timeout=self.timeout + 30)
+        threading.Thread(target=self._ouvir, args=(conexao,), daemon=True).start()
+        for i, pergunta in enumerate(self.perguntas):
+            if self.unicas:
+                pergunta = f'{pergunta} ({self.name}-{i})'
+            self._perguntar(pergunta)
+            if self.pausa:
+                time.sleep(self.pausa)
+
+    def _perguntar(self, pergunta):
+        corpo = urllib.parse.urlencode({'pergunta': pergunta, 'dataset': self.dataset_hash}).encode()
+        inicio = time.perf_counter()
+        try:
+            with self.cliente.open(f'{self.url}/perguntar', data=corpo, timeout=self.timeout) as resposta:
+                pergunta_id = json.load(resposta)['id']
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                self.recusadas += 1
+                time.sleep(float(e.headers.get('Retry-After', 1)))
+            else:
+                self.erros += 1
+            return
+        except OSError:
+            self.erros += 1
+            return
+        self.envio_ms.append((time.perf_counter() - inicio) * 1000)
+        with self.condicao:
+            if not self.condicao.wait_for(lambda: pergunta_id in self.chegadas, self.timeout):
+                self.sem_resposta += 1
+                return
+            self.latencia_ms.append((self.chegadas[pergunta_id] - inicio) * 1000)
+
+
+def teste_carga(url, dataset_hash, sessoes, perguntas_por_sessao, perguntas=PERGUNTAS_PADRAO, pausa=0.0,
+                timeout=60.0, unicas=True):
+    """Roda as sessões concorrentes e resume latências e vazão"""
+    usuarios = [
+        Sessao(url, dataset_hash, [perguntas[(s + i) % len(perguntas)] for i in range(perguntas_por_sessao)],
+               pausa, timeout, unicas)
+        for s in range(sessoes)
+    ]
+    inicio = time.perf_counter()
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    duracao = time.perf_counter() - inicio
+
+    latencias = [t for usuario in usuarios for t in usuario.latencia_ms]
+    with urllib.request.urlopen(f'{url}/metricas', timeout=10) as resposta:
+        metricas_servidor = json.load(resposta)
+    return {
+        'duracao_s': duracao,
+        'concluidas': len(latencias),
+        'perguntas_por_segundo': len(latencias) / duracao if duracao else 0.0,
+        'latencia_ms': percentis(latencias),
+        'envio_ms': percentis([t for usuario in usuarios for t in usuario.envio_ms]),
+        'recusadas': sum(usuario.recusadas for usuario in usuarios),
+        'sem_resposta': sum(usuario.sem_resposta for usuario in usuarios),
+        'erros': sum(usuario.erros for usuario in usuarios),
+        'metricas_servidor': metricas_servidor
+    }
+
+
+# ---------------------------------------------------------------- comparação
+
+def indicadores(resultado):
+    """Indicadores comparáveis de um resultado: nome -> (valor, maior_é_melhor)"""
+    if resultado['tipo'] == 'micro':
+        return {f"{item['nome']} [{item['series']}]": (item['mediana_ms'], False)
+                for item in resultado['resultados']}
+    carga = resultado['resultados']
+    valores = {'perguntas_por_segundo': (carga['perguntas_por_segundo'], True)}
+    for campo in ('latencia_ms', 'envio_ms'):
+        for percentil in ('p50', 'p95', 'p99'):
+            if carga[campo]:
+                valores[f'{campo} {percentil}'] = (carga[campo][percentil], False)
+    return valores
+
+
+def comparar(base, novo, tolerancia=0.1):
+    """Imprime a variação de cada indicador; retorna os que pioraram além da tolerância"""
+    if base['tipo'] != novo['tipo']:
+        raise ValueError('Resultados de tipos diferentes')
+    antes, depois = indicadores(base), indicadores(novo)
+    regressoes = []
+    print(f"{base['ambiente'].get('versao')} → {novo['ambiente'].get('versao')}")
+    for nome in [nome for nome in antes if nome in depois]:
+        (valor_antes, maior_melhor), (valor_depois, _) = antes[nome], depois[nome]
+        if not valor_antes:
+            continue
+        variacao = valor_depois / valor_antes - 1
+        piorou = -variacao > tolerancia if maior_melhor else variacao > tolerancia
+        if piorou:
+            regressoes.append(nome)
+        print(f"{'REGRESSÃO' if piorou else '':<10} {nome:<48} {valor_antes:12.2f} → {valor_depois:12.2f} "
+              f"({variacao:+.1%})")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks do agente de análise de desmatamento')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    micro = comandos.add_parser('micro', help='microbenchmarks das funções de análise')
+    micro.add_argument('--tamanhos', default='9,100,1000,10000', help='números de séries, separados por vírgula')
+    micro.add_argument('--repeticoes', type=int, default=3)
+    micro.add_argument('--sem-graficos', action='store_true', help='não mede as funções de gráfico')
+    micro.add_argument('--saida', help='arquivo JSON com os resultados')
+
+    carga = comandos.add_parser('carga', help='teste de carga ponta a ponta com o LLM falso')
+    carga.add_argument('--url', help='app já em execução (sem isto, app e LLM falso são iniciados)')
+    carga.add_argument('--csv', default=CSV_PADRAO, help='dataset enviado antes da carga')
+    carga.add_argument('--series', type=int, help='usa um dataset sintético com este número de séries')
+    carga.add_argument('--sessoes', type=int, default=10, help='sessões concorrentes')
+    carga.add_argument('--perguntas', type=int, default=10, help='perguntas por sessão')
+    carga.add_argument('--pausa', type=float, default=0.0, help='segundos entre perguntas de uma sessão')
+    carga.add_argument('--latencia-llm', type=float, default=0.5, help='latência do LLM falso, em segundos')
+    carga.add_argument('--workers', type=int, default=4, help='workers de perguntas do app iniciado')
+    carga.add_argument('--timeout', type=float, default=60.0)
+    carga.add_argument('--repetidas', action='store_true',
+                       help='não torna as perguntas únicas (mede também o cache de respostas)')
+    carga.add_argument('--saida', help='arquivo JSON com os resultados')
+
+    comparacao = comandos.add_parser('comparar', help='compara dois arquivos de resultados')
+    comparacao.add_argument('base')
+    comparacao.add_argument('novo')
+    comparacao.add_argument('--tolerancia', type=float, default=0.1, help='piora relativa aceita (0.1 = 10%%)')
+
+    args = parser.parse_args()
+
+    if args.comando == 'micro':
+        tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',')]
+        salvar({
+            'tipo': 'micro',
+            'ambiente': ambiente(),
+            'parametros': {'tamanhos': tamanhos, 'repeticoes': args.repeticoes, 'graficos': not args.sem_graficos},
+            'resultados': microbenchmarks(tamanhos, args.repeticoes, not args.sem_graficos)
+        }, args.saida)
+
+    elif args.comando == 'carga':
+        with tempfile.TemporaryDirectory() as pasta:
+            processos = []
+            url = args.url
+            if url is None:
+                url, processos = iniciar_servidores(pasta, args.latencia_llm, args.workers)
+            try:
+                csv = args.csv
+                if args.series:
+                    csv = os.path.join(pasta, f'sintetico_{args.series}.csv')
+                    dataset_sintetico(args.series).to_csv(csv, sep=';', index=False)
+                dataset_hash = enviar_csv(url, csv)
+                resultados = teste_carga(url, dataset_hash, args.sessoes, args.perguntas, pausa=args.pausa,
+                                         timeout=args.timeout, unicas=not args.repetidas)
+            finally:
+                parar_servidores(processos)
+        parametros = {chave: valor for chave, valor in vars(args).items() if chave not in ('comando', 'saida')}
+        salvar({'tipo': 'carga', 'ambiente': ambiente(), 'parametros': parametros,
+                'resultados': resultados}, args.saida)
+        print(json.dumps({chave: valor for chave, valor in resultados.items() if chave != 'metricas_servidor'},
+                         indent=2, ensure_ascii=False))
+
+    else:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.novo, encoding='utf-8') as f:
+            novo = json.load(f)
+        if comparar(base, novo, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from agente_analise import AgenteAnaliseDesmatamento
+from analise_desmatamento import analise_detalhada, graficos_afetados, DADOS_GRAFICOS
+from roteador_intencoes import RoteadorIntencoes
+from construtor_prompt import ConstrutorPrompt
+from consultas import detectar_esquema
+
+
+def hash_dataset(df):
+    """Calcula um hash do conteúdo do DataFrame (colunas e valores).
+
+    Colunas numéricas entram como float64: os mesmos dados lidos do CSV
+    (inteiros reduzidos por ``otimizar_tipos``) ou montados a partir da
+    matriz das estatísticas têm o mesmo hash.
+    """
+    numericas = df.select_dtypes('number').columns
+    if len(numericas):
+        df = df.astype({coluna: np.float64 for coluna in numericas})
+    h = hashlib.sha1()
+    h.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def linhas_alteradas(anterior, novo, coluna_ano=None):
+    """Linhas de ``novo`` com anos novos ou valores diferentes de ``anterior``.
+
+    A coluna de ano é detectada em ``anterior`` (``consultas.detectar_esquema``)
+    quando não informada. Retorna None quando a diferença não pode ser
+    aplicada incrementalmente (colunas diferentes, anos repetidos ou
+    removidos, valores apagados).
+    """
+    if set(novo.columns) != set(anterior.columns):
+        return None
+    if coluna_ano is None:
+        coluna_ano = detectar_esquema(anterior).coluna_ano
+    anos_novo = pd.Index(novo[coluna_ano].to_numpy().astype(np.int64))
+    if not anos_novo.is_unique:
+        return None
+    posicoes = anos_novo.get_indexer(anterior[coluna_ano].to_numpy().astype(np.int64))
+    if (posicoes < 0).any():
+        return None
+
+    series = [coluna for coluna in anterior.columns if coluna != coluna_ano]
+    valores_novo = novo[series].to_numpy(dtype=np.float64)
+    antigos = anterior[series].to_numpy(dtype=np.float64)
+    comuns = valores_novo[posicoes]
+    if (np.isnan(comuns) & ~np.isnan(antigos)).any():
+        return None
+    mudou = ((comuns != antigos) & ~(np.isnan(comuns) & np.isnan(antigos))).any(axis=1)
+    selecionadas = np.ones(len(novo), dtype=bool)
+    selecionadas[posicoes] = mudou
+    return novo.iloc[np.flatnonzero(selecionadas)]
+
+
+class AnaliseDataset:
+    """Análises derivadas de uma versão do dataset, compartilhadas somente para leitura"""
+
+    def __init__(self, dataset_hash, agente, analise_texto, analise_agente):
+        self.dataset_hash = dataset_hash
+        self.agente = agente
+        self.df = agente.df
+        self.analise_texto = analise_texto
+        self.analise_agente = analise_agente
+        self.roteador = RoteadorIntencoes(agente.estatisticas)
+        self.construtor_prompt = ConstrutorPrompt(agente, self.roteador, analise_agente)
+        self.criado_em = time.time()
+        self._dados_graficos = {}
+        # Estimativa da memória ocupada pela versão (DataFrame e matriz das estatísticas)
+        self.memoria = int(self.df.memory_usage(index=True, deep=True).sum()) + agente.estatisticas._buffer.nbytes
+
+    def dados_grafico(self, tipo):
+        """Dados de um gráfico para o navegador, calculados uma vez por versão"""
+        dados = self._dados_graficos.get(tipo)
+        if dados is None:
+            dados = DADOS_GRAFICOS[tipo](self.df, self.agente.estatisticas)
+            self._dados_graficos[tipo] = dados
+        return dados
+
+
+class AtualizacaoDataset:
+    """Resultado de uma atualização incremental: a nova versão e o que mudou"""
+
+    def __init__(self, analise, anterior, series_alteradas, anos_novos, anos_corrigidos, graficos_afetados,
+                 ativada=False):
+        self.analise = analise
+        self.anterior = anterior
+        # A nova versão passou a ser a atual (a de origem era a atual)
+        self.ativada = ativada
+        self.series_alteradas = series_alteradas
+        self.anos_novos = anos_novos
+        self.anos_corrigidos = anos_corrigidos
+        self.graficos_afetados = graficos_afetados
+
+
+class CacheAnalises:
+    """Registro das análises por versão do dataset, calculadas uma única vez por versão.
+
+    Vários datasets (de equipes diferentes ou versões de um mesmo dataset)
+    ficam em memória ao mesmo tempo, identificados pelo hash. Quando a
+    memória estimada passa de ``orcamento_bytes``, as versões usadas há mais
+    tempo saem da memória; se ``carregador`` for informado, uma versão
+    removida (ou salva por outro processo) é recarregada do disco na
+    próxima consulta. ``obter()`` sem hash retorna o dataset atual (o último
+    ativado), usado por quem não escolhe um dataset; com ``atual``, função
+    que retorna o hash da versão atual (por exemplo, ``PonteiroAtual.ler``
+    quando vários processos compartilham os datasets salvos), ele é
+    resolvido por ela a cada consulta.
+    """
+
+    def __init__(self, orcamento_bytes=None, carregador=None, atual=None):
+        self.orcamento_bytes = orcamento_bytes
+        self.carregador = carregador
+        self.atual = atual
+        self._lock = threading.Lock()
+        self._lock_atualizacao = threading.Lock()
+        self._entradas = OrderedDict()
+        self._carregando = {}
+        self._atual = None
+        self._contadores = {'acertos': 0, 'recarregados': 0, 'removidos': 0}
+
+    def _registrar(self, analise, ativar):
+        """Guarda a versão no registro e remove as menos usadas acima do orçamento"""
+        with self._lock:
+            self._entradas[analise.dataset_hash] = analise
+            self._entradas.move_to_end(analise.dataset_hash)
+            if ativar:
+                self._atual = analise.dataset_hash
+            if self.orcamento_bytes is None:
+                return
+            uso = sum(entrada.memoria for entrada in self._entradas.values())
+            for dataset_hash in list(self._entradas):
+                if uso <= self.orcamento_bytes:
+                    break
+                # A versão recém-registrada e a atual nunca são removidas
+                if dataset_hash in (analise.dataset_hash, self._atual):
+                    continue
+                uso -= self._entradas.pop(dataset_hash).memoria
+                self._contadores['removidos'] += 1
+
+    def _hash_atual(self):
+        """Hash do dataset atual, resolvido por ``atual`` quando informada"""
+        dataset_hash = self.atual() if self.atual is not None else None
+        with self._lock:
+            if dataset_hash is not None:
+                # Outro processo pode ter trocado a versão atual
+                self._atual = dataset_hash
+            return self._atual
+
+    def construir(self, agente, dataset_hash=None, ativar=True):
+        """Gera (ou reaproveita) as análises para o dataset do agente"""
+        if dataset_hash is None:
+            dataset_hash = hash_dataset(agente.df)
+        with self._lock:
+            analise = self._entradas.get(dataset_hash)
+        if analise is None:
+            analise = AnaliseDataset(
+                dataset_hash,
+                agente,
+                analise_detalhada(agente.df, agente.estatisticas),
+                agente.analisar_dados()
+            )
+        self._registrar(analise, ativar)
+        return analise
+
+    def atualizar(self, novas, dataset_hash=None):
+        """Incorpora novas linhas (ou correções de anos existentes) a uma versão do dataset.
+
+        Sem ``dataset_hash``, atualiza o dataset atual. As estatísticas são
+        ajustadas apenas pelas linhas recebidas e os dados dos gráficos que
+        não mudaram são reaproveitados pela nova versão, que passa a ser a
+        atual se a versão de origem era.
+        """
+        with self._lock_atualizacao:
+            anterior = self.obter(dataset_hash)
+            if anterior is None:
+                raise ValueError("Nenhum dataset carregado" if dataset_hash is None
+                                 else f"Dataset não encontrado: {dataset_hash}")
+            estatisticas, alteradas, anos_novos, anos_corrigidos = anterior.agente.estatisticas.atualizar(novas)
+
+            # O DataFrame da nova versão é uma visão sobre a matriz das estatísticas
+            df = pd.DataFrame(estatisticas.valores, columns=estatisticas.series, copy=False)
+            df.insert(0, estatisticas.coluna_ano, estatisticas.anos)
+            agente = AgenteAnaliseDesmatamento(df, estatisticas=estatisticas)
+            analise = AnaliseDataset(
+                hash_dataset(df),
+                agente,
+                analise_detalhada(df, estatisticas),
+                agente.analisar_dados()
+            )
+            afetados = graficos_afetados(estatisticas, alteradas, anos_novos)
+            for tipo, dados in anterior._dados_graficos.items():
+                if tipo not in afetados:
+                    analise._dados_graficos[tipo] = dados
+
+            ativada = self._hash_atual() == anterior.dataset_hash
+            self._registrar(analise, ativar=ativada)
+        return AtualizacaoDataset(analise, anterior, alteradas, anos_novos, anos_corrigidos, afetados, ativada)
+
+    def obter(self, dataset_hash=None):
+        """Retorna as análises da versão (ou do dataset atual), recarregando-a do disco se preciso.
+
+        Retorna None se a versão não existir ou nenhum dataset foi carregado.
+        """
+        if dataset_hash is None:
+            dataset_hash = self._hash_atual()
+            if dataset_hash is None:
+                return None
+        with self._lock:
+            analise = self._entradas.get(dataset_hash)
+            if analise is not None:
+                self._entradas.move_to_end(dataset_hash)
+                self._contadores['acertos'] += 1
+                return analise
+            if self.carregador is None:
+                return None
+            # Consultas simultâneas da mesma versão compartilham uma única carga
+            lock = self._carregando.setdefault(dataset_hash, threading.Lock())
+
+        with lock:
+            with self._lock:
+                analise = self._entradas.get(dataset_hash)
+            if analise is None:
+                agente = self.carregador(dataset_hash)
+                if agente is not None:
+                    analise = self.construir(agente, dataset_hash, ativar=False)
+                    with self._lock:
+                        self._contadores['recarregados'] += 1
+        with self._lock:
+            self._carregando.pop(dataset_hash, None)
+        return analise
+
+    def invalidar(self, dataset_hash=None):
+        """Descarta as análises de uma versão (por padrão, a atual)"""
+        with self._lock:
+            dataset_hash = dataset_hash or self._atual
+            self._entradas.pop(dataset_hash, None)
+            if dataset_hash == self._atual:
+                self._atual = None
+
+    def metricas(self):
+        """Versões em memória, memória estimada e contadores de acertos, recargas e remoções"""
+        with self._lock:
+            return {
+                'datasets': len(self._entradas),
+                'atual': self._atual,
+                'memoria_bytes': int(sum(entrada.memoria for entrada in self._entradas.values())),
+                'analises_no_historico': sum(len(entrada.agente.historico_analises) for entrada in self._entradas.values()),
+                'orcamento_bytes': self.orcamento_bytes,
+                **self._contadores
+            }
@@ -0,0 +1,154 @@
+import difflib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+
+def normalizar_pergunta(texto):
+    """Normaliza a pergunta: sem acentos, minúsculas, sem pontuação e espaços repetidos"""
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto.lower())
+    return ' '.join(texto.split())
+
+
+def _assinatura(normalizada, series):
+    """Números e séries citados: perguntas parecidas só compartilham a resposta se coincidirem"""
+    return tuple(re.findall(r'\d+', normalizada)), frozenset(series)
+
+
+class CacheRespostas:
+    """Cache LRU com TTL das respostas do LLM.
+
+    A chave é (hash do dataset, pergunta normalizada, modelo, temperatura).
+    Com ``limiar_similaridade`` entre 0 e 1, uma pergunta sem entrada exata
+    pode reaproveitar a resposta de outra com texto normalizado parecido,
+    considerando apenas entradas do mesmo dataset, modelo e temperatura e
+    que citem os mesmos números e as mesmas séries (``series`` em ``obter``
+    e ``armazenar``): "desmatamento no PA em 2020" não responde por 2021.
+    """
+
+    def __init__(self, capacidade=1000, ttl=3600, limiar_similaridade=None):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.limiar_similaridade = limiar_similaridade
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        # Perguntas normalizadas por (dataset, modelo, temperatura), para a busca por similaridade
+        self._grupos = defaultdict(set)
+        self._contadores = {
+            'acertos': 0,
+            'acertos_similares': 0,
+            'falhas': 0,
+            'expiradas': 0,
+            'removidas': 0
+        }
+
+    def _remover(self, chave):
+        del self._entradas[chave]
+        dataset_hash, normalizada, modelo, temperatura = chave
+        grupo = self._grupos[(dataset_hash, modelo, temperatura)]
+        grupo.discard(normalizada)
+        if not grupo:
+            del self._grupos[(dataset_hash, modelo, temperatura)]
+
+    def _valida(self, chave, agora):
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return None
+        resposta, expira_em = entrada[:2]
+        if expira_em <= agora:
+            self._remover(chave)
+            self._contadores['expiradas'] += 1
+            return None
+        self._entradas.move_to_end(chave)
+        return resposta
+
+    def _mais_similar(self, dataset_hash, normalizada, modelo, temperatura, assinatura):
+        melhor, melhor_razao = None, self.limiar_similaridade
+        for candidata in self._grupos.get((dataset_hash, modelo, temperatura), ()):
+            if self._entradas[(dataset_hash, candidata, modelo, temperatura)][3] != assinatura:
+                continue
+            comparador = difflib.SequenceMatcher(None, normalizada, candidata)
+            # quick_ratio é um limite superior barato de ratio
+            if comparador.quick_ratio() < melhor_razao:
+                continue
+            razao = comparador.ratio()
+            if razao >= melhor_razao:
+                melhor, melhor_razao = candidata, razao
+        return melhor
+
+    def obter(self, dataset_hash, pergunta, modelo, temperatura, series=()):
+        """Retorna a resposta em cache ou None"""
+        normalizada = normalizar_pergunta(pergunta)
+        agora = time.monotonic()
+        with self._lock:
+            resposta = self._valida((dataset_hash, normalizada, modelo, temperatura), agora)
+            if resposta is not None:
+                self._contadores['acertos'] += 1
+                return resposta
+
+            if self.limiar_similaridade:
+                similar = self._mais_similar(dataset_hash, normalizada, modelo, temperatura,
+                                             _assinatura(normalizada, series))
+                if similar is not None:
+                    resposta = self._valida((dataset_hash, similar, modelo, temperatura), agora)
+                    if resposta is not None:
+                        self._contadores['acertos_similares'] += 1
+                        return resposta
+
+            self._contadores['falhas'] += 1
+            return None
+
+    def _limitar(self):
+        while len(self._entradas) > self.capacidade:
+            self._remover(next(iter(self._entradas)))
+            self._contadores['removidas'] += 1
+
+    def armazenar(self, dataset_hash, pergunta, modelo, temperatura, resposta, series=()):
+        """Guarda uma resposta, removendo a menos usada se o cache estiver cheio"""
+        normalizada = normalizar_pergunta(pergunta)
+        chave = (dataset_hash, normalizada, modelo, temperatura)
+        with self._lock:
+            self._entradas[chave] = (resposta, time.monotonic() + self.ttl, pergunta,
+                                     _assinatura(normalizada, series))
+            self._entradas.move_to_end(chave)
+            self._grupos[(dataset_hash, modelo, temperatura)].add(normalizada)
+            self._limitar()
+
+    def invalidar(self, dataset_hash=None):
+        """Remove as respostas de um dataset (ou todas)"""
+        with self._lock:
+            for chave in [c for c in self._entradas if dataset_hash is None or c[0] == dataset_hash]:
+                self._remover(chave)
+
+    def migrar(self, hash_origem, hash_destino, manter):
+        """Copia para a nova versão do dataset as respostas em que ``manter(pergunta)``
+        é verdadeiro, recebendo a pergunta como foi feita. As da versão de origem
+        continuam lá até saírem por LRU ou TTL. Retorna quantas foram copiadas."""
+        mantidas = 0
+        with self._lock:
+            for chave, entrada in [(c, e) for c, e in self._entradas.items() if c[0] == hash_origem]:
+                _, normalizada, modelo, temperatura = chave
+                if manter(entrada[2]):
+                    nova = (hash_destino, normalizada, modelo, temperatura)
+                    self._entradas[nova] = entrada
+                    self._entradas.move_to_end(nova)
+                    self._grupos[(hash_destino, modelo, temperatura)].add(normalizada)
+                    mantidas += 1
+            self._limitar()
+        return mantidas
+
+    def metricas(self):
+        """Retorna tamanho e contadores de acertos e falhas"""
+        with self._lock:
+            consultas = self._contadores['acertos'] + self._contadores['acertos_similares'] + self._contadores['falhas']
+            acertos = self._contadores['acertos'] + self._contadores['acertos_similares']
+            return {
+                'tamanho': len(self._entradas),
+                'capacidade': self.capacidade,
+                'taxa_acerto': acertos / consultas if consultas else 0.0,
+                **self._contadores
+            }
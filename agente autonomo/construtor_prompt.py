@@ -0,0 +1,214 @@
+import math
+import re
+import threading
+from collections import deque
+
+import numpy as np
+
+from cache_respostas import normalizar_pergunta
+
+# O tiktoken (opcional) carrega o vocabulário ao criar o codificador: só na primeira contagem
+_CODIFICADOR = None
+_SEM_TIKTOKEN = False
+
+# Perguntas que pedem explicação recebem mais espaço para a resposta
+PADRAO_EXPLICACAO = re.compile(
+    r'\b(por que|porque|como|medidas?|recomend\w*|suger\w*|sugest\w*|expli\w*|'
+    r'caus\w*|impact\w*|analis\w*|compar\w*|detalh\w*)\b'
+)
+
+PADRAO_FUTURO = re.compile(r'\b(previs\w*|prever|preve|futur\w*|proximos anos|tendencia\w*)\b')
+
+PADRAO_CORRELACAO = re.compile(r'\b(correla\w*|relac\w*|semelhan\w*|parecid\w*|acompanh\w*)\b')
+
+
+def _codificador():
+    global _CODIFICADOR, _SEM_TIKTOKEN
+    if _CODIFICADOR is None and not _SEM_TIKTOKEN:
+        try:
+            import tiktoken
+            _CODIFICADOR = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            _SEM_TIKTOKEN = True
+    return _CODIFICADOR
+
+
+def estimar_tokens(texto):
+    """Número de tokens do texto (exato com tiktoken, aproximado sem ele)"""
+    codificador = _codificador()
+    if codificador is not None:
+        return len(codificador.encode(texto))
+    # Português com números fica em torno de 3 a 4 caracteres por token
+    return math.ceil(len(texto) / 3.5)
+
+
+def _numero(valor):
+    return '-' if np.isnan(valor) else f"{valor:.0f}"
+
+
+class ConstrutorPrompt:
+    """Monta prompts compactos com as estatísticas relevantes para a pergunta.
+
+    O contexto é formado por blocos em ordem de prioridade (resumo geral,
+    séries e anos citados, correlações e previsões quando pedidas, anos
+    recentes, alertas e demais estados); cada bloco só entra se couber no
+    orçamento de tokens.
+    """
+
+    def __init__(self, agente, roteador, analise_agente=None):
+        self.agente = agente
+        self.estatisticas = agente.estatisticas
+        self.roteador = roteador
+        self.sistema = (
+            f"Você é o {agente.nome}. {agente.descricao} "
+            "Responda de forma clara e objetiva, com base apenas nos dados fornecidos. "
+            "Valores em km²."
+        )
+        self.tokens_sistema = estimar_tokens(self.sistema)
+        self._alertas = [
+            alerta['descricao'] for alerta in (analise_agente or {}).get('alertas', [])
+        ]
+        self._resumo = self._bloco_resumo()
+        self._previsao = None
+
+    def _linha_serie(self, serie):
+        est = self.estatisticas
+        return (
+            f"{serie}: total {_numero(est.totais[serie])}; média {_numero(est.medias[serie])}; "
+            f"máx {_numero(est.maximos[serie])} ({est.ano_maximo[serie]}); "
+            f"mín {_numero(est.minimos[serie])} ({est.ano_minimo[serie]}); "
+            f"último {_numero(est.ultimos[est._indice(serie)])}"
+        )
+
+    def _bloco_resumo(self):
+        est = self.estatisticas
+        total = est.coluna_total
+        estados = ', '.join(est.estados[:20]) + (f" e mais {len(est.estados) - 20}" if len(est.estados) > 20 else '')
+        return [
+            f"Período: {est.anos[0]}-{est.anos[-1]} ({est.num_anos} anos). Estados: {estados}.",
+            self._linha_serie(total).replace(f"{total}:", f"{total} (Amazônia Legal):", 1),
+            f"Variação {total}: período {est.variacao_serie(total):.1f}%; últimos 5 anos {est.variacao_serie(total, 5):.1f}%"
+        ]
+
+    def _linha_ano(self, ano, series):
+        est = self.estatisticas
+        linha = est.valores[est.indice_ano(ano)]
+        return f"{ano}: " + ', '.join(f"{serie}={_numero(linha[est._indice(serie)])}" for serie in series)
+
+    def _linha_previsao(self, serie):
+        if self._previsao is None:
+            self._previsao = self.agente.prever()
+        previsao = self._previsao.serie(serie)
+        return f"{serie}: " + ', '.join(
+            f"{ano}={_numero(valor)} [{_numero(inferior)}; {_numero(superior)}]"
+            for ano, valor, inferior, superior in zip(
+                self._previsao.anos_futuros,
+                *(np.array(previsao[campo], dtype=np.float64) for campo in ('previsao', 'inferior', 'superior'))
+            )
+        )
+
+    def _blocos(self, pergunta):
+        """Blocos de contexto (título e linhas) em ordem de prioridade"""
+        est = self.estatisticas
+        citadas = [serie for serie in self.roteador.series_citadas(pergunta) if serie != est.coluna_total]
+        anos = self.roteador.anos_citados(pergunta)
+
+        yield "Resumo", self._resumo
+        if citadas:
+            yield "Estados citados", [self._linha_serie(serie) for serie in citadas]
+        if anos:
+            series = citadas + [est.coluna_total] if citadas else est.series
+            yield "Anos citados", [self._linha_ano(ano, series) for ano in anos]
+        normalizada = normalizar_pergunta(pergunta)
+        if PADRAO_CORRELACAO.search(normalizada):
+            parceiros = est.parceiros_correlacao(3)
+            yield "Estados mais correlacionados", [
+                f"{serie}: " + ', '.join(f"{parceiro} ({r:+.2f})" for parceiro, r in parceiros.parceiros(serie))
+                for serie in citadas or est.mais_afetados(len(est.estados))
+            ]
+        if PADRAO_FUTURO.search(normalizada):
+            yield "Previsão linear (intervalo de 95%)", [
+                self._linha_previsao(serie) for serie in [est.coluna_total] + citadas
+            ]
+        total = est._indice(est.coluna_total)
+        yield f"{est.coluna_total} nos últimos anos", [', '.join(
+            f"{ano}={_numero(valor)}" for ano, valor in zip(est.anos[-10:], est.valores[-10:, total])
+        )]
+        if self._alertas:
+            yield "Alertas", [f"- {alerta}" for alerta in self._alertas]
+        yield "Demais estados (por média)", [
+            self._linha_serie(serie) for serie in est.mais_afetados(len(est.estados)) if serie not in citadas
+        ]
+
+    def limite_resposta(self, pergunta, maximo=1000):
+        """Tokens de resposta conforme o tipo de pergunta"""
+        if PADRAO_EXPLICACAO.search(normalizar_pergunta(pergunta)):
+            return maximo
+        return min(maximo, 400)
+
+    def montar(self, pergunta, orcamento=1500, max_resposta=1000):
+        """Retorna (mensagens, max_tokens, tokens_prompt) respeitando o orçamento de tokens.
+
+        Dentro de cada bloco as linhas entram em ordem até o orçamento acabar;
+        blocos sem nenhuma linha que caiba são omitidos.
+        """
+        rodape = f"Pergunta: {pergunta}"
+        usados = self.tokens_sistema + estimar_tokens(rodape)
+        partes = []
+        for titulo, linhas in self._blocos(pergunta):
+            cabecalho = f"[{titulo}]"
+            custo_cabecalho = estimar_tokens(cabecalho)
+            incluidas = []
+            for linha in linhas:
+                custo = estimar_tokens(linha) + (0 if incluidas else custo_cabecalho)
+                if usados + custo > orcamento:
+                    break
+                incluidas.append(linha)
+                usados += custo
+            if incluidas:
+                partes.append('\n'.join([cabecalho] + incluidas))
+        partes.append(rodape)
+
+        mensagens = [
+            {"role": "system", "content": self.sistema},
+            {"role": "user", "content": '\n\n'.join(partes)}
+        ]
+        return mensagens, self.limite_resposta(pergunta, max_resposta), usados
+
+
+class RegistroTokens:
+    """Acumula tokens de prompt e de resposta e a latência das chamadas ao LLM"""
+
+    def __init__(self, janela=500):
+        self._lock = threading.Lock()
+        self._recentes = deque(maxlen=janela)
+        self.chamadas = 0
+        self.tokens_prompt = 0
+        self.tokens_resposta = 0
+
+    def registrar(self, tokens_prompt, tokens_resposta, latencia):
+        with self._lock:
+            self.chamadas += 1
+            self.tokens_prompt += tokens_prompt
+            self.tokens_resposta += tokens_resposta
+            self._recentes.append((tokens_prompt, tokens_resposta, latencia))
+
+    def resumo(self):
+        """Totais e médias recentes de tokens e latência"""
+        with self._lock:
+            recentes = list(self._recentes)
+            resumo = {
+                'chamadas': self.chamadas,
+                'tokens_prompt': self.tokens_prompt,
+                'tokens_resposta': self.tokens_resposta
+            }
+        if recentes:
+            prompt, resposta, latencia = (np.array(coluna, dtype=float) for coluna in zip(*recentes))
+            resumo.update({
+                'media_tokens_prompt': float(prompt.mean()),
+                'media_tokens_resposta': float(resposta.mean()),
+                'latencia_media_ms': float(latencia.mean() * 1000),
+                # ms de latência por token de prompt, para acompanhar o custo do contexto
+                'ms_por_token_prompt': float(latencia.sum() * 1000 / max(prompt.sum(), 1))
+            })
+        return resumo
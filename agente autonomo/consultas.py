@@ -0,0 +1,266 @@
+"""Consultas por intervalo de anos e conjunto de regiões.
+
+- ``detectar_esquema``: identifica a coluna de ano e a de total pelo nome e
+  pelos valores, sem depender da posição das colunas;
+- ``IndiceIntervalos``: somas acumuladas e tabelas esparsas (mínimo e máximo)
+  de todas as séries, montadas uma vez por versão do dataset. Depois disso,
+  soma, média, variação e extremos de qualquer intervalo custam O(1) por
+  série.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+PADRAO_NOME_ANO = re.compile(r'\b(ano|anos|year|years)\b', re.IGNORECASE)
+PADRAO_NOME_TOTAL = re.compile(r'\b(total|amz legal|amaz[oô]nia legal|brasil)\b', re.IGNORECASE)
+LIMITES_ANO = (1800, 2200)
+MEDIDAS = ('soma', 'media', 'variacao', 'minimo', 'maximo')
+
+
+class EsquemaDataset:
+    """Papel de cada coluna do dataset: ano, total e regiões (as demais numéricas)"""
+
+    def __init__(self, coluna_ano, coluna_total, regioes):
+        self.coluna_ano = coluna_ano
+        self.coluna_total = coluna_total
+        self.regioes = list(regioes)
+
+    @property
+    def series(self):
+        """Regiões seguidas do total, se houver"""
+        return self.regioes + ([self.coluna_total] if self.coluna_total is not None else [])
+
+    def __repr__(self):
+        return f'EsquemaDataset(ano={self.coluna_ano!r}, total={self.coluna_total!r}, regioes={len(self.regioes)})'
+
+
+def _parece_ano(serie):
+    """Inteiros distintos e sem ausentes, dentro de uma faixa plausível de anos"""
+    valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=np.float64)
+    if not len(valores) or np.isnan(valores).any() or (valores != np.round(valores)).any():
+        return False
+    return LIMITES_ANO[0] <= valores.min() and valores.max() <= LIMITES_ANO[1] and len(np.unique(valores)) == len(valores)
+
+
+def _e_soma_das_demais(df, coluna, outras, tolerancia=0.01):
+    """Se a coluna é (a menos da tolerância relativa) a soma das outras, nas linhas completas"""
+    valores = df[coluna].to_numpy(dtype=np.float64)
+    soma = df[outras].to_numpy(dtype=np.float64).sum(axis=1)
+    completas = ~np.isnan(valores) & ~np.isnan(soma)
+    if not completas.any():
+        return False
+    return bool(np.allclose(soma[completas], valores[completas], rtol=tolerancia, atol=0.5))
+
+
+def detectar_esquema(df, coluna_ano=None, coluna_total=None):
+    """Detecta as colunas de ano e de total do DataFrame.
+
+    O ano é a coluna cujo nome fala em ano (``Ano/Estados``, ``year``) ou, na
+    falta dela, a primeira de inteiros distintos entre 1800 e 2200. O total é
+    a coluna numérica com nome de total (``AMZ LEGAL``, ``Total``) ou a que
+    equivale à soma das demais; pode não existir. Colunas informadas
+    explicitamente são apenas validadas. Lança ValueError se não houver
+    coluna de ano.
+    """
+    colunas = list(df.columns)
+    if coluna_ano is None:
+        candidatas = [c for c in colunas if PADRAO_NOME_ANO.search(str(c)) and _parece_ano(df[c])]
+        candidatas = candidatas or [c for c in colunas if _parece_ano(df[c])]
+        if not candidatas:
+            raise ValueError("Coluna de ano não encontrada")
+        coluna_ano = candidatas[0]
+    elif coluna_ano not in df.columns:
+        raise ValueError(f"Coluna de ano inexistente: {coluna_ano}")
+
+    numericas = [c for c in colunas if c != coluna_ano and pd.api.types.is_numeric_dtype(df[c])]
+    if coluna_total is None:
+        por_nome = [c for c in numericas if PADRAO_NOME_TOTAL.search(str(c))]
+        if por_nome:
+            coluna_total = por_nome[-1]
+        elif len(numericas) > 2:
+            # Sem nome reconhecível: a coluna que é a soma das demais (normalmente a última)
+            for candidata in reversed(numericas):
+                if _e_soma_das_demais(df, candidata, [c for c in numericas if c != candidata]):
+                    coluna_total = candidata
+                    break
+    elif coluna_total not in numericas:
+        raise ValueError(f"Coluna de total inexistente ou não numérica: {coluna_total}")
+
+    return EsquemaDataset(coluna_ano, coluna_total, [c for c in numericas if c != coluna_total])
+
+
+def _lista(valores):
+    """Array em lista serializável em JSON (NaN e infinitos viram None)"""
+    return [valor if math.isfinite(valor) else None for valor in np.asarray(valores, dtype=np.float64).tolist()]
+
+
+class IndiceIntervalos:
+    """Índices de intervalo de todas as séries de uma versão do dataset.
+
+    ``somas[i]`` e ``contagens[i]`` acumulam os valores (ausentes contam
+    zero) e as células presentes das linhas anteriores a ``i``; cada nível
+    ``j`` das tabelas esparsas guarda, por série, a linha do mínimo (ou
+    máximo) de cada janela de ``2**j`` anos. Um intervalo qualquer é coberto
+    por duas janelas de um mesmo nível. Os anos precisam estar em ordem
+    crescente.
+    """
+
+    def __init__(self, anos, valores, series):
+        self.anos = np.asarray(anos).astype(np.int64)
+        if len(self.anos) == 0:
+            raise ValueError("Dataset sem anos")
+        if (np.diff(self.anos) <= 0).any():
+            raise ValueError("Os anos precisam estar em ordem crescente e sem repetição")
+        self.valores = np.asarray(valores, dtype=np.float64)
+        self.series = list(series)
+        self._posicao = {serie: i for i, serie in enumerate(self.series)}
+
+        presentes = ~np.isnan(self.valores)
+        n, k = self.valores.shape
+        self.somas = np.zeros((n + 1, k))
+        np.cumsum(np.where(presentes, self.valores, 0.0), axis=0, out=self.somas[1:])
+        self.contagens = np.zeros((n + 1, k), dtype=np.int64)
+        np.cumsum(presentes, axis=0, out=self.contagens[1:])
+
+        # Ausentes nunca vencem a comparação
+        self._chave_minimo = np.where(presentes, self.valores, np.inf)
+        self._chave_maximo = np.where(presentes, -self.valores, np.inf)
+        self._tabela_minimo = self._tabela_esparsa(self._chave_minimo)
+        self._tabela_maximo = self._tabela_esparsa(self._chave_maximo)
+
+    @staticmethod
+    def _tabela_esparsa(chave):
+        """Níveis com a linha de menor chave de cada janela (no empate, a mais antiga)"""
+        n, k = chave.shape
+        colunas = np.arange(k)
+        niveis = [np.repeat(np.arange(n, dtype=np.int32)[:, None], k, axis=1)]
+        tamanho = 2
+        while tamanho <= n:
+            anterior = niveis[-1]
+            janelas = n - tamanho + 1
+            a = anterior[:janelas]
+            b = anterior[tamanho // 2:tamanho // 2 + janelas]
+            niveis.append(np.where(chave[b, colunas] < chave[a, colunas], b, a))
+            tamanho *= 2
+        return niveis
+
+    def memoria_bytes(self):
+        """Memória ocupada pelos índices"""
+        tabelas = sum(nivel.nbytes for nivel in self._tabela_minimo + self._tabela_maximo)
+        return self.somas.nbytes + self.contagens.nbytes + self._chave_minimo.nbytes * 2 + tabelas
+
+    def linhas(self, inicio=None, fim=None):
+        """Primeira e última linha (inclusive) do intervalo de anos; sem limite, o período todo"""
+        primeira = 0 if inicio is None else int(np.searchsorted(self.anos, int(inicio), 'left'))
+        ultima = len(self.anos) - 1 if fim is None else int(np.searchsorted(self.anos, int(fim), 'right')) - 1
+        if primeira > ultima:
+            raise ValueError(f"Não há dados no intervalo pedido; o período disponível é de {self.anos[0]} a {self.anos[-1]}")
+        return primeira, ultima
+
+    def _colunas(self, series):
+        if series is None:
+            return np.arange(len(self.series))
+        if isinstance(series, str):
+            series = [series]
+        desconhecidas = [serie for serie in series if serie not in self._posicao]
+        if desconhecidas:
+            raise KeyError(f"Séries desconhecidas: {', '.join(map(str, desconhecidas))}")
+        return np.array([self._posicao[serie] for serie in series], dtype=np.int64)
+
+    def _extremo(self, tabela, chave, primeira, ultima, colunas):
+        nivel = (ultima - primeira + 1).bit_length() - 1
+        a = tabela[nivel][primeira, colunas]
+        b = tabela[nivel][ultima - (1 << nivel) + 1, colunas]
+        return np.where(chave[b, colunas] < chave[a, colunas], b, a)
+
+    def soma(self, series=None, inicio=None, fim=None):
+        """Soma de cada série no intervalo (ausentes ignorados)"""
+        primeira, ultima = self.linhas(inicio, fim)
+        colunas = self._colunas(series)
+        return self.somas[ultima + 1, colunas] - self.somas[primeira, colunas]
+
+    def media(self, series=None, inicio=None, fim=None):
+        """Média anual de cada série no intervalo, sobre os anos com dado"""
+        primeira, ultima = self.linhas(inicio, fim)
+        colunas = self._colunas(series)
+        contagem = self.contagens[ultima + 1, colunas] - self.contagens[primeira, colunas]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.somas[ultima + 1, colunas] - self.somas[primeira, colunas]) / contagem
+
+    def variacao(self, series=None, inicio=None, fim=None):
+        """Variação percentual de cada série entre o primeiro e o último ano do intervalo"""
+        primeira, ultima = self.linhas(inicio, fim)
+        colunas = self._colunas(series)
+        base = self.valores[primeira, colunas]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.valores[ultima, colunas] - base) / base * 100
+
+    def minimo(self, series=None, inicio=None, fim=None):
+        """(valores, anos) do menor valor de cada série no intervalo; NaN se a série não tem dado nele"""
+        primeira, ultima = self.linhas(inicio, fim)
+        colunas = self._colunas(series)
+        linhas = self._extremo(self._tabela_minimo, self._chave_minimo, primeira, ultima, colunas)
+        return self.valores[linhas, colunas], self.anos[linhas]
+
+    def maximo(self, series=None, inicio=None, fim=None):
+        """(valores, anos) do maior valor de cada série no intervalo; NaN se a série não tem dado nele"""
+        primeira, ultima = self.linhas(inicio, fim)
+        colunas = self._colunas(series)
+        linhas = self._extremo(self._tabela_maximo, self._chave_maximo, primeira, ultima, colunas)
+        return self.valores[linhas, colunas], self.anos[linhas]
+
+    def consultar(self, series=None, inicio=None, fim=None, medidas=MEDIDAS):
+        """Medidas de cada série no intervalo e do conjunto delas, em formato JSON.
+
+        O conjunto soma as séries ano a ano: sua soma é a soma das somas, a
+        média é a soma dividida pelos anos do intervalo e a variação compara
+        o total do primeiro e do último ano.
+        """
+        desconhecidas = [medida for medida in medidas if medida not in MEDIDAS]
+        if desconhecidas:
+            raise ValueError(f"Medidas desconhecidas: {', '.join(desconhecidas)}")
+        primeira, ultima = self.linhas(inicio, fim)
+        inicio, fim = int(self.anos[primeira]), int(self.anos[ultima])
+        colunas = self._colunas(series)
+        nomes = [self.series[i] for i in colunas]
+
+        somas = self.somas[ultima + 1, colunas] - self.somas[primeira, colunas]
+        contagem = self.contagens[ultima + 1, colunas] - self.contagens[primeira, colunas]
+        base = self.valores[primeira, colunas]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            por_medida = {
+                'soma': _lista(np.where(contagem > 0, somas, np.nan)),
+                'media': _lista(somas / contagem),
+                'variacao': _lista((self.valores[ultima, colunas] - base) / base * 100)
+            }
+        for medida, tabela, chave in (('minimo', self._tabela_minimo, self._chave_minimo),
+                                      ('maximo', self._tabela_maximo, self._chave_maximo)):
+            if medida in medidas:
+                linhas = self._extremo(tabela, chave, primeira, ultima, colunas)
+                valores = _lista(self.valores[linhas, colunas])
+                anos = self.anos[linhas].tolist()
+                por_medida[medida] = [{'valor': valor, 'ano': ano if valor is not None else None}
+                                      for valor, ano in zip(valores, anos)]
+        escolhidas = [medida for medida in MEDIDAS if medida in medidas]
+        resultado = {
+            nome: {medida: por_medida[medida][i] for medida in escolhidas}
+            for i, nome in enumerate(nomes)
+        }
+
+        base = np.nansum(base)
+        final = np.nansum(self.valores[ultima, colunas])
+        total = float(somas.sum())
+        conjunto = {
+            'soma': total,
+            'media': total / (ultima - primeira + 1),
+            'variacao': float((final - base) / base * 100) if base else None
+        }
+        return {
+            'inicio': inicio,
+            'fim': fim,
+            'anos': ultima - primeira + 1,
+            'series': resultado,
+            'conjunto': {medida: valor for medida, valor in conjunto.items() if medida in medidas}
+        }
@@ -0,0 +1,324 @@
+import numpy as np
+import pandas as pd
+
+from analise_series import correlacao_parceiros, detectar_anomalias
+from consultas import IndiceIntervalos, detectar_esquema
+
+
+class SomasCorrelacao:
+    """Estatísticas suficientes da correlação de Pearson entre pares de séries.
+
+    Guarda, para cada par, o número de linhas em que ambos têm valor e as
+    somas de x, x² e x·y nessas linhas (mesma regra par a par de
+    ``DataFrame.corr``). Linhas podem ser incluídas ou removidas sem
+    revisitar as demais.
+    """
+
+    def __init__(self, num_series):
+        self.n = np.zeros((num_series, num_series))
+        self.soma = np.zeros((num_series, num_series))
+        self.soma_quadrados = np.zeros((num_series, num_series))
+        self.produtos = np.zeros((num_series, num_series))
+
+    def copiar(self):
+        copia = SomasCorrelacao(0)
+        copia.n = self.n.copy()
+        copia.soma = self.soma.copy()
+        copia.soma_quadrados = self.soma_quadrados.copy()
+        copia.produtos = self.produtos.copy()
+        return copia
+
+    def acumular(self, linhas, sinal=1):
+        """Inclui (``sinal=1``) ou remove (``sinal=-1``) as linhas informadas"""
+        presentes = ~np.isnan(linhas)
+        x = np.where(presentes, linhas, 0.0)
+        m = presentes.astype(np.float64)
+        # soma[i, j] = soma de x_i nas linhas em que x_i e x_j estão presentes
+        self.n += sinal * (m.T @ m)
+        self.soma += sinal * (x.T @ m)
+        self.soma_quadrados += sinal * ((x * x).T @ m)
+        self.produtos += sinal * (x.T @ x)
+
+    def matriz(self):
+        """Matriz de correlação; NaN onde há menos de duas linhas ou variância nula"""
+        n = self.n
+        covariancia = n * self.produtos - self.soma * self.soma.T
+        variancia = (n * self.soma_quadrados - self.soma ** 2) * (n * self.soma_quadrados.T - self.soma.T ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlacao = covariancia / np.sqrt(variancia)
+        correlacao[(n < 2) | (variancia <= 0)] = np.nan
+        return np.clip(correlacao, -1.0, 1.0)
+
+
+class EstatisticasDataset:
+    """Agregados por série (estado e total) calculados em uma única passada vetorizada.
+
+    As colunas de ano e de total são detectadas pelo nome e pelos valores
+    (``consultas.detectar_esquema``) quando não informadas. ``valores`` é um
+    par opcional (colunas, matriz) com a matriz das séries já pronta, como a
+    gravada com a versão do dataset (``armazenamento.carregar_valores``):
+    mapeada em memória somente para leitura, ela é compartilhada entre os
+    processos em vez de copiada por cada um.
+    """
+
+    def __init__(self, df, coluna_ano=None, coluna_total=None, agregados=None, valores=None):
+        esquema = detectar_esquema(df, coluna_ano, coluna_total)
+        if esquema.coluna_total is None:
+            raise ValueError("Coluna de total não encontrada")
+        self.coluna_ano = coluna_ano = esquema.coluna_ano
+        self.coluna_total = coluna_total = esquema.coluna_total
+        self.estados = esquema.regioes
+        self.series = self.estados + [coluna_total]
+        self._posicao = {serie: i for i, serie in enumerate(self.series)}
+        self.num_anos = len(df)
+
+        self.anos = df[coluna_ano].to_numpy()
+        self._posicao_ano = {int(ano): i for i, ano in enumerate(self.anos)}
+        if valores is not None and list(valores[0]) == [str(serie) for serie in self.series] \
+                and valores[1].shape == (len(df), len(self.series)) and valores[1].dtype == np.float64:
+            self.valores = valores[1]
+        else:
+            self.valores = df[self.series].to_numpy(dtype=np.float64)
+
+        if agregados is not None and set(self.series) <= set(agregados.colunas or []):
+            # Agregados já acumulados durante a leitura do CSV
+            posicao = {coluna: i for i, coluna in enumerate(agregados.colunas)}
+            indices = [posicao[serie] for serie in self.series]
+            self.totais = pd.Series(agregados.soma[indices], index=self.series)
+            self.medias = pd.Series(agregados.media()[indices], index=self.series)
+            self.maximos = pd.Series(agregados.maximo[indices], index=self.series)
+            self.minimos = pd.Series(agregados.minimo[indices], index=self.series)
+            self.ano_maximo = pd.Series(agregados.ano_maximo[indices], index=self.series)
+            self.ano_minimo = pd.Series(agregados.ano_minimo[indices], index=self.series)
+            self.contagem = agregados.contagem[indices].astype(np.int64)
+        else:
+            # Reduções NumPy sobre a matriz anos x séries, sem percorrer coluna a coluna.
+            # As variantes nan* reproduzem o comportamento do pandas (ignoram ausentes).
+            self.totais = pd.Series(np.nansum(self.valores, axis=0), index=self.series)
+            self.medias = pd.Series(np.nanmean(self.valores, axis=0), index=self.series)
+            self.maximos = pd.Series(np.nanmax(self.valores, axis=0), index=self.series)
+            self.minimos = pd.Series(np.nanmin(self.valores, axis=0), index=self.series)
+
+            # Ano do primeiro máximo/mínimo de cada série (mesma regra de idxmax/idxmin)
+            self.ano_maximo = pd.Series(self.anos[np.nanargmax(self.valores, axis=0)], index=self.series)
+            self.ano_minimo = pd.Series(self.anos[np.nanargmin(self.valores, axis=0)], index=self.series)
+            self.contagem = (~np.isnan(self.valores)).sum(axis=0)
+
+        self.primeiros = self.valores[0]
+        self.ultimos = self.valores[-1]
+
+        # ``valores`` é uma fatia de ``_buffer``; ``_uso_buffer`` (compartilhado entre
+        # versões) indica quantas linhas do buffer já estão ocupadas
+        self._buffer = self.valores
+        self._uso_buffer = [self.num_anos]
+        self._somas_correlacao = None
+        self._parceiros = {}
+        self._indice_intervalos = None
+
+    def _indice(self, serie):
+        return self._posicao[serie]
+
+    def indice_ano(self, ano):
+        """Linha do ano em ``valores`` ou None se o ano não estiver no dataset"""
+        return self._posicao_ano.get(int(ano))
+
+    def variacao_percentual(self, anos=None):
+        """Variação percentual de todas as séries entre o início da janela e o último ano.
+
+        Com ``anos=None`` considera o período completo; caso contrário, os
+        últimos ``anos`` registros (equivalente a ``df.tail(anos)``).
+        """
+        inicio = 0 if anos is None else max(self.num_anos - anos, 0)
+        base = self.valores[inicio]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self.ultimos - base) / base * 100
+
+    def media_recente(self, anos):
+        """Média de todas as séries nos últimos ``anos`` registros"""
+        return self.valores[-anos:].mean(axis=0)
+
+    def variacao_serie(self, serie, anos=None):
+        """Variação percentual de uma série na janela informada"""
+        return self.variacao_percentual(anos)[self._indice(serie)]
+
+    def media_recente_serie(self, serie, anos):
+        """Média de uma série nos últimos ``anos`` registros"""
+        return self.valores[-anos:, self._indice(serie)].mean()
+
+    def correlacao(self):
+        """Matriz de correlação par a par entre os estados"""
+        if self._somas_correlacao is None:
+            somas = SomasCorrelacao(len(self.estados))
+            somas.acumular(self.valores[:, :len(self.estados)])
+            self._somas_correlacao = somas
+        return self._somas_correlacao.matriz()
+
+    def parceiros_correlacao(self, k=10):
+        """Os ``k`` estados mais correlacionados com cada estado, sem montar a matriz inteira"""
+        if k not in self._parceiros:
+            self._parceiros[k] = correlacao_parceiros(self.valores[:, :len(self.estados)], self.estados, k)
+        return self._parceiros[k]
+
+    def indice_intervalos(self):
+        """Somas acumuladas e tabelas esparsas das séries, montadas na primeira consulta da versão"""
+        if self._indice_intervalos is None:
+            self._indice_intervalos = IndiceIntervalos(self.anos, self.valores, self.series)
+        return self._indice_intervalos
+
+    def consultar(self, series=None, inicio=None, fim=None, medidas=None):
+        """Soma, média, variação e extremos das séries (padrão: os estados) entre os anos informados"""
+        indice = self.indice_intervalos()
+        if medidas is None:
+            return indice.consultar(self.estados if series is None else series, inicio, fim)
+        return indice.consultar(self.estados if series is None else series, inicio, fim, medidas)
+
+    def anomalias(self, **parametros):
+        """Critérios de anomalia (z-score, janela móvel e variação anual) de todas as séries"""
+        return detectar_anomalias(self.anos, self.valores, self.series, **parametros)
+
+    def mais_afetados(self, quantidade=3):
+        """Estados com maior média anual de desmatamento"""
+        return self.medias[self.estados].nlargest(quantidade).to_dict()
+
+    def acima_da_media(self, fator=1.5):
+        """Estados cujo último ano supera ``fator`` vezes a média, com a razão último/média"""
+        medias = self.medias[self.estados].to_numpy(dtype=np.float64)
+        ultimos = self.ultimos[:len(self.estados)]
+        criticos = np.flatnonzero(ultimos > medias * fator)
+        return [(self.estados[i], ultimos[i] / medias[i]) for i in criticos]
+
+    def _anexar_linhas(self, valores, linhas):
+        """Matriz com ``linhas`` ao final, reaproveitando a folga do buffer quando possível.
+
+        Retorna (valores, buffer, uso_buffer).
+        """
+        n, k = len(valores), len(linhas)
+        buffer, uso = self._buffer, self._uso_buffer
+        # Uma matriz mapeada do disco é somente leitura: a primeira atualização a copia
+        if valores is not self.valores or uso[0] != n or len(buffer) < n + k or not buffer.flags.writeable:
+            # Cresce com folga para que os próximos anos não copiem a matriz
+            buffer = np.empty((max(n + k, n + n // 2 + 8), valores.shape[1]))
+            buffer[:n] = valores
+            uso = [n]
+        buffer[n:n + k] = linhas
+        uso[0] = n + k
+        return buffer[:n + k], buffer, uso
+
+    def atualizar(self, novas):
+        """Nova versão das estatísticas com as linhas de ``novas`` incorporadas.
+
+        Anos já presentes têm os valores informados substituídos (células
+        ausentes são mantidas); anos novos precisam ser posteriores ao último
+        e são anexados. Somas, contagens, extremos e as somas da correlação
+        são ajustados apenas pelas linhas recebidas, e a matriz cresce sobre
+        um buffer com folga; só correções de anos antigos copiam a matriz e
+        recalculam os extremos das séries alteradas (e a matriz mapeada do
+        disco só é copiada aqui, ao ser alterada). A versão atual não é
+        modificada. Retorna (estatisticas, series_alteradas, anos_novos,
+        anos_corrigidos).
+        """
+        colunas = [coluna for coluna in novas.columns if coluna != self.coluna_ano]
+        desconhecidas = [coluna for coluna in colunas if coluna not in self._posicao]
+        if desconhecidas:
+            raise ValueError(f"Colunas desconhecidas: {', '.join(map(str, desconhecidas))}")
+        anos = novas[self.coluna_ano].to_numpy().astype(np.int64)
+        if len(np.unique(anos)) != len(anos):
+            raise ValueError("Há anos repetidos nas novas linhas")
+
+        bloco = np.full((len(novas), len(self.series)), np.nan)
+        bloco[:, [self._posicao[coluna] for coluna in colunas]] = novas[colunas].to_numpy(dtype=np.float64)
+        existentes = np.array([self.indice_ano(ano) is not None for ano in anos], dtype=bool)
+        ordem = np.argsort(anos[~existentes], kind='stable')
+        anos_novos = anos[~existentes][ordem]
+        anexadas = bloco[~existentes][ordem]
+        if len(anos_novos) and anos_novos[0] <= int(self.anos.max()):
+            raise ValueError(f"Anos novos devem ser posteriores a {int(self.anos.max())}")
+
+        totais = self.totais.to_numpy(dtype=np.float64, copy=True)
+        contagem = self.contagem.copy()
+        maximos = self.maximos.to_numpy(dtype=np.float64, copy=True)
+        minimos = self.minimos.to_numpy(dtype=np.float64, copy=True)
+        ano_maximo = self.ano_maximo.to_numpy(copy=True)
+        ano_minimo = self.ano_minimo.to_numpy(copy=True)
+        alteradas = np.zeros(len(self.series), dtype=bool)
+        somas = self._somas_correlacao.copiar() if self._somas_correlacao is not None else None
+        estados = len(self.estados)
+        valores = self.valores
+
+        if existentes.any():
+            # Cópia: outras threads continuam lendo a versão anterior
+            valores = np.array(valores)
+            linhas = [self.indice_ano(ano) for ano in anos[existentes]]
+            antigos = valores[linhas]
+            recebidos = bloco[existentes]
+            corrigidos = np.where(np.isnan(recebidos), antigos, recebidos)
+            mudou = (corrigidos != antigos) & ~(np.isnan(corrigidos) & np.isnan(antigos))
+            totais += np.nansum(corrigidos, axis=0) - np.nansum(antigos, axis=0)
+            contagem += (~np.isnan(corrigidos)).sum(axis=0) - (~np.isnan(antigos)).sum(axis=0)
+            valores[linhas] = corrigidos
+            if somas is not None:
+                somas.acumular(antigos[:, :estados], -1)
+                somas.acumular(corrigidos[:, :estados])
+
+            # Um extremo corrigido pode deixar de ser extremo: recalcula só essas séries
+            colunas_alteradas = np.flatnonzero(mudou.any(axis=0))
+            alteradas[colunas_alteradas] = True
+            for i in colunas_alteradas:
+                coluna = valores[:, i]
+                if np.isnan(coluna).all():
+                    maximos[i] = minimos[i] = np.nan
+                    continue
+                maximos[i], ano_maximo[i] = np.nanmax(coluna), self.anos[np.nanargmax(coluna)]
+                minimos[i], ano_minimo[i] = np.nanmin(coluna), self.anos[np.nanargmin(coluna)]
+
+        buffer, uso_buffer = self._buffer, self._uso_buffer
+        if len(anos_novos):
+            valores, buffer, uso_buffer = self._anexar_linhas(valores, anexadas)
+            presentes = ~np.isnan(anexadas)
+            totais += np.nansum(anexadas, axis=0)
+            contagem += presentes.sum(axis=0)
+            alteradas |= presentes.any(axis=0)
+            if somas is not None:
+                somas.acumular(anexadas[:, :estados])
+
+            # Substitui só se estritamente maior/menor, mantendo a primeira ocorrência
+            colunas = np.arange(len(self.series))
+            posicao_max = np.argmax(np.where(presentes, anexadas, -np.inf), axis=0)
+            bloco_max = np.where(presentes.any(axis=0), anexadas[posicao_max, colunas], -np.inf)
+            novo_max = bloco_max > np.where(np.isnan(maximos), -np.inf, maximos)
+            maximos = np.where(novo_max, bloco_max, maximos)
+            ano_maximo = np.where(novo_max, anos_novos[posicao_max], ano_maximo)
+
+            posicao_min = np.argmin(np.where(presentes, anexadas, np.inf), axis=0)
+            bloco_min = np.where(presentes.any(axis=0), anexadas[posicao_min, colunas], np.inf)
+            novo_min = bloco_min < np.where(np.isnan(minimos), np.inf, minimos)
+            minimos = np.where(novo_min, bloco_min, minimos)
+            ano_minimo = np.where(novo_min, anos_novos[posicao_min], ano_minimo)
+        elif valores is not self.valores:
+            buffer, uso_buffer = valores, [len(valores)]
+
+        nova = object.__new__(EstatisticasDataset)
+        nova.__dict__.update(self.__dict__)
+        nova.anos = np.concatenate([self.anos, anos_novos.astype(self.anos.dtype)])
+        nova._posicao_ano = dict(self._posicao_ano)
+        nova._posicao_ano.update({int(ano): self.num_anos + i for i, ano in enumerate(anos_novos)})
+        nova.num_anos = len(nova.anos)
+        nova.valores = valores
+        nova._buffer = buffer
+        nova._uso_buffer = uso_buffer
+        nova._somas_correlacao = somas
+        nova._parceiros = {}
+        nova._indice_intervalos = None
+        nova.contagem = contagem
+        nova.totais = pd.Series(totais, index=self.series)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            nova.medias = pd.Series(totais / contagem, index=self.series)
+        nova.maximos = pd.Series(maximos, index=self.series)
+        nova.minimos = pd.Series(minimos, index=self.series)
+        nova.ano_maximo = pd.Series(ano_maximo, index=self.series)
+        nova.ano_minimo = pd.Series(ano_minimo, index=self.series)
+        nova.primeiros = valores[0]
+        nova.ultimos = valores[-1]
+
+        series_alteradas = [serie for serie, alterada in zip(self.series, alteradas) if alterada]
+        return nova, series_alteradas, [int(ano) for ano in anos_novos], [int(ano) for ano in anos[existentes]]
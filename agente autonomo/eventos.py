@@ -0,0 +1,111 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+def formatar_sse(evento, dados):
+    """Formata um evento no protocolo server-sent events"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+class CanalRespostas:
+    """Distribui eventos de respostas para as conexões SSE abertas de cada sessão"""
+
+    def __init__(self, capacidade=100):
+        self.capacidade = capacidade
+        self._lock = threading.Lock()
+        self._assinantes = defaultdict(set)
+
+    def assinar(self, sessao):
+        """Registra uma nova conexão da sessão e retorna a fila de eventos dela"""
+        fila = queue.Queue(maxsize=self.capacidade)
+        with self._lock:
+            self._assinantes[sessao].add(fila)
+        return fila
+
+    def cancelar(self, sessao, fila):
+        """Remove uma conexão encerrada"""
+        with self._lock:
+            filas = self._assinantes.get(sessao)
+            if filas is not None:
+                filas.discard(fila)
+                if not filas:
+                    del self._assinantes[sessao]
+
+    def publicar(self, sessao, evento, dados):
+        """Envia o evento a todas as conexões da sessão; retorna quantas o receberam"""
+        with self._lock:
+            filas = list(self._assinantes.get(sessao, ()))
+        entregues = 0
+        for fila in filas:
+            try:
+                fila.put_nowait((evento, dados))
+                entregues += 1
+            except queue.Full:
+                # Conexão lenta demais: o cliente ressincroniza ao reconectar
+                pass
+        return entregues
+
+    def total_conexoes(self):
+        """Número de conexões SSE abertas"""
+        with self._lock:
+            return sum(len(filas) for filas in self._assinantes.values())
+
+
+class RetransmissorRespostas:
+    """Publica nas conexões SSE deste processo as respostas gravadas por outros processos.
+
+    Com a fila compartilhada, a pergunta pode ser respondida por um processo
+    diferente do que mantém a conexão SSE da sessão. Uma thread consulta o
+    banco a cada ``intervalo`` segundos, apenas enquanto há conexões abertas,
+    e repassa as respostas cujo dono é outro processo (as próprias já foram
+    publicadas por ``armazenar_resposta``).
+    """
+
+    def __init__(self, canal, armazem, dono, intervalo=0.25):
+        self.canal = canal
+        self.armazem = armazem
+        self.dono = dono
+        self.intervalo = intervalo
+        self.retransmitidas = 0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name='retransmissor-respostas', daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _executar(self):
+        ultimo = time.time()
+        vistas = OrderedDict()
+        while not self._parar.wait(self.intervalo):
+            if not self.canal.total_conexoes():
+                # Sem conexões, quem reconectar busca o histórico em /perguntas
+                ultimo = time.time()
+                continue
+            try:
+                # Relógios de processos diferentes: relê o último segundo e ignora o que já foi visto
+                respostas = self.armazem.respostas_desde(ultimo - 1.0)
+            except Exception as e:
+                logger.error("Erro ao consultar respostas de outros processos: %s", e)
+                continue
+            for resposta in respostas:
+                ultimo = max(ultimo, resposta['respondida_em'])
+                if resposta['id'] in vistas:
+                    continue
+                vistas[resposta['id']] = True
+                if len(vistas) > 5000:
+                    vistas.popitem(last=False)
+                if resposta['dono'] != self.dono:
+                    self.canal.publicar(resposta['sessao'], 'resposta',
+                                        {'id': resposta['id'], 'resposta': resposta['resposta']})
+                    self.retransmitidas += 1
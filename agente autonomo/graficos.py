@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from instrumentacao import registro_metricas
+
+logger = logging.getLogger(__name__)
+
+# Funções de analise_desmatamento que desenham cada tipo de gráfico
+TIPOS_GRAFICO = {
+    'evolucao': 'plotar_evolucao_amazonia_legal',
+    'estados': 'plotar_estados_mais_afetados',
+    'correlacao': 'analise_correlacao',
+    'previsao': 'previsao_futura'
+}
+
+# Níveis de renderização: completo para exibição, prévia leve para miniaturas
+NIVEIS = {
+    'completo': {'dpi': 150, 'formato': 'png'},
+    'previa': {'dpi': 60, 'formato': 'webp'}
+}
+
+
+def _renderizar(caminho_dataset, tipo, destino, dpi):
+    """Renderiza um gráfico em um processo do pool a partir do dataset salvo"""
+    import analise_desmatamento
+    from armazenamento import carregar_dataset
+
+    df = carregar_dataset(caminho_dataset)
+    temporario = f'{destino}.{os.getpid()}.tmp{os.path.splitext(destino)[1]}'
+    getattr(analise_desmatamento, TIPOS_GRAFICO[tipo])(df, arquivo=temporario, dpi=dpi)
+    os.replace(temporario, destino)
+    return destino
+
+
+def _aquecer_processo():
+    """Importa o matplotlib em um processo do pool, antes do primeiro gráfico"""
+    from analise_desmatamento import carregar_pyplot
+    carregar_pyplot()
+    return os.getpid()
+
+
+class ServicoGraficos:
+    """Renderiza gráficos fora da requisição, em um pool de processos, com cache em disco.
+
+    Cada arquivo é identificado por (hash do dataset, tipo, parâmetros), de
+    modo que um gráfico já gerado é servido direto do disco e pedidos
+    simultâneos do mesmo gráfico compartilham uma única renderização.
+
+    A pasta é limitada por ``limite_bytes`` e ``idade_maxima`` (segundos sem
+    uso): a cada ``intervalo_coleta`` uma thread remove os arquivos vencidos
+    e, acima do limite, os usados há mais tempo.
+    """
+
+    def __init__(self, pasta_cache, processos=2, limite_bytes=None, idade_maxima=None, intervalo_coleta=300):
+        self.pasta_cache = pasta_cache
+        self.processos = processos
+        self.limite_bytes = limite_bytes
+        self.idade_maxima = idade_maxima
+        self.intervalo_coleta = intervalo_coleta
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pendentes = {}
+        self._ultima_coleta = time.monotonic()
+        self._coletando = False
+        self._uso = {'arquivos': 0, 'bytes': 0, 'removidos': 0, 'bytes_removidos': 0, 'coletas': 0}
+        os.makedirs(pasta_cache, exist_ok=True)
+
+    def _obter_executor(self):
+        if self._executor is None:
+            # spawn evita herdar locks das threads do servidor no fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def caminho(self, dataset_hash, tipo, nivel='completo'):
+        """Caminho do arquivo em cache para a combinação informada"""
+        parametros = dict(NIVEIS[nivel], tipo=tipo)
+        chave = hashlib.sha1(
+            f'{dataset_hash}:{json.dumps(parametros, sort_keys=True)}'.encode('utf-8')
+        ).hexdigest()
+        return os.path.join(self.pasta_cache, f'{chave}.{parametros["formato"]}')
+
+    def solicitar(self, dataset_hash, caminho_dataset, tipo, nivel='completo'):
+        """Agenda a renderização (se necessária) e retorna um Future com o caminho do arquivo"""
+        if tipo not in TIPOS_GRAFICO:
+            raise ValueError(f"Tipo de gráfico não suportado: {tipo}")
+        destino = self.caminho(dataset_hash, tipo, nivel)
+        self._coletar_se_preciso()
+        if os.path.exists(destino):
+            # Marca o uso, para que a coleta remova primeiro os gráficos esquecidos
+            try:
+                os.utime(destino)
+            except OSError:
+                pass
+            futuro = Future()
+            futuro.set_result(destino)
+            return futuro
+
+        with self._lock:
+            futuro = self._pendentes.get(destino)
+            if futuro is None:
+                futuro = self._obter_executor().submit(
+                    _renderizar, caminho_dataset, tipo, destino, NIVEIS[nivel]['dpi']
+                )
+                self._pendentes[destino] = futuro
+                inicio = time.perf_counter()
+                futuro.add_done_callback(lambda f: self._descartar_pendente(destino, f, inicio))
+        return futuro
+
+    def _descartar_pendente(self, destino, futuro, inicio):
+        with self._lock:
+            self._pendentes.pop(destino, None)
+        # Tempo do pedido até o arquivo pronto, incluindo a espera por um processo livre
+        registro_metricas.etapas.observar(time.perf_counter() - inicio, 'renderizar_grafico')
+        if not futuro.cancelled() and futuro.exception() is not None:
+            registro_metricas.erros_etapas.incrementar(1, 'renderizar_grafico')
+
+    def obter(self, dataset_hash, caminho_dataset, tipo, nivel='completo', timeout=60):
+        """Retorna o caminho do gráfico, aguardando a renderização se preciso"""
+        return self.solicitar(dataset_hash, caminho_dataset, tipo, nivel).result(timeout=timeout)
+
+    def reaproveitar(self, hash_origem, hash_destino, tipos):
+        """Associa à nova versão os gráficos já renderizados que não mudaram.
+
+        Usa links físicos (ou cópias, se o sistema não suportar) e retorna
+        quantos arquivos foram reaproveitados.
+        """
+        reaproveitados = 0
+        for tipo in tipos:
+            for nivel in NIVEIS:
+                origem = self.caminho(hash_origem, tipo, nivel)
+                destino = self.caminho(hash_destino, tipo, nivel)
+                if not os.path.exists(origem) or os.path.exists(destino):
+                    continue
+                try:
+                    os.link(origem, destino)
+                except OSError:
+                    shutil.copyfile(origem, destino)
+                reaproveitados += 1
+        return reaproveitados
+
+    def _coletar_se_preciso(self):
+        """Dispara a coleta em segundo plano quando o intervalo tiver passado"""
+        with self._lock:
+            if self._coletando or time.monotonic() - self._ultima_coleta < self.intervalo_coleta:
+                return
+            self._coletando = True
+        threading.Thread(target=self.coletar, name='coleta-graficos', daemon=True).start()
+
+    def coletar(self):
+        """Remove gráficos sem uso há mais de ``idade_maxima`` e, acima de ``limite_bytes``,
+        os usados há mais tempo. Retorna quantos arquivos foram removidos."""
+        try:
+            with self._lock:
+                em_renderizacao = set(self._pendentes)
+            arquivos = []
+            with os.scandir(self.pasta_cache) as entradas:
+                for entrada in entradas:
+                    # Temporários pertencem a renderizações em andamento
+                    if not entrada.is_file() or '.tmp' in entrada.name or entrada.path in em_renderizacao:
+                        continue
+                    info = entrada.stat()
+                    arquivos.append((info.st_mtime, info.st_size, entrada.path))
+            arquivos.sort()
+
+            agora = time.time()
+            total = sum(tamanho for _, tamanho, _ in arquivos)
+            removidos = bytes_removidos = 0
+            for usado_em, tamanho, caminho in arquivos:
+                vencido = self.idade_maxima is not None and agora - usado_em > self.idade_maxima
+                excedente = self.limite_bytes is not None and total > self.limite_bytes
+                if not vencido and not excedente:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+                removidos += 1
+                bytes_removidos += tamanho
+
+            with self._lock:
+                self._uso['arquivos'] = len(arquivos) - removidos
+                self._uso['bytes'] = total
+                self._uso['removidos'] += removidos
+                self._uso['bytes_removidos'] += bytes_removidos
+                self._uso['coletas'] += 1
+            if removidos:
+                logger.info("Coleta de gráficos: %d arquivo(s), %d bytes removidos", removidos, bytes_removidos)
+            return removidos
+        finally:
+            with self._lock:
+                self._coletando = False
+                self._ultima_coleta = time.monotonic()
+
+    def metricas(self):
+        """Uso de disco da pasta de gráficos (na última coleta) e renderizações em andamento"""
+        with self._lock:
+            return {
+                'limite_bytes': self.limite_bytes,
+                'idade_maxima_s': self.idade_maxima,
+                'em_renderizacao': len(self._pendentes),
+                **self._uso
+            }
+
+    def aquecer(self):
+        """Sobe os processos do pool e importa neles as bibliotecas de gráficos, sem bloquear.
+
+        Com spawn, cada processo reimporta o app na primeira tarefa; sem
+        isso, o primeiro gráfico pagaria esse custo dentro do prazo da
+        requisição.
+        """
+        executor = self._obter_executor()
+        for _ in range(self.processos):
+            executor.submit(_aquecer_processo).add_done_callback(self._registrar_falha)
+
+    def pre_renderizar(self, dataset_hash, caminho_dataset, niveis=('completo', 'previa')):
+        """Agenda todos os gráficos de um dataset sem bloquear"""
+        for tipo in TIPOS_GRAFICO:
+            for nivel in niveis:
+                futuro = self.solicitar(dataset_hash, caminho_dataset, tipo, nivel)
+                futuro.add_done_callback(self._registrar_falha)
+
+    @staticmethod
+    def _registrar_falha(futuro):
+        erro = None if futuro.cancelled() else futuro.exception()
+        if erro is not None:
+            logger.error("Erro ao renderizar gráfico: %s", erro)
+
+    def encerrar(self):
+        """Encerra o pool de processos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
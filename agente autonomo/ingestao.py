@@ -0,0 +1,183 @@
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_BLOCO = 50_000
+TAMANHO_AMOSTRA = 64 * 1024
+DELIMITADORES = ';,\t|'
+
+_INT32 = np.iinfo(np.int32)
+_INT16 = np.iinfo(np.int16)
+
+
+def detectar_delimitador(amostra, padrao=';'):
+    """Detecta o delimitador do CSV a partir de uma amostra do início do arquivo"""
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=DELIMITADORES).delimiter
+    except csv.Error:
+        return padrao
+
+
+def otimizar_tipos(df, coluna_ano='Ano/Estados'):
+    """Reduz os tipos das colunas: inteiros para int32, reais para float32,
+    ano para int16 e textos repetitivos para category"""
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna == coluna_ano and pd.api.types.is_integer_dtype(serie):
+            if serie.min() >= _INT16.min and serie.max() <= _INT16.max:
+                df[coluna] = serie.astype(np.int16)
+        elif pd.api.types.is_integer_dtype(serie):
+            if serie.min() >= _INT32.min and serie.max() <= _INT32.max:
+                df[coluna] = serie.astype(np.int32)
+        elif pd.api.types.is_float_dtype(serie):
+            df[coluna] = serie.astype(np.float32)
+        elif serie.dtype == object and len(serie) and serie.nunique() <= len(serie) // 2:
+            df[coluna] = serie.astype('category')
+    return df
+
+
+class AgregadosIncrementais:
+    """Soma, contagem, mínimo e máximo (com o ano) de cada coluna numérica,
+    atualizados bloco a bloco durante a leitura"""
+
+    def __init__(self, coluna_ano='Ano/Estados'):
+        self.coluna_ano = coluna_ano
+        self.colunas = None
+        self.linhas = 0
+        self.contagem = None
+        self.soma = None
+        self.minimo = None
+        self.maximo = None
+        self.ano_minimo = None
+        self.ano_maximo = None
+
+    def atualizar(self, bloco):
+        """Incorpora um bloco de linhas aos agregados"""
+        if self.colunas is None:
+            self.colunas = [c for c in bloco.columns
+                            if c != self.coluna_ano and pd.api.types.is_numeric_dtype(bloco[c])]
+            n = len(self.colunas)
+            self.contagem = np.zeros(n, dtype=np.int64)
+            self.soma = np.zeros(n, dtype=np.float64)
+            self.minimo = np.full(n, np.inf)
+            self.maximo = np.full(n, -np.inf)
+            self.ano_minimo = np.zeros(n, dtype=np.int64)
+            self.ano_maximo = np.zeros(n, dtype=np.int64)
+        if bloco.empty:
+            return
+
+        valores = bloco[self.colunas].to_numpy(dtype=np.float64)
+        anos = bloco[self.coluna_ano].to_numpy()
+        validos = ~np.isnan(valores)
+        self.linhas += len(bloco)
+        self.contagem += validos.sum(axis=0)
+        self.soma += np.where(validos, valores, 0).sum(axis=0)
+
+        # Só substitui o extremo se for estritamente maior/menor, preservando a
+        # primeira ocorrência como em idxmax/idxmin
+        com_valor = validos.any(axis=0)
+        posicao_max = np.argmax(np.where(validos, valores, -np.inf), axis=0)
+        bloco_max = np.where(com_valor, valores[posicao_max, np.arange(len(self.colunas))], -np.inf)
+        novo_max = bloco_max > self.maximo
+        self.maximo = np.where(novo_max, bloco_max, self.maximo)
+        self.ano_maximo = np.where(novo_max, anos[posicao_max], self.ano_maximo)
+
+        posicao_min = np.argmin(np.where(validos, valores, np.inf), axis=0)
+        bloco_min = np.where(com_valor, valores[posicao_min, np.arange(len(self.colunas))], np.inf)
+        novo_min = bloco_min < self.minimo
+        self.minimo = np.where(novo_min, bloco_min, self.minimo)
+        self.ano_minimo = np.where(novo_min, anos[posicao_min], self.ano_minimo)
+
+    def media(self):
+        """Média de cada coluna considerando apenas valores presentes"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.soma / self.contagem
+
+    def resumo(self):
+        """Retorna os agregados como dicionário por coluna"""
+        medias = self.media()
+        return {
+            coluna: {
+                'soma': self.soma[i],
+                'media': medias[i],
+                'minimo': self.minimo[i],
+                'maximo': self.maximo[i],
+                'ano_minimo': self.ano_minimo[i],
+                'ano_maximo': self.ano_maximo[i]
+            }
+            for i, coluna in enumerate(self.colunas or [])
+        }
+
+
+class _LeitorEspelhado(io.RawIOBase):
+    """Repassa a leitura de um stream gravando uma cópia dos bytes lidos"""
+
+    def __init__(self, origem, destino, prefixo=b''):
+        self._origem = origem
+        self._destino = destino
+        self._prefixo = prefixo
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefixo:
+            n = min(len(buffer), len(self._prefixo))
+            dados = self._prefixo[:n]
+            self._prefixo = self._prefixo[n:]
+        else:
+            dados = self._origem.read(len(buffer))
+        n = len(dados)
+        buffer[:n] = dados
+        if self._destino is not None and n:
+            self._destino.write(dados)
+        return n
+
+
+def ler_csv(origem, copia=None, coluna_ano='Ano/Estados', tamanho_bloco=TAMANHO_BLOCO):
+    """Lê um CSV em blocos, detectando o delimitador e reduzindo os tipos.
+
+    ``origem`` pode ser um caminho ou um stream binário (por exemplo, o upload
+    recebido pelo Flask). Se ``copia`` for informado, os bytes lidos são
+    gravados nesse caminho durante a própria leitura, sem uma segunda passada.
+    Retorna o DataFrame e os ``AgregadosIncrementais`` calculados na leitura,
+    a partir dos mesmos valores (já com os tipos reduzidos) guardados no
+    DataFrame.
+
+    Como o número de linhas só é conhecido no fim, os blocos reduzidos são
+    concatenados ao final: o pico de memória fica em cerca de duas vezes o
+    DataFrame resultante, mais um bloco de ``tamanho_bloco`` linhas com os
+    tipos do pandas.
+    """
+    abriu_origem = isinstance(origem, (str, bytes)) or hasattr(origem, '__fspath__')
+    stream = open(origem, 'rb') if abriu_origem else origem
+    destino = open(copia, 'wb') if copia else None
+    try:
+        prefixo = stream.read(TAMANHO_AMOSTRA)
+        amostra = prefixo.decode('utf-8-sig', errors='ignore')
+        delimitador = detectar_delimitador(amostra.rsplit('\n', 1)[0] if '\n' in amostra else amostra)
+
+        leitor = io.BufferedReader(_LeitorEspelhado(stream, destino, prefixo), buffer_size=TAMANHO_AMOSTRA)
+        agregados = AgregadosIncrementais(coluna_ano)
+        blocos = []
+        for bloco in pd.read_csv(leitor, sep=delimitador, chunksize=tamanho_bloco, encoding='utf-8-sig'):
+            bloco.columns = bloco.columns.str.strip()
+            agregados.coluna_ano = coluna_ano if coluna_ano in bloco.columns else bloco.columns[0]
+            bloco = otimizar_tipos(bloco, coluna_ano)
+            agregados.atualizar(bloco)
+            blocos.append(bloco)
+            del bloco
+
+        if not blocos:
+            raise ValueError("Arquivo CSV vazio")
+        df = pd.concat(blocos, ignore_index=True) if len(blocos) > 1 else blocos[0]
+        # Os blocos saem da memória antes da redução final dos tipos
+        blocos.clear()
+        return otimizar_tipos(df, coluna_ano), agregados
+    finally:
+        if destino is not None:
+            destino.close()
+        if abriu_origem:
+            stream.close()
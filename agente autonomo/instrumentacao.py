@@ -0,0 +1,336 @@
+"""Instrumentação de baixo custo do pipeline.
+
+- ``etapa(nome)``: cronometra um trecho e o registra no histograma
+  ``agente_etapa_segundos`` (carga do CSV, estatísticas, prompt, LLM...);
+- ``RegistroMetricas``: histogramas, contadores e medidores lidos só na
+  coleta, exportados no formato texto do Prometheus (rota ``/metrics``);
+- ``Perfilador``: amostragem opcional das pilhas das execuções lentas, gravadas
+  no formato "folded" (flamegraph.pl, speedscope);
+- ``FiltroTaxa``: limita quantas vezes a mesma mensagem de log é emitida.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Limites (em segundos) dos baldes dos histogramas de tempo
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """Contagens por balde, soma e total de observações, por combinação de rótulos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, rotulos=(), limites=LIMITES_SEGUNDOS):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observar(self, valor, *rotulos):
+        indice = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                # Baldes não cumulativos (o último é o +Inf), soma e contagem
+                serie = self._series[rotulos] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self):
+        with self._lock:
+            series = {rotulos: (list(baldes), soma, total) for rotulos, (baldes, soma, total) in self._series.items()}
+        for rotulos, (baldes, soma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, quantidade in zip(self.limites + (float('inf'),), baldes):
+                acumulado += quantidade
+                le = 'le="%s"' % _numero(limite)
+                yield f'{self.nome}_bucket{_rotulos(self.rotulos, rotulos, le)} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {_numero(soma)}'
+            yield f'{self.nome}_count{_rotulos(self.rotulos, rotulos)} {total}'
+
+
+class Contador:
+    """Contador monotônico por combinação de rótulos"""
+
+    tipo = 'counter'
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._valores = Counter()
+
+    def incrementar(self, valor=1, *rotulos):
+        with self._lock:
+            self._valores[rotulos] += valor
+
+    def linhas(self):
+        with self._lock:
+            valores = dict(self._valores)
+        for rotulos, valor in sorted(valores.items()):
+            yield f'{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}'
+
+
+class Medidor:
+    """Valor lido de ``funcao`` no momento da coleta (sem custo no caminho quente).
+
+    ``funcao`` retorna um número ou, com ``rotulo``, um dicionário
+    {valor do rótulo: número}.
+    """
+
+    def __init__(self, nome, descricao, funcao, tipo='gauge', rotulo=None):
+        self.nome = nome
+        self.descricao = descricao
+        self.funcao = funcao
+        self.tipo = tipo
+        self.rotulo = rotulo
+
+    def linhas(self):
+        valor = self.funcao()
+        if self.rotulo is None:
+            if valor is not None:
+                yield f'{self.nome} {_numero(valor)}'
+            return
+        for rotulo, numero in sorted(valor.items()):
+            if numero is not None:
+                yield f'{self.nome}{_rotulos((self.rotulo,), (rotulo,))} {_numero(numero)}'
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas juntas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+        # Resultados das funções lidas uma vez por coleta (ver ``instantaneo``)
+        self._coleta = threading.local()
+        self.etapas = self.histograma('agente_etapa_segundos', 'Duração de cada etapa do pipeline', ('etapa',))
+        self.erros_etapas = self.contador('agente_etapa_erros_total', 'Etapas encerradas por exceção', ('etapa',))
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def histograma(self, nome, descricao, rotulos=(), limites=LIMITES_SEGUNDOS):
+        return self._registrar(Histograma(nome, descricao, rotulos, limites))
+
+    def contador(self, nome, descricao, rotulos=()):
+        return self._registrar(Contador(nome, descricao, rotulos))
+
+    def medidor(self, nome, descricao, funcao, tipo='gauge', rotulo=None):
+        return self._registrar(Medidor(nome, descricao, funcao, tipo, rotulo))
+
+    def instantaneo(self, funcao):
+        """Envolve ``funcao`` para que seja chamada uma única vez por coleta.
+
+        Vários medidores lidos do mesmo retorno (por exemplo, o dicionário de
+        ``metricas()`` de um componente) compartilham um único retrato,
+        coerente entre si, em vez de uma chamada por medidor.
+        """
+        def ler():
+            valores = getattr(self._coleta, 'valores', None)
+            if valores is None:
+                return funcao()
+            if ler not in valores:
+                valores[ler] = funcao()
+            return valores[ler]
+        return ler
+
+    @contextmanager
+    def etapa(self, nome):
+        """Cronometra o bloco e registra a duração (também quando ele falha)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.erros_etapas.incrementar(1, nome)
+            raise
+        finally:
+            self.etapas.observar(time.perf_counter() - inicio, nome)
+
+    def exportar(self):
+        """Todas as métricas no formato texto de exposição do Prometheus"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas = []
+        self._coleta.valores = {}
+        try:
+            for metrica in metricas:
+                try:
+                    amostras = list(metrica.linhas())
+                except Exception:
+                    # Um medidor com problema não derruba a coleta das demais
+                    logging.getLogger(__name__).exception("Erro ao coletar a métrica %s", metrica.nome)
+                    continue
+                linhas.append(f'# HELP {metrica.nome} {metrica.descricao}')
+                linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+                linhas.extend(amostras)
+        finally:
+            self._coleta.valores = None
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro do processo, usado pelos módulos do app
+registro_metricas = RegistroMetricas()
+etapa = registro_metricas.etapa
+
+
+class Perfilador:
+    """Amostra as pilhas das execuções em andamento e grava as que passam do limiar.
+
+    Uma única thread lê ``sys._current_frames()`` a cada ``intervalo``
+    segundos, apenas enquanto há execuções sendo perfiladas. Cada execução
+    acima de ``limiar`` segundos vira um arquivo ``.folded`` na ``pasta``
+    (uma pilha por linha, da raiz à folha, seguida do número de amostras);
+    só os ``max_arquivos`` mais recentes são mantidos.
+    """
+
+    def __init__(self, pasta, limiar=1.0, intervalo=0.005, max_arquivos=100):
+        self.pasta = pasta
+        self.limiar = limiar
+        self.intervalo = intervalo
+        self.max_arquivos = max_arquivos
+        self._condicao = threading.Condition()
+        self._ativos = {}
+        self._thread = None
+        self.gravados = 0
+        os.makedirs(pasta, exist_ok=True)
+
+    def iniciar(self):
+        """Passa a amostrar a thread atual; retorna o marcador entregue a ``finalizar``"""
+        ident = threading.get_ident()
+        pilhas = Counter()
+        with self._condicao:
+            self._ativos[ident] = pilhas
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._amostrar, name='perfilador', daemon=True)
+                self._thread.start()
+            self._condicao.notify()
+        return ident, pilhas, time.perf_counter()
+
+    def finalizar(self, marcador, nome):
+        """Para de amostrar e grava o perfil se a execução passou do limiar"""
+        ident, pilhas, inicio = marcador
+        with self._condicao:
+            if self._ativos.get(ident) is pilhas:
+                del self._ativos[ident]
+        duracao = time.perf_counter() - inicio
+        if duracao >= self.limiar and pilhas:
+            try:
+                self._gravar(nome, duracao, pilhas)
+            except OSError:
+                logging.getLogger(__name__).exception("Erro ao gravar o perfil de %s", nome)
+
+    @contextmanager
+    def perfilar(self, nome):
+        marcador = self.iniciar()
+        try:
+            yield
+        finally:
+            self.finalizar(marcador, nome)
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(lambda: self._ativos)
+                ativos = list(self._ativos.items())
+            quadros = sys._current_frames()
+            for ident, pilhas in ativos:
+                quadro = quadros.get(ident)
+                if quadro is None or ident == proprio:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    pilha.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})')
+                    quadro = quadro.f_back
+                pilhas[';'.join(reversed(pilha))] += 1
+            del quadros
+            time.sleep(self.intervalo)
+
+    def _gravar(self, nome, duracao, pilhas):
+        seguro = ''.join(c if c.isalnum() or c in '-_' else '_' for c in nome).strip('_') or 'execucao'
+        arquivo = os.path.join(
+            self.pasta, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{seguro[:60]}-{duracao * 1000:.0f}ms.folded"
+        )
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            for pilha, amostras in pilhas.most_common():
+                f.write(f'{pilha} {amostras}\n')
+        self.gravados += 1
+        logging.getLogger(__name__).warning("%s levou %.0f ms; perfil salvo em %s", nome, duracao * 1000, arquivo)
+
+        arquivos = sorted(
+            (entrada for entrada in os.scandir(self.pasta) if entrada.name.endswith('.folded')),
+            key=lambda entrada: entrada.name
+        )
+        for entrada in arquivos[:-self.max_arquivos]:
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
+
+
+class FiltroTaxa(logging.Filter):
+    """Deixa passar no máximo ``limite`` registros da mesma mensagem por ``intervalo``.
+
+    A mensagem é identificada pelo logger e pelo texto antes da formatação,
+    de modo que "Pergunta %s" com argumentos diferentes conta como uma só.
+    Quantos registros foram suprimidos é anexado ao próximo liberado.
+    """
+
+    def __init__(self, limite=20, intervalo=60.0):
+        super().__init__()
+        self.limite = limite
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._janelas = {}
+        self.suprimidos = 0
+
+    def filter(self, registro):
+        chave = (registro.name, registro.msg if isinstance(registro.msg, str) else type(registro.msg))
+        agora = time.monotonic()
+        with self._lock:
+            janela = self._janelas.get(chave)
+            if janela is None or agora - janela[0] >= self.intervalo:
+                suprimidos = janela[2] if janela is not None else 0
+                janela = self._janelas[chave] = [agora, 0, 0]
+                if len(self._janelas) > 10000:
+                    # Mensagens montadas com f-string não se repetem: descarta as janelas antigas
+                    self._janelas = {c: j for c, j in self._janelas.items() if agora - j[0] < self.intervalo}
+                if suprimidos:
+                    registro.msg = f'{registro.msg} [{suprimidos} mensagem(ns) igual(is) suprimida(s)]'
+            if janela[1] >= self.limite:
+                janela[2] += 1
+                self.suprimidos += 1
+                return False
+            janela[1] += 1
+            return True
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+from construtor_prompt import estimar_tokens
+
+# O aiohttp só é importado quando o gateway abre a sessão HTTP (ver _importar_aiohttp)
+aiohttp = None
+
+
+def _importar_aiohttp():
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as modulo
+        aiohttp = modulo
+    return aiohttp
+
+
+class ErroLLM(Exception):
+    """Falha ao consultar a API do LLM"""
+
+    def __init__(self, mensagem, status=None):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class CircuitoAberto(ErroLLM):
+    """Lançada sem chamar a API enquanto o disjuntor estiver aberto"""
+
+
+class Disjuntor:
+    """Circuit breaker: abre após falhas seguidas e libera uma sondagem após o intervalo.
+
+    Usado apenas dentro do laço de eventos do gateway, portanto sem lock.
+    """
+
+    def __init__(self, limite_falhas=5, tempo_abertura=30):
+        self.limite_falhas = limite_falhas
+        self.tempo_abertura = tempo_abertura
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self.aberto_em = None
+        self._sondando = False
+
+    def permitir(self):
+        if self.estado == 'aberto':
+            if time.monotonic() - self.aberto_em < self.tempo_abertura:
+                return False
+            self.estado = 'meio_aberto'
+        if self.estado == 'meio_aberto':
+            # Apenas uma chamada de teste por vez
+            if self._sondando:
+                return False
+            self._sondando = True
+        return True
+
+    def sucesso(self):
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self._sondando = False
+
+    def falha(self):
+        self.falhas_seguidas += 1
+        self._sondando = False
+        if self.estado == 'meio_aberto' or self.falhas_seguidas >= self.limite_falhas:
+            self.estado = 'aberto'
+            self.aberto_em = time.monotonic()
+
+
+class GatewayLLM:
+    """Cliente assíncrono da API de chat e imagens compatível com a OpenAI.
+
+    Roda um laço asyncio próprio em uma thread e mantém uma sessão HTTP com
+    pool de conexões. As chamadas são limitadas por um semáforo, repetidas
+    com backoff exponencial e jitter em 429/5xx e falhas de conexão, e
+    protegidas por um disjuntor. Pedidos idênticos em andamento (sem
+    streaming) são agrupados em uma única chamada à API.
+
+    ``completar`` e ``gerar_imagem`` são síncronos, para uso pelos workers,
+    e nunca esperam além do ``prazo`` informado (instante em
+    ``time.monotonic()``) ou, sem ele, de ``prazo_total`` segundos, somando
+    todas as tentativas. ``url_base`` pode apontar para o servidor falso de
+    ``llm_falso.py``.
+    """
+
+    def __init__(self, chave_api, url_base='https://api.openai.com/v1', modelo='gpt-3.5-turbo',
+                 timeout=60, max_concorrencia=8, tentativas=4, espera_base=0.5, espera_maxima=8.0,
+                 limite_falhas=5, tempo_abertura=30, prazo_total=None):
+        if tentativas < 1:
+            raise ValueError('tentativas deve ser pelo menos 1')
+        self.chave_api = chave_api
+        self.url_base = url_base.rstrip('/')
+        self.modelo = modelo
+        self.timeout = timeout
+        self.prazo_total = prazo_total if prazo_total is not None else timeout
+        self.max_concorrencia = max_concorrencia
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = Disjuntor(limite_falhas, tempo_abertura)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._sessao = None
+        self._semaforo = None
+        self._em_voo = {}
+        self._em_andamento = 0
+        # Os contadores mudam no laço do gateway e são lidos pelas threads das requisições
+        self._lock_contadores = threading.Lock()
+        self._contadores = {
+            'chamadas': 0,
+            'agrupadas': 0,
+            'novas_tentativas': 0,
+            'falhas': 0,
+            'recusadas_circuito': 0,
+            'prazos_esgotados': 0
+        }
+
+    def _contar(self, contador):
+        with self._lock_contadores:
+            self._contadores[contador] += 1
+
+    def _garantir_loop(self):
+        """Inicia o laço de eventos e a sessão HTTP na primeira chamada"""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='gateway-llm', daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._abrir_sessao(), loop).result()
+            self._loop = loop
+            return loop
+
+    async def _abrir_sessao(self):
+        _importar_aiohttp()
+        self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+        self._sessao = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concorrencia, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'Authorization': f'Bearer {self.chave_api}'}
+        )
+
+    def _executar(self, corrotina, prazo=None):
+        """Roda ``corrotina`` no laço do gateway, desistindo ao atingir o prazo"""
+        restante = (prazo - time.monotonic()) if prazo is not None else self.prazo_total
+        if restante <= 0:
+            corrotina.close()
+            self._contar('prazos_esgotados')
+            raise ErroLLM('Prazo esgotado antes de consultar a API do LLM')
+        futuro = asyncio.run_coroutine_threadsafe(asyncio.wait_for(corrotina, restante), self._garantir_loop())
+        try:
+            # Margem para o cancelamento feito pelo wait_for chegar até aqui
+            return futuro.result(timeout=restante + 1)
+        except TimeoutError:
+            futuro.cancel()
+            self._contar('prazos_esgotados')
+            raise ErroLLM(f'Prazo de {restante:.1f}s esgotado na consulta à API do LLM') from None
+
+    def encerrar(self):
+        """Fecha a sessão HTTP e para o laço de eventos"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._sessao.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _espera(self, tentativa, retry_after=None):
+        """Backoff exponencial com jitter total, respeitando o Retry-After da API"""
+        espera = random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+        if retry_after is not None:
+            espera = max(espera, min(retry_after, self.espera_maxima))
+        return espera
+
+    async def _com_tentativas(self, caminho, corpo, ler):
+        """POST com novas tentativas; ``ler`` converte a resposta HTTP bem-sucedida"""
+        for tentativa in range(self.tentativas):
+            if not self.disjuntor.permitir():
+                self._contar('recusadas_circuito')
+                raise CircuitoAberto('API do LLM indisponível (circuito aberto)')
+            retry_after = None
+            try:
+                async with self._semaforo:
+                    self._em_andamento += 1
+                    try:
+                        self._contar('chamadas')
+                        async with self._sessao.post(self.url_base + caminho, json=corpo) as resposta:
+                            if resposta.status == 429:
+                                # Limite de requisições: não é falha do serviço
+                                self.disjuntor.sucesso()
+                                erro = ErroLLM('Limite de requisições da API atingido', 429)
+                                retry_after = _segundos(resposta.headers.get('Retry-After'))
+                            elif resposta.status >= 500:
+                                self.disjuntor.falha()
+                                erro = ErroLLM(f'Erro {resposta.status} na API do LLM', resposta.status)
+                            elif resposta.status >= 400:
+                                self.disjuntor.sucesso()
+                                detalhe = (await resposta.text())[:200]
+                                raise ErroLLM(f'Requisição recusada pela API ({resposta.status}): {detalhe}', resposta.status)
+                            else:
+                                resultado = await ler(resposta)
+                                self.disjuntor.sucesso()
+                                return resultado
+                    finally:
+                        self._em_andamento -= 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.disjuntor.falha()
+                erro = ErroLLM(f'Falha de conexão com a API do LLM: {str(e) or type(e).__name__}')
+
+            if tentativa + 1 < self.tentativas:
+                self._contar('novas_tentativas')
+                await asyncio.sleep(self._espera(tentativa, retry_after))
+        self._contar('falhas')
+        raise erro
+
+    async def _agrupar(self, chave, fabrica):
+        """Compartilha o resultado de um pedido idêntico já em andamento.
+
+        Retorna (resultado, agrupado).
+        """
+        tarefa = self._em_voo.get(chave)
+        if tarefa is not None:
+            self._contar('agrupadas')
+            return await asyncio.shield(tarefa), True
+        tarefa = asyncio.ensure_future(fabrica())
+        self._em_voo[chave] = tarefa
+        tarefa.add_done_callback(lambda _: self._em_voo.pop(chave, None))
+        # Se todos que esperavam desistirem, ninguém mais lê o erro da tarefa
+        tarefa.add_done_callback(_consumir_erro)
+        return await asyncio.shield(tarefa), False
+
+    async def completar_async(self, mensagens, temperatura=0.7, max_tokens=1000, ao_receber=None, uso=None):
+        """Versão assíncrona de ``completar``"""
+        corpo = {
+            'model': self.modelo,
+            'messages': mensagens,
+            'temperature': temperatura,
+            'max_tokens': max_tokens
+        }
+        if ao_receber is not None:
+            texto = await self._com_tentativas('/chat/completions', dict(corpo, stream=True), _leitor_stream(ao_receber))
+            if uso is not None:
+                # O streaming não informa o uso; estima a partir do texto
+                uso['tokens_prompt'] = sum(estimar_tokens(mensagem['content']) for mensagem in mensagens)
+                uso['tokens_resposta'] = estimar_tokens(texto)
+            return texto
+
+        chave = ('chat', json.dumps(corpo, sort_keys=True, ensure_ascii=False))
+        (texto, tokens), agrupado = await self._agrupar(
+            chave, lambda: self._com_tentativas('/chat/completions', corpo, _ler_chat)
+        )
+        if uso is not None:
+            # Pedidos agrupados não geram custo adicional
+            uso['tokens_prompt'] = 0 if agrupado else tokens.get('prompt_tokens', 0)
+            uso['tokens_resposta'] = 0 if agrupado else tokens.get('completion_tokens', 0)
+        return texto
+
+    def completar(self, mensagens, temperatura=0.7, max_tokens=1000, ao_receber=None, uso=None, prazo=None):
+        """Retorna o texto da resposta; com ``ao_receber``, repassa cada trecho recebido.
+
+        Se ``uso`` for um dicionário, recebe 'tokens_prompt' e 'tokens_resposta'.
+        Passado ``prazo`` (em ``time.monotonic()``) lança ``ErroLLM``.
+        """
+        return self._executar(self.completar_async(mensagens, temperatura, max_tokens, ao_receber, uso), prazo)
+
+    async def gerar_imagem_async(self, prompt, tamanho='512x512'):
+        """Versão assíncrona de ``gerar_imagem``"""
+        corpo = {'prompt': prompt, 'n': 1, 'size': tamanho}
+        chave = ('imagem', prompt, tamanho)
+        url, _ = await self._agrupar(
+            chave, lambda: self._com_tentativas('/images/generations', corpo, _ler_imagem)
+        )
+        return url
+
+    def gerar_imagem(self, prompt, tamanho='512x512', prazo=None):
+        """Gera uma imagem com a API DALL-E e retorna sua URL"""
+        return self._executar(self.gerar_imagem_async(prompt, tamanho), prazo)
+
+    def metricas(self):
+        """Contadores de chamadas, agrupamentos, novas tentativas e estado do circuito"""
+        with self._lock_contadores:
+            contadores = dict(self._contadores)
+        return {
+            'max_concorrencia': self.max_concorrencia,
+            'em_andamento': self._em_andamento,
+            'circuito': self.disjuntor.estado,
+            **contadores
+        }
+
+
+def _consumir_erro(tarefa):
+    if not tarefa.cancelled():
+        tarefa.exception()
+
+
+def _segundos(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _ler_chat(resposta):
+    dados = await resposta.json()
+    return dados['choices'][0]['message']['content'], dados.get('usage', {})
+
+
+async def _ler_imagem(resposta):
+    dados = await resposta.json()
+    return dados['data'][0]['url']
+
+
+def _leitor_stream(ao_receber):
+    """Lê os eventos SSE do streaming de chat, repassando cada trecho a ``ao_receber``"""
+    async def ler(resposta):
+        partes = []
+        try:
+            async for linha in resposta.content:
+                linha = linha.decode('utf-8').strip()
+                if not linha.startswith('data:'):
+                    continue
+                dados = linha[5:].strip()
+                if dados == '[DONE]':
+                    break
+                texto = json.loads(dados)['choices'][0]['delta'].get('content')
+                if texto:
+                    partes.append(texto)
+                    ao_receber(texto)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Trechos já foram entregues; repetir a chamada duplicaria o texto
+            raise ErroLLM(f'Streaming interrompido: {str(e) or type(e).__name__}')
+        return ''.join(partes)
+    return ler
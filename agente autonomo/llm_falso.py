@@ -0,0 +1,106 @@
+"""Servidor local que imita a API de chat e imagens da OpenAI.
+
+Permite testar carga e vazão sem rede nem custo:
+
+    python llm_falso.py --porta 8001 --latencia 0.5 --taxa-limite 0.05
+    AGENTE_LLM_URL=http://127.0.0.1:8001/v1 python app.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+from construtor_prompt import estimar_tokens
+
+
+def criar_app(latencia=0.5, taxa_limite=0.0, taxa_falha=0.0, max_concorrencia=None):
+    """Cria o app aiohttp; as taxas são probabilidades de responder 429 ou 500"""
+    estatisticas = {'requisicoes': 0, 'limitadas': 0, 'falhas': 0, 'em_andamento': 0, 'pico_concorrencia': 0}
+
+    def recusar():
+        """Simula limite de requisições e falhas do serviço"""
+        if max_concorrencia is not None and estatisticas['em_andamento'] > max_concorrencia \
+                or random.random() < taxa_limite:
+            estatisticas['limitadas'] += 1
+            return web.json_response({'error': {'message': 'Rate limit reached'}}, status=429,
+                                     headers={'Retry-After': '1'})
+        if random.random() < taxa_falha:
+            estatisticas['falhas'] += 1
+            return web.json_response({'error': {'message': 'Server error'}}, status=500)
+        return None
+
+    async def chat(request):
+        estatisticas['requisicoes'] += 1
+        estatisticas['em_andamento'] += 1
+        estatisticas['pico_concorrencia'] = max(estatisticas['pico_concorrencia'], estatisticas['em_andamento'])
+        try:
+            recusa = recusar()
+            if recusa is not None:
+                return recusa
+            corpo = await request.json()
+            pergunta = corpo['messages'][-1]['content'].rsplit('Pergunta:', 1)[-1].strip()
+            texto = f"Resposta simulada para: {pergunta[:80]}"
+            tokens_prompt = sum(estimar_tokens(mensagem['content']) for mensagem in corpo['messages'])
+
+            if not corpo.get('stream'):
+                await asyncio.sleep(latencia)
+                return web.json_response({
+                    'id': f'falso-{time.time_ns()}',
+                    'object': 'chat.completion',
+                    'model': corpo.get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': texto}, 'finish_reason': 'stop'}],
+                    'usage': {
+                        'prompt_tokens': tokens_prompt,
+                        'completion_tokens': estimar_tokens(texto),
+                        'total_tokens': tokens_prompt + estimar_tokens(texto)
+                    }
+                })
+
+            resposta = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await resposta.prepare(request)
+            palavras = texto.split(' ')
+            for i, palavra in enumerate(palavras):
+                await asyncio.sleep(latencia / len(palavras))
+                trecho = palavra if i == 0 else ' ' + palavra
+                evento = {'choices': [{'index': 0, 'delta': {'content': trecho}}]}
+                await resposta.write(f"data: {json.dumps(evento, ensure_ascii=False)}\n\n".encode('utf-8'))
+            await resposta.write(b"data: [DONE]\n\n")
+            return resposta
+        finally:
+            estatisticas['em_andamento'] -= 1
+
+    async def imagens(request):
+        estatisticas['requisicoes'] += 1
+        recusa = recusar()
+        if recusa is not None:
+            return recusa
+        await asyncio.sleep(latencia)
+        return web.json_response({'data': [{'url': 'https://example.com/imagem-falsa.png'}]})
+
+    async def obter_estatisticas(request):
+        return web.json_response(estatisticas)
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat)
+    app.router.add_post('/v1/images/generations', imagens)
+    app.router.add_get('/estatisticas', obter_estatisticas)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='API falsa de LLM para testes de carga')
+    parser.add_argument('--porta', type=int, default=8001)
+    parser.add_argument('--latencia', type=float, default=0.5, help='segundos por resposta')
+    parser.add_argument('--taxa-limite', type=float, default=0.0, help='probabilidade de responder 429')
+    parser.add_argument('--taxa-falha', type=float, default=0.0, help='probabilidade de responder 500')
+    parser.add_argument('--max-concorrencia', type=int, default=None,
+                        help='responde 429 acima deste número de chamadas simultâneas')
+    args = parser.parse_args()
+    web.run_app(
+        criar_app(args.latencia, args.taxa_limite, args.taxa_falha, args.max_concorrencia),
+        host='127.0.0.1',
+        port=args.porta
+    )
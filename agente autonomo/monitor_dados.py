@@ -0,0 +1,229 @@
+"""Observa uma pasta de dados e processa os CSVs novos ou alterados em segundo plano.
+
+No Linux usa inotify (via ctypes, sem dependências); em outros sistemas, ou
+se o inotify não estiver disponível, compara periodicamente o mtime e o
+tamanho dos arquivos. Rajadas de eventos do mesmo arquivo (cópias em
+andamento, editores que gravam em etapas) são agrupadas por um intervalo de
+silêncio antes do processamento.
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Máscaras de linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+MASCARA_INOTIFY = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENTO = struct.Struct('iIII')  # wd, mask, cookie, len (seguido do nome)
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """SHA-1 do conteúdo do arquivo, lido em blocos"""
+    h = hashlib.sha1()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _monitorado(nome):
+    """Apenas CSVs visíveis (ignora temporários como .arquivo.csv.swp)"""
+    return nome.lower().endswith('.csv') and not nome.startswith('.')
+
+
+def _listar_csvs(pasta):
+    with os.scandir(pasta) as entradas:
+        return [entrada.path for entrada in entradas if entrada.is_file() and _monitorado(entrada.name)]
+
+
+class FonteInotify:
+    """Eventos de alteração da pasta pelo inotify do kernel"""
+
+    modo = 'inotify'
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify não disponível')
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+        if libc.inotify_add_watch(self._fd, os.fsencode(pasta), MASCARA_INOTIFY) < 0:
+            erro = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(erro, f'inotify_add_watch falhou em {pasta}')
+
+    def aguardar(self, timeout):
+        """Caminhos alterados até ``timeout`` segundos (conjunto possivelmente vazio)"""
+        prontos, _, _ = select.select([self._fd], [], [], timeout)
+        if not prontos:
+            return set()
+        alterados = set()
+        while True:
+            try:
+                dados = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            posicao = 0
+            while posicao < len(dados):
+                _, mascara, _, tamanho = _EVENTO.unpack_from(dados, posicao)
+                nome = dados[posicao + _EVENTO.size:posicao + _EVENTO.size + tamanho].rstrip(b'\0')
+                posicao += _EVENTO.size + tamanho
+                if mascara & IN_Q_OVERFLOW:
+                    # Eventos perdidos: considera todos os arquivos da pasta
+                    alterados.update(_listar_csvs(self.pasta))
+                elif not mascara & IN_ISDIR and _monitorado(os.fsdecode(nome)):
+                    alterados.add(os.path.join(self.pasta, os.fsdecode(nome)))
+        return alterados
+
+    def fechar(self):
+        os.close(self._fd)
+
+
+class FonteSondagem:
+    """Detecta alterações comparando mtime e tamanho dos arquivos a cada intervalo"""
+
+    modo = 'sondagem'
+
+    def __init__(self, pasta, intervalo=5.0):
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._assinaturas = self._ler_assinaturas()
+
+    def _ler_assinaturas(self):
+        assinaturas = {}
+        for caminho in _listar_csvs(self.pasta):
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            assinaturas[caminho] = (info.st_mtime_ns, info.st_size)
+        return assinaturas
+
+    def aguardar(self, timeout):
+        if self._parar.wait(min(timeout, self.intervalo)):
+            return set()
+        atuais = self._ler_assinaturas()
+        alterados = {caminho for caminho, assinatura in atuais.items()
+                     if self._assinaturas.get(caminho) != assinatura}
+        self._assinaturas = atuais
+        return alterados
+
+    def fechar(self):
+        self._parar.set()
+
+
+class MonitorDados:
+    """Thread que entrega a ``ao_alterar(caminho, hash)`` cada CSV novo ou alterado.
+
+    Um arquivo só é processado depois de ``espera`` segundos sem novos
+    eventos, e apenas se o hash do conteúdo for diferente do último
+    processado (``hashes`` pode vir de um armazenamento persistente, para
+    que alterações feitas com o servidor parado sejam percebidas na
+    partida). Tudo roda fora das requisições.
+    """
+
+    def __init__(self, pasta, ao_alterar, hashes=None, espera=2.0, intervalo_sondagem=5.0, usar_inotify=True):
+        self.pasta = pasta
+        self.ao_alterar = ao_alterar
+        self.espera = espera
+        self.intervalo_sondagem = intervalo_sondagem
+        self.usar_inotify = usar_inotify
+        self._hashes = dict(hashes or {})
+        self._pendentes = {}
+        self._fonte = None
+        self._thread = None
+        self._parar = threading.Event()
+        self._contadores = {'eventos': 0, 'processados': 0, 'sem_mudanca': 0, 'erros': 0}
+        self.ultimo_processamento = None
+        os.makedirs(pasta, exist_ok=True)
+
+    def _criar_fonte(self):
+        if self.usar_inotify:
+            try:
+                return FonteInotify(self.pasta)
+            except (OSError, AttributeError) as e:
+                logger.info("inotify indisponível (%s); usando sondagem a cada %.0f s", e, self.intervalo_sondagem)
+        return FonteSondagem(self.pasta, self.intervalo_sondagem)
+
+    def iniciar(self):
+        """Inicia a thread do monitor; arquivos já presentes são conferidos pelo hash"""
+        if self._thread is not None:
+            return
+        self._fonte = self._criar_fonte()
+        agora = time.monotonic()
+        for caminho in _listar_csvs(self.pasta):
+            self._pendentes[caminho] = agora
+        self._thread = threading.Thread(target=self._executar, name='monitor-dados', daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=5):
+        """Encerra a thread do monitor"""
+        self._parar.set()
+        if self._fonte is not None:
+            self._fonte.fechar()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _executar(self):
+        while not self._parar.is_set():
+            agora = time.monotonic()
+            restante = min((inicio + self.espera - agora for inicio in self._pendentes.values()), default=1.0)
+            try:
+                alterados = self._fonte.aguardar(max(min(restante, 1.0), 0.05))
+            except (OSError, ValueError):
+                if self._parar.is_set():
+                    break
+                raise
+            agora = time.monotonic()
+            for caminho in alterados:
+                self._contadores['eventos'] += 1
+                # Cada novo evento reinicia a espera do arquivo
+                self._pendentes[caminho] = agora
+            for caminho in [c for c, inicio in self._pendentes.items() if agora - inicio >= self.espera]:
+                del self._pendentes[caminho]
+                self._processar(caminho)
+
+    def _processar(self, caminho):
+        try:
+            conteudo = hash_arquivo(caminho)
+        except FileNotFoundError:
+            return
+        if self._hashes.get(caminho) == conteudo:
+            self._contadores['sem_mudanca'] += 1
+            return
+        try:
+            self.ao_alterar(caminho, conteudo)
+        except Exception:
+            # Não marca o hash: o arquivo é tentado de novo na próxima alteração
+            self._contadores['erros'] += 1
+            logger.exception("Erro ao processar %s", caminho)
+            return
+        self._hashes[caminho] = conteudo
+        self._contadores['processados'] += 1
+        self.ultimo_processamento = time.time()
+
+    def metricas(self):
+        """Modo de observação, arquivos aguardando a espera e contadores"""
+        return {
+            'pasta': self.pasta,
+            'modo': self._fonte.modo if self._fonte is not None else None,
+            'pendentes': len(self._pendentes),
+            'ultimo_processamento': self.ultimo_processamento,
+            **self._contadores
+        }
@@ -0,0 +1,359 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class FilaCheiaError(Exception):
+    """Lançada quando a fila de perguntas atingiu a capacidade máxima"""
+
+
+class _Tarefa:
+    """Pergunta enfileirada junto com seus instantes de controle"""
+
+    def __init__(self, pergunta_id, pergunta, dataset_hash=None):
+        self.pergunta_id = pergunta_id
+        self.pergunta = pergunta
+        self.dataset_hash = dataset_hash
+        self.enfileirada_em = time.monotonic()
+        self.iniciada_em = None
+        self.prazo = None
+        self.finalizada = False
+        self.worker = None
+
+
+class _JanelaTempos:
+    """Mantém as últimas amostras de uma medida de tempo para estatísticas"""
+
+    def __init__(self, tamanho=1000):
+        self.amostras = deque(maxlen=tamanho)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        self.amostras.append(segundos)
+        self.total += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def resumo(self):
+        ordenadas = sorted(self.amostras)
+
+        def percentil(p):
+            if not ordenadas:
+                return 0.0
+            return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+        return {
+            'total': self.total,
+            'media': self.soma / self.total if self.total else 0.0,
+            'p50': percentil(0.50),
+            'p95': percentil(0.95),
+            'maximo': self.maximo
+        }
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FilaCompartilhada:
+    """Fila de perguntas no banco SQLite, compartilhada pelos processos do servidor.
+
+    A pergunta gravada como 'pendente' pela rota já é a entrada da fila: cada
+    worker reserva a mais antiga (``ArmazemPerguntas.reservar``) e ela fica
+    marcada com o processo dono até ser respondida. As perguntas de um
+    processo que morreu, ou presas há mais de ``prazo_orfas`` segundos, voltam
+    a ficar pendentes, e as que ninguém reservou continuam no banco durante um
+    reinício. Tem a interface de ``queue.Queue`` usada pelo MotorPerguntas;
+    ``get`` retorna None depois de ``parar``.
+    """
+
+    def __init__(self, armazem, capacidade=100, prazo_orfas=120, intervalo=0.2, dono=None):
+        self.armazem = armazem
+        self.maxsize = capacidade
+        self.prazo_orfas = prazo_orfas
+        self.intervalo = intervalo
+        self.dono = dono or f'{socket.gethostname()}:{os.getpid()}'
+        self._condicao = threading.Condition()
+        self._parada = False
+        self._proxima_recuperacao = 0.0
+
+    def put_nowait(self, tarefa):
+        # A pergunta já está no banco (e já conta como pendente)
+        if self._parada or self.armazem.pendentes() > self.maxsize:
+            raise queue.Full
+        with self._condicao:
+            self._condicao.notify()
+
+    def get(self):
+        while True:
+            with self._condicao:
+                if self._parada:
+                    return None
+            if time.monotonic() >= self._proxima_recuperacao:
+                self._proxima_recuperacao = time.monotonic() + self.prazo_orfas / 4
+                self.recuperar()
+            linha = self.armazem.reservar(self.dono)
+            if linha is not None:
+                tarefa = _Tarefa(linha['id'], linha['pergunta'], linha['dataset_hash'])
+                # Espera contada desde a gravação da pergunta, possivelmente por outro processo
+                tarefa.enfileirada_em -= max(time.time() - linha['criada_em'], 0.0)
+                return tarefa
+            with self._condicao:
+                if not self._parada:
+                    self._condicao.wait(self.intervalo)
+
+    def task_done(self):
+        pass
+
+    def qsize(self):
+        return self.armazem.pendentes()
+
+    def parar(self):
+        """Deixa de reservar perguntas: as pendentes ficam para os outros processos"""
+        with self._condicao:
+            self._parada = True
+            self._condicao.notify_all()
+
+    def devolver(self):
+        """Devolve à fila as perguntas ainda reservadas por este processo"""
+        return self.armazem.devolver(self.dono)
+
+    def recuperar(self):
+        """Devolve à fila as perguntas de processos encerrados ou presas além do prazo"""
+        host = socket.gethostname()
+        devolvidas = 0
+        for dono in self.armazem.donos_em_execucao():
+            host_dono, _, pid = (dono or '').rpartition(':')
+            if dono != self.dono and host_dono == host and pid.isdigit() and not _processo_vivo(int(pid)):
+                devolvidas += self.armazem.devolver(dono)
+        devolvidas += self.armazem.devolver(iniciadas_antes=time.time() - self.prazo_orfas)
+        if devolvidas:
+            logger.warning("%s pergunta(s) de processos encerrados voltaram para a fila", devolvidas)
+        return devolvidas
+
+
+class MotorPerguntas:
+    """Pool de workers que responde às perguntas da fila de forma concorrente.
+
+    Cada worker bloqueia na fila até chegar uma pergunta, sem espera ativa.
+    A fila é limitada: quando está cheia, ``submeter`` lança ``FilaCheiaError``
+    para que a rota possa aplicar backpressure. Perguntas que ultrapassam o
+    ``timeout`` recebem uma resposta de expiração e o resultado tardio é
+    descartado. O processador recebe o prazo (``prazo``, em
+    ``time.monotonic()``) para abandonar o trabalho a tempo; se ainda assim o
+    worker continuar preso, outro é criado no lugar e o antigo termina assim
+    que o processador retornar, de modo que o pool não encolhe.
+
+    Por padrão a fila fica na memória do processo; com ``fila`` (por exemplo
+    uma ``FilaCompartilhada``) os workers de vários processos consomem a
+    mesma fila. ``encerrar`` drena o motor antes de o processo sair.
+    """
+
+    def __init__(self, processador, ao_concluir, num_workers=4, capacidade=100, timeout=60, fila=None):
+        self.processador = processador
+        self.ao_concluir = ao_concluir
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self._fila = fila if fila is not None else queue.Queue(maxsize=capacidade)
+        self._lock = threading.Condition()
+        self._em_execucao = set()
+        self._ativas = 0
+        self._encerrando = False
+        self._workers = []
+        self._proximo_worker = 0
+        self._substituidos = set()
+        self._vigia = None
+        self._contadores = {
+            'recebidas': 0,
+            'concluidas': 0,
+            'rejeitadas': 0,
+            'expiradas': 0,
+            'erros': 0,
+            'workers_substituidos': 0
+        }
+        self._tempo_espera = _JanelaTempos()
+        self._tempo_servico = _JanelaTempos()
+
+    def iniciar(self):
+        """Inicia os workers e a thread de controle de timeouts"""
+        if self._workers:
+            return
+        for _ in range(self.num_workers):
+            self._criar_worker()
+        self._vigia = threading.Thread(target=self._vigiar_prazos, name='vigia-perguntas', daemon=True)
+        self._vigia.start()
+
+    def _criar_worker(self):
+        with self._lock:
+            worker = threading.Thread(target=self._executar, name=f'worker-perguntas-{self._proximo_worker}', daemon=True)
+            self._proximo_worker += 1
+            self._workers.append(worker)
+        worker.start()
+        return worker
+
+    def _substituir_worker(self, worker):
+        """Repõe um worker preso em uma pergunta expirada; chamado com o lock adquirido"""
+        if worker is None or worker in self._substituidos or worker not in self._workers:
+            return False
+        self._substituidos.add(worker)
+        self._workers.remove(worker)
+        self._contadores['workers_substituidos'] += 1
+        self._criar_worker()
+        return True
+
+    def submeter(self, pergunta_id, pergunta, dataset_hash=None):
+        """Enfileira uma pergunta sobre o dataset informado ou lança FilaCheiaError se não houver espaço"""
+        try:
+            if self._encerrando:
+                raise queue.Full
+            self._fila.put_nowait(_Tarefa(pergunta_id, pergunta, dataset_hash))
+        except queue.Full:
+            with self._lock:
+                self._contadores['rejeitadas'] += 1
+            raise FilaCheiaError('Fila de perguntas cheia' if not self._encerrando else 'Servidor encerrando')
+        with self._lock:
+            self._contadores['recebidas'] += 1
+
+    def _executar(self):
+        """Laço principal de cada worker"""
+        while True:
+            tarefa = self._fila.get()
+            if tarefa is None:
+                # Fila parada (encerramento)
+                return
+            with self._lock:
+                self._ativas += 1
+            try:
+                self._processar(tarefa)
+            except Exception as e:
+                logger.exception("Erro inesperado no worker de perguntas: %s", e)
+            finally:
+                self._fila.task_done()
+                with self._lock:
+                    self._ativas -= 1
+                    self._lock.notify_all()
+                    atual = threading.current_thread()
+                    if atual in self._substituidos:
+                        # Outro worker já ocupa o lugar deste, que ficou preso
+                        self._substituidos.discard(atual)
+                        return
+
+    def encerrar(self, timeout=30):
+        """Encerramento gracioso: recusa perguntas novas e espera as aceitas terminarem.
+
+        Com a fila em memória, as perguntas enfileiradas também são
+        respondidas; com a fila compartilhada, as ainda não reservadas ficam
+        para os outros processos e as que não terminarem em ``timeout``
+        segundos voltam para a fila. Retorna True se tudo terminou no prazo.
+        """
+        self._encerrando = True
+        parar = getattr(self._fila, 'parar', None)
+        if parar is not None:
+            parar()
+        limite = time.monotonic() + timeout
+        with self._lock:
+            while self._ativas or (parar is None and self._fila.qsize()):
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._lock.wait(min(restante, 0.5))
+            concluido = not self._ativas and (parar is not None or not self._fila.qsize())
+        if parar is None:
+            # Acorda os workers parados na fila em memória para que terminem
+            for _ in list(self._workers):
+                try:
+                    self._fila.put(None, timeout=max(limite - time.monotonic(), 0.1))
+                except queue.Full:
+                    logger.warning("Fila cheia ao encerrar: %s worker(s) continuam ativos", len(self._workers))
+                    break
+        else:
+            devolvidas = self._fila.devolver()
+            if devolvidas:
+                logger.warning("%s pergunta(s) em andamento devolvidas à fila", devolvidas)
+        return concluido
+
+    def _processar(self, tarefa):
+        agora = time.monotonic()
+        tarefa.iniciada_em = agora
+        tarefa.prazo = agora + self.timeout
+        tarefa.worker = threading.current_thread()
+        with self._lock:
+            self._tempo_espera.registrar(agora - tarefa.enfileirada_em)
+            self._em_execucao.add(tarefa)
+            self._lock.notify_all()
+
+        try:
+            resposta = self.processador(tarefa.pergunta_id, tarefa.pergunta, tarefa.dataset_hash, prazo=tarefa.prazo)
+            erro = False
+        except Exception as e:
+            resposta = f"Erro ao processar pergunta: {str(e)}"
+            erro = True
+
+        with self._lock:
+            if tarefa.finalizada:
+                # A pergunta já expirou; o resultado tardio é descartado
+                return
+            tarefa.finalizada = True
+            self._em_execucao.discard(tarefa)
+            self._tempo_servico.registrar(time.monotonic() - tarefa.iniciada_em)
+            self._contadores['erros' if erro else 'concluidas'] += 1
+        self.ao_concluir(tarefa.pergunta_id, resposta)
+
+    def _vigiar_prazos(self):
+        """Expira perguntas em execução que ultrapassaram o timeout"""
+        while True:
+            expiradas = []
+            with self._lock:
+                while not self._em_execucao:
+                    self._lock.wait()
+                agora = time.monotonic()
+                proximo_prazo = None
+                for tarefa in list(self._em_execucao):
+                    if tarefa.prazo <= agora:
+                        tarefa.finalizada = True
+                        self._em_execucao.discard(tarefa)
+                        self._contadores['expiradas'] += 1
+                        self._tempo_servico.registrar(agora - tarefa.iniciada_em)
+                        expiradas.append(tarefa)
+                        if not self._encerrando:
+                            self._substituir_worker(tarefa.worker)
+                    elif proximo_prazo is None or tarefa.prazo < proximo_prazo:
+                        proximo_prazo = tarefa.prazo
+                if not expiradas and proximo_prazo is not None:
+                    self._lock.wait(timeout=proximo_prazo - agora)
+
+            for tarefa in expiradas:
+                logger.warning("Pergunta %s expirou após %ss", tarefa.pergunta_id, self.timeout)
+                self.ao_concluir(
+                    tarefa.pergunta_id,
+                    f"Tempo limite de {self.timeout}s excedido ao processar a pergunta. Tente novamente."
+                )
+
+    def metricas(self):
+        """Retorna profundidade da fila, contadores e tempos de espera e serviço"""
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'workers_presos': len(self._substituidos),
+                'fila_compartilhada': isinstance(self._fila, FilaCompartilhada),
+                'capacidade_fila': self._fila.maxsize,
+                'profundidade_fila': self._fila.qsize(),
+                'em_execucao': len(self._em_execucao),
+                'contadores': dict(self._contadores),
+                'tempo_espera_s': self._tempo_espera.resumo(),
+                'tempo_servico_s': self._tempo_servico.resumo()
+            }
@@ -0,0 +1,276 @@
+import logging
+import multiprocessing
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODELOS = ('linear', 'arima')
+ORDEM_ARIMA = (1, 1, 1)  # mesma ordem do notebook arima_x_regresao_linear
+
+
+class ResultadoPrevisao:
+    """Previsões de várias séries para os mesmos anos futuros, com intervalos"""
+
+    def __init__(self, modelo, series, anos_futuros, previsao, inferior, superior, confianca, parametros=None):
+        self.modelo = modelo
+        self.series = list(series)
+        self.anos_futuros = anos_futuros
+        self.previsao = previsao  # horizonte x séries
+        self.inferior = inferior
+        self.superior = superior
+        self.confianca = confianca
+        self.parametros = parametros or {}
+        self._posicao = {serie: i for i, serie in enumerate(self.series)}
+
+    def serie(self, nome):
+        """Previsão de uma série como listas (NaN vira None)"""
+        i = self._posicao[nome]
+        return {
+            'previsao': _lista(self.previsao[:, i]),
+            'inferior': _lista(self.inferior[:, i]),
+            'superior': _lista(self.superior[:, i])
+        }
+
+    def para_json(self, series=None):
+        return {
+            'modelo': self.modelo,
+            'confianca': self.confianca,
+            'anos_futuros': [int(ano) for ano in self.anos_futuros],
+            'series': {nome: self.serie(nome) for nome in (series or self.series)}
+        }
+
+
+def _lista(valores):
+    return [None if np.isnan(v) else float(v) for v in valores]
+
+
+def _quantil_t(confianca, graus_liberdade):
+    """Quantil bilateral da t de Student, vetorizado nos graus de liberdade"""
+    from scipy import stats
+    graus = np.asarray(graus_liberdade, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return np.where(graus > 0, stats.t.ppf((1 + confianca) / 2, np.maximum(graus, 1)), np.nan)
+
+
+def previsao_linear(anos, valores, series, horizonte=5, confianca=0.95):
+    """Ajusta y = a + b·ano em todas as colunas de ``valores`` de uma vez.
+
+    As séries completas são resolvidas em uma única chamada a
+    ``np.linalg.lstsq``; as que têm lacunas usam as equações normais em
+    forma fechada, também vetorizadas, considerando só os anos presentes.
+    O intervalo é o de predição da regressão (t de Student com n - 2 graus);
+    previsões e limites são cortados em zero, pois não há área negativa.
+    """
+    x = np.asarray(anos, dtype=np.float64)
+    y = np.asarray(valores, dtype=np.float64)
+    centro = x.mean()
+    xc = x - centro
+    presentes = ~np.isnan(y)
+    num_series = y.shape[1]
+
+    intercepto = np.full(num_series, np.nan)
+    inclinacao = np.full(num_series, np.nan)
+    completas = presentes.all(axis=0)
+    if completas.any():
+        projeto = np.column_stack([np.ones_like(xc), xc])
+        coeficientes, *_ = np.linalg.lstsq(projeto, y[:, completas], rcond=None)
+        intercepto[completas], inclinacao[completas] = coeficientes
+
+    lacunas = ~completas
+    m = presentes.astype(np.float64)
+    y0 = np.where(presentes, y, 0.0)
+    n = m.sum(axis=0)
+    if lacunas.any():
+        sx = xc @ m[:, lacunas]
+        sy = y0[:, lacunas].sum(axis=0)
+        sxx = (xc ** 2) @ m[:, lacunas]
+        sxy = xc @ y0[:, lacunas]
+        nl = n[lacunas]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            b = (nl * sxy - sx * sy) / (nl * sxx - sx ** 2)
+            intercepto[lacunas] = (sy - b * sx) / nl
+        inclinacao[lacunas] = b
+
+    # Variância residual e dispersão de x de cada série (apenas anos presentes)
+    ajustados = intercepto + np.outer(xc, inclinacao)
+    residuos = np.where(presentes, y - ajustados, 0.0)
+    graus = n - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variancia = (residuos ** 2).sum(axis=0) / graus
+        media_x = (xc @ m) / n
+        sxx_centrado = ((xc[:, None] - media_x) ** 2 * m).sum(axis=0)
+
+    anos_futuros = np.arange(int(x[-1]) + 1, int(x[-1]) + 1 + horizonte)
+    xf = (anos_futuros - centro)[:, None]
+    previsao = intercepto + xf * inclinacao
+    with np.errstate(invalid='ignore', divide='ignore'):
+        erro = np.sqrt(variancia * (1 + 1 / n + (xf - media_x) ** 2 / sxx_centrado))
+    margem = _quantil_t(confianca, graus) * erro
+    parametros = {'intercepto': intercepto, 'inclinacao': inclinacao, 'centro_anos': centro}
+    return ResultadoPrevisao('linear', series, anos_futuros, np.maximum(previsao, 0),
+                             np.maximum(previsao - margem, 0), np.maximum(previsao + margem, 0),
+                             confianca, parametros)
+
+
+def _ajustar_arima_lote(valores, horizonte, confianca):
+    """Ajusta ARIMA em cada coluna de um lote; executado em um processo do pool"""
+    from statsmodels.tsa.arima.model import ARIMA
+
+    num_series = valores.shape[1]
+    previsao = np.full((horizonte, num_series), np.nan)
+    inferior = np.full((horizonte, num_series), np.nan)
+    superior = np.full((horizonte, num_series), np.nan)
+    aic = np.full(num_series, np.nan)
+    for i in range(num_series):
+        serie = valores[:, i]
+        if np.count_nonzero(~np.isnan(serie)) < 8:
+            continue
+        try:
+            with warnings.catch_warnings():
+                # Avisos de convergência são comuns em séries curtas
+                warnings.simplefilter('ignore')
+                ajuste = ARIMA(serie, order=ORDEM_ARIMA).fit()
+                quadro = ajuste.get_forecast(steps=horizonte).summary_frame(alpha=1 - confianca)
+        except Exception as e:
+            logger.warning("ARIMA não convergiu para a série %d: %s", i, e)
+            continue
+        previsao[:, i] = quadro['mean'].to_numpy()
+        inferior[:, i] = quadro['mean_ci_lower'].to_numpy()
+        superior[:, i] = quadro['mean_ci_upper'].to_numpy()
+        aic[i] = ajuste.aic
+    return previsao, inferior, superior, aic
+
+
+def _aquecer_processo():
+    """Importa o statsmodels em um processo do pool, antes do primeiro ajuste"""
+    import statsmodels.tsa.arima.model  # noqa: F401
+    return multiprocessing.current_process().pid
+
+
+class ServicoPrevisoes:
+    """Previsões por dataset com cache LRU; o ARIMA roda em lotes em um pool de processos.
+
+    A regressão linear é vetorizada e calculada na hora; os ajustes ARIMA de
+    cada lote de séries são distribuídos entre os processos, e pedidos
+    simultâneos da mesma previsão compartilham o mesmo cálculo.
+    """
+
+    def __init__(self, processos=2, tamanho_lote=64, capacidade=32):
+        self.processos = processos
+        self.tamanho_lote = tamanho_lote
+        self.capacidade = capacidade
+        self._executor = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._pendentes = {}
+
+    def _obter_executor(self):
+        if self._executor is None:
+            # spawn evita herdar locks das threads do servidor no fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processos,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _guardar(self, chave, resultado):
+        with self._lock:
+            self._cache[chave] = resultado
+            self._cache.move_to_end(chave)
+            while len(self._cache) > self.capacidade:
+                self._cache.popitem(last=False)
+
+    def solicitar(self, dataset_hash, estatisticas, modelo='linear', horizonte=5, confianca=0.95):
+        """Retorna um Future com o ResultadoPrevisao de todas as séries do dataset"""
+        if modelo not in MODELOS:
+            raise ValueError(f"Modelo de previsão não suportado: {modelo}")
+        chave = (dataset_hash, modelo, horizonte, confianca)
+        with self._lock:
+            resultado = self._cache.get(chave)
+            if resultado is not None:
+                self._cache.move_to_end(chave)
+            futuro = self._pendentes.get(chave)
+        if resultado is not None:
+            futuro = Future()
+            futuro.set_result(resultado)
+            return futuro
+        if futuro is not None:
+            return futuro
+
+        if modelo == 'linear':
+            resultado = previsao_linear(estatisticas.anos, estatisticas.valores, estatisticas.series,
+                                        horizonte, confianca)
+            self._guardar(chave, resultado)
+            futuro = Future()
+            futuro.set_result(resultado)
+            return futuro
+
+        with self._lock:
+            futuro = self._pendentes.get(chave)
+            if futuro is None:
+                futuro = Future()
+                self._pendentes[chave] = futuro
+                self._agendar_arima(chave, estatisticas, horizonte, confianca, futuro)
+        return futuro
+
+    def _agendar_arima(self, chave, estatisticas, horizonte, confianca, futuro):
+        valores = np.asarray(estatisticas.valores, dtype=np.float64)
+        lotes = [
+            self._obter_executor().submit(_ajustar_arima_lote, valores[:, inicio:inicio + self.tamanho_lote],
+                                          horizonte, confianca)
+            for inicio in range(0, valores.shape[1], self.tamanho_lote)
+        ]
+        anos_futuros = np.arange(int(estatisticas.anos[-1]) + 1, int(estatisticas.anos[-1]) + 1 + horizonte)
+        restantes = [len(lotes)]
+
+        def concluir(_):
+            with self._lock:
+                restantes[0] -= 1
+                if restantes[0]:
+                    return
+                self._pendentes.pop(chave, None)
+            try:
+                partes = [lote.result() for lote in lotes]
+                previsao, inferior, superior, aic = (np.concatenate(p, axis=-1) for p in zip(*partes))
+                resultado = ResultadoPrevisao('arima', estatisticas.series, anos_futuros, previsao, inferior,
+                                              superior, confianca, {'ordem': ORDEM_ARIMA, 'aic': aic})
+            except Exception as e:
+                futuro.set_exception(e)
+                return
+            self._guardar(chave, resultado)
+            futuro.set_result(resultado)
+
+        for lote in lotes:
+            lote.add_done_callback(concluir)
+
+    def obter(self, dataset_hash, estatisticas, modelo='linear', horizonte=5, confianca=0.95, timeout=60):
+        """Retorna o ResultadoPrevisao, aguardando o cálculo se preciso"""
+        return self.solicitar(dataset_hash, estatisticas, modelo, horizonte, confianca).result(timeout=timeout)
+
+    def invalidar(self, dataset_hash):
+        """Remove as previsões em cache de uma versão do dataset"""
+        with self._lock:
+            for chave in [c for c in self._cache if c[0] == dataset_hash]:
+                del self._cache[chave]
+
+    def aquecer(self):
+        """Sobe os processos do pool e importa neles o statsmodels, sem bloquear"""
+        executor = self._obter_executor()
+        for _ in range(self.processos):
+            executor.submit(_aquecer_processo).add_done_callback(_registrar_falha_aquecimento)
+
+    def encerrar(self):
+        """Encerra o pool de processos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _registrar_falha_aquecimento(futuro):
+    if not futuro.cancelled() and futuro.exception() is not None:
+        logger.error("Erro ao aquecer o pool de previsões: %s", futuro.exception())
@@ -0,0 +1,336 @@
+import re
+
+import numpy as np
+
+from cache_respostas import normalizar_pergunta
+
+# Nomes por extenso das séries do PRODES. "Pará" só é reconhecido com acento,
+# pois sem ele se confunde com a preposição "para".
+NOMES_SERIES = [
+    (r'\bacre\b', 'AC'),
+    (r'\bamazonas\b', 'AM'),
+    (r'\bamap[áa]\b', 'AP'),
+    (r'\bmaranh[ãa]o\b', 'MA'),
+    (r'\bmato grosso\b', 'MT'),
+    (r'\bpará\b', 'PA'),
+    (r'\brond[ôo]nia\b', 'RO'),
+    (r'\broraima\b', 'RR'),
+    (r'\btocantins\b', 'TO'),
+    (r'\bamaz[ôo]nia legal\b', 'AMZ LEGAL'),
+]
+
+# Perguntas que pedem explicação ou opinião vão sempre para o LLM
+PADRAO_ABERTA = re.compile(
+    r'\b(por que|porque|como|medidas?|recomend\w*|suger\w*|sugest\w*|expli\w*|caus\w*|'
+    r'impact\w*|devem|deveria\w*|poderia\w*|opiniao|acha|previs\w*|prever|futuro|'
+    r'grafico|imagem|foto)\b'
+)
+# Números seguidos de unidade ("2500 km²", "30%") são quantidades, não anos
+UNIDADES = r'\s*(?:km|ha\b|hectares?\b|mil\b|%|por cento\b|quil[ôo]metros?\b)'
+PADRAO_QUANTIDADE_UNIDADE = re.compile(r'\d(?:[\d.,]*\d)?' + UNIDADES)
+PADRAO_ANO = re.compile(r'(?<![\d.,])\b(1[89]\d{2}|2\d{3})\b(?![.,]\d)(?!' + UNIDADES + r')')
+# Comparações ("mais que Rondônia", "maior que a média") e limiares ("acima de 2500")
+# pedem contas que o roteador não faz: ficam com o LLM
+PADRAO_COMPARACAO = re.compile(
+    r'\b(?:mais|menos|maior(?:es)?|menor(?:es)?)\s+(?:\w+\s+){0,3}?(?:que|do que)\b|'
+    r'\b(?:mais|menos|acima|abaixo|superior\w*|inferior\w*)\s+(?:de|do que|que|ao?)\s+\d|'
+    r'\bcompar\w*|\bem relacao a[o]?s?\b|\bversus\b|\bvs\b|\bacima d[ao]s?\b|\babaixo d[ao]s?\b|'
+    r'\bsuperior\w* a[o]?s?\b|\binferior\w* a[o]?s?\b'
+)
+PADRAO_INTERVALO = re.compile(r'\b(?:entre|de|desde)\s+(1[89]\d{2}|2\d{3})\s+(?:e|a|ate)\s+(1[89]\d{2}|2\d{3})\b')
+PADRAO_DESDE = re.compile(r'\b(?:desde|a partir de)\s+(1[89]\d{2}|2\d{3})\b')
+PADRAO_ATE = re.compile(r'\bate\s+(1[89]\d{2}|2\d{3})\b')
+# Períodos relativos ou vagos que o roteador não sabe delimitar: ficam com o LLM
+PADRAO_PERIODO_VAGO = re.compile(
+    r'\b(ultim[oa]s?|ultimamente|decadas?|seculo|recentes?|recentemente|atual\w*|hoje|agora|'
+    r'tendencias?|anos\s+\d0|antes|depois|apos|anterior\w*|seguinte\w*|passad[oa]s?|proxim[oa]s?)\b'
+)
+PADRAO_QUANTIDADE = re.compile(r'\b(?:top\s+)?(\d{1,2})\s+(?:estados|maiores|menores|primeiros|ultimos)\b|\btop\s+(\d{1,2})\b')
+NUMEROS_POR_EXTENSO = {
+    'dois': 2, 'duas': 2, 'tres': 3, 'quatro': 4, 'cinco': 5,
+    'seis': 6, 'sete': 7, 'oito': 8, 'nove': 9, 'dez': 10
+}
+PADRAO_QUANTIDADE_EXTENSO = re.compile(
+    r'\b(' + '|'.join(NUMEROS_POR_EXTENSO) + r')\s+(?:estados|maiores|menores|primeiros)\b'
+)
+
+PADRAO_MAIOR = re.compile(r'\b(mais|maior|maiores|maxim[oa]|pico|recorde)\b')
+PADRAO_MENOR = re.compile(r'\b(menos|menor|menores|minim[oa])\b')
+PADRAO_QUANDO = re.compile(
+    r'\b(qual (?:foi )?(?:o )?ano|que ano|quais (?:foram )?(?:os )?anos|quando|(?:o|os) anos? (?:com|de|em que))\b'
+)
+PADRAO_VARIACAO = re.compile(r'\b(variacao|variou|cresceu|crescimento|aument\w*|diminu\w*|caiu|queda|reduc\w*|reduziu)\b')
+PADRAO_MEDIA = re.compile(r'\bmedi[ao]s?\b')
+PADRAO_TOTAL = re.compile(r'\b(total|soma|acumulad[oa]|quanto|quantos)\b')
+PADRAO_ESTADO = re.compile(r'\bestados?\b')
+PADRAO_DESMATAMENTO = re.compile(r'\b(desmat\w*|afetad\w*|taxa|area|km)\b')
+
+
+def _km2(valor):
+    return f"{valor:,.2f} km²"
+
+
+class RoteadorIntencoes:
+    """Responde perguntas factuais diretamente das estatísticas do dataset.
+
+    Reconhece rankings ("qual estado mais desmatou?"), valores de um ano,
+    anos de pico, totais, médias e variações, no período todo ou num
+    intervalo ("total no Pará entre 2004 e 2012", respondido pelos índices
+    de intervalo das estatísticas). Um ano isolado após "desde" ou "a
+    partir de" abre um intervalo até o último ano; após "até", fecha um
+    intervalo a partir do primeiro. ``responder`` retorna None para
+    perguntas abertas e para as que não entende por completo (períodos
+    como "na última década" ou "nos últimos 5 anos", comparações e
+    quantidades como "mais de 2500 km²"), que seguem para o LLM.
+    """
+
+    def __init__(self, estatisticas):
+        self.estatisticas = estatisticas
+        self._padroes_series = [
+            (re.compile(r'(?<!\w)' + re.escape(serie.lower()) + r'(?!\w)'), serie)
+            for serie in estatisticas.series
+        ]
+        self._padroes_series += [
+            (re.compile(padrao), serie) for padrao, serie in NOMES_SERIES
+            if serie in estatisticas.series
+        ]
+
+    def series_citadas(self, texto):
+        """Séries mencionadas na pergunta, na ordem em que aparecem"""
+        texto = texto.lower()
+        encontradas = {}
+        for padrao, serie in self._padroes_series:
+            achado = padrao.search(texto)
+            if achado and (serie not in encontradas or achado.start() < encontradas[serie]):
+                encontradas[serie] = achado.start()
+        return sorted(encontradas, key=encontradas.get)
+
+    def anos_citados(self, pergunta):
+        """Anos mencionados na pergunta que existem no dataset"""
+        anos = [int(ano) for ano in PADRAO_ANO.findall(pergunta)]
+        return [ano for ano in anos if self.estatisticas.indice_ano(ano) is not None]
+
+    def _quantidade(self, normalizada):
+        achado = PADRAO_QUANTIDADE.search(normalizada)
+        if achado:
+            return max(int(achado.group(1) or achado.group(2)), 1)
+        achado = PADRAO_QUANTIDADE_EXTENSO.search(normalizada)
+        if achado:
+            return NUMEROS_POR_EXTENSO[achado.group(1)]
+        return 3 if re.search(r'\bquais\b', normalizada) else 1
+
+    def _nome(self, serie):
+        return 'Amazônia Legal' if serie == self.estatisticas.coluna_total else serie
+
+    def _local(self, serie):
+        return 'na Amazônia Legal' if serie == self.estatisticas.coluna_total else f'em {serie}'
+
+    def responder(self, pergunta):
+        """Retorna a resposta calculada a partir dos dados ou None"""
+        normalizada = normalizar_pergunta(pergunta)
+        if PADRAO_ABERTA.search(normalizada) or PADRAO_COMPARACAO.search(normalizada):
+            return None
+        if PADRAO_QUANTIDADE_UNIDADE.search(pergunta.lower()):
+            return None
+
+        series = self.series_citadas(pergunta)
+        anos = [int(ano) for ano in PADRAO_ANO.findall(normalizada)]
+        fora = [ano for ano in anos if self.estatisticas.indice_ano(ano) is None]
+        maior = PADRAO_MAIOR.search(normalizada) is not None
+        menor = PADRAO_MENOR.search(normalizada) is not None
+        # Em perguntas como "menos desmatado que os mais afetados", o termo de menor vence
+        direcao = 'menor' if menor else 'maior' if maior else None
+
+        if not (series or anos or PADRAO_DESMATAMENTO.search(normalizada)):
+            return None
+        if fora:
+            inicio, fim = self.estatisticas.anos.min(), self.estatisticas.anos.max()
+            return f"Não há dados para {', '.join(map(str, fora))}. O período disponível é de {inicio} a {fim}."
+        if PADRAO_PERIODO_VAGO.search(normalizada):
+            return None
+
+        intervalo = self._intervalo(normalizada)
+        # Anos soltos além dos que delimitam o intervalo: a pergunta não foi entendida
+        if intervalo is not None and not set(anos) <= set(intervalo):
+            return None
+        quando = PADRAO_QUANDO.search(normalizada) is not None
+
+        if PADRAO_VARIACAO.search(normalizada):
+            # "Qual ano teve a maior queda?" pede outra conta, que fica com o LLM
+            if direcao or quando:
+                return None
+            return self._variacao(series, anos, intervalo)
+        if direcao and quando:
+            if anos and intervalo is None:
+                return None
+            return self._ano_extremo(series, direcao, intervalo)
+        if direcao and (PADRAO_ESTADO.search(normalizada) or not series):
+            if len(anos) > 1 and intervalo is None:
+                return None
+            media = PADRAO_MEDIA.search(normalizada) is not None
+            ano = anos[0] if anos and intervalo is None else None
+            return self._ranking(direcao, self._quantidade(normalizada), ano, media, intervalo)
+        if intervalo is not None:
+            if PADRAO_MEDIA.search(normalizada):
+                return self._estatistica(series or [self.estatisticas.coluna_total], 'media', intervalo)
+            if direcao:
+                return self._estatistica(series or [self.estatisticas.coluna_total], direcao, intervalo)
+            if PADRAO_TOTAL.search(normalizada) or series:
+                return self._estatistica(series or [self.estatisticas.coluna_total], 'total', intervalo)
+            return None
+        if quando:
+            return None
+        if anos:
+            return self._valores_ano(series, anos)
+        if series:
+            if PADRAO_MEDIA.search(normalizada):
+                return self._estatistica(series, 'media')
+            if direcao:
+                return self._estatistica(series, direcao)
+            if PADRAO_TOTAL.search(normalizada):
+                return self._estatistica(series, 'total')
+        return None
+
+    def _intervalo(self, normalizada):
+        """(início, fim) citado na pergunta ou None"""
+        achado = PADRAO_INTERVALO.search(normalizada)
+        if achado:
+            return tuple(sorted(map(int, achado.groups())))
+        anos = self.estatisticas.anos
+        achado = PADRAO_DESDE.search(normalizada)
+        if achado:
+            return int(achado.group(1)), int(anos[-1])
+        achado = PADRAO_ATE.search(normalizada)
+        if achado:
+            return int(anos[0]), int(achado.group(1))
+        return None
+
+    def _ranking(self, direcao, quantidade, ano, media, intervalo=None):
+        est = self.estatisticas
+        if intervalo is not None:
+            medida = est.indice_intervalos().media if media else est.indice_intervalos().soma
+            valores = medida(est.estados, *intervalo)
+            criterio = f"{'na média anual' if media else 'no total'} de {intervalo[0]} a {intervalo[1]}"
+        elif ano is not None:
+            valores = est.valores[est.indice_ano(ano), :len(est.estados)]
+            criterio = f"em {ano}"
+        elif media:
+            valores = est.medias[est.estados].to_numpy(dtype=np.float64)
+            criterio = "na média anual do período"
+        else:
+            valores = est.totais[est.estados].to_numpy(dtype=np.float64)
+            criterio = "no total do período"
+
+        validos = np.flatnonzero(~np.isnan(valores))
+        ordem = validos[np.argsort(valores[validos], kind='stable')]
+        if direcao == 'maior':
+            ordem = ordem[::-1]
+        ordem = ordem[:quantidade]
+        adjetivo = 'maior' if direcao == 'maior' else 'menor'
+
+        if len(ordem) == 1:
+            i = ordem[0]
+            return f"O estado com {adjetivo} desmatamento {criterio} foi {est.estados[i]}, com {_km2(valores[i])}."
+        linhas = [f"Estados com {adjetivo} desmatamento {criterio}:"]
+        linhas += [f"{posicao}. {est.estados[i]}: {_km2(valores[i])}" for posicao, i in enumerate(ordem, 1)]
+        return '\n'.join(linhas)
+
+    def _ano_extremo(self, series, direcao, intervalo=None):
+        est = self.estatisticas
+        series = series or [est.coluna_total]
+        if intervalo is not None:
+            indice = est.indice_intervalos()
+            valores, anos = (indice.maximo if direcao == 'maior' else indice.minimo)(series, *intervalo)
+            periodo = f" entre {intervalo[0]} e {intervalo[1]}"
+        else:
+            valores = (est.maximos if direcao == 'maior' else est.minimos)[series].to_numpy()
+            anos = (est.ano_maximo if direcao == 'maior' else est.ano_minimo)[series].to_numpy()
+            periodo = ''
+        linhas = []
+        for serie, ano, valor in zip(series, anos, valores):
+            if np.isnan(valor):
+                linhas.append(f"Não há registro {self._local(serie)}{periodo}.")
+                continue
+            linhas.append(f"O {direcao} desmatamento {self._local(serie)}{periodo} foi em {ano}, com {_km2(valor)}.")
+        return '\n'.join(linhas)
+
+    def _valores_ano(self, series, anos):
+        est = self.estatisticas
+        linhas = []
+        for ano in anos:
+            linha = est.valores[est.indice_ano(ano)]
+            for serie in series or [est.coluna_total]:
+                valor = linha[est._indice(serie)]
+                if np.isnan(valor):
+                    linhas.append(f"Não há registro {self._local(serie)} em {ano}.")
+                else:
+                    linhas.append(f"Desmatamento {self._local(serie)} em {ano}: {_km2(valor)}.")
+        return '\n'.join(linhas)
+
+    def _variacao(self, series, anos, intervalo=None):
+        est = self.estatisticas
+        if intervalo is not None:
+            inicio, fim = intervalo
+        elif len(anos) == 2:
+            inicio, fim = sorted(anos)
+        elif len(anos) == 1:
+            # "Quanto aumentou em 2020?": em relação ao ano anterior do dataset
+            posicao = est.indice_ano(anos[0])
+            if not posicao:
+                return None
+            inicio, fim = int(est.anos[posicao - 1]), anos[0]
+        elif not anos:
+            inicio, fim = int(est.anos[0]), int(est.anos[-1])
+        else:
+            return None
+        if inicio == fim:
+            return None
+        linhas = []
+        for serie in series or [est.coluna_total]:
+            indice = est._indice(serie)
+            base = est.valores[est.indice_ano(inicio), indice]
+            final = est.valores[est.indice_ano(fim), indice]
+            if np.isnan(base) or np.isnan(final) or base == 0:
+                linhas.append(f"Não é possível calcular a variação de {self._nome(serie)} entre {inicio} e {fim}.")
+                continue
+            variacao = (final - base) / base * 100
+            sentido = 'aumento' if variacao > 0 else 'redução' if variacao < 0 else 'estabilidade'
+            linhas.append(
+                f"{self._nome(serie)}: "
+                f"{_km2(base)} em {inicio} e {_km2(final)} em {fim} ({sentido} de {abs(variacao):,.2f}%)."
+            )
+        return '\n'.join(linhas)
+
+    def _estatistica(self, series, medida, intervalo=None):
+        est = self.estatisticas
+        if intervalo is not None:
+            consulta = est.consultar(series, *intervalo)
+            periodo = f"de {consulta['inicio']} a {consulta['fim']}"
+            linhas = []
+            for serie in series:
+                local, valores = self._local(serie), consulta['series'][serie]
+                extremo = valores['maximo' if medida == 'maior' else 'minimo']
+                if valores['media'] is None:
+                    linhas.append(f"Não há registro {local} {periodo}.")
+                elif medida == 'media':
+                    linhas.append(f"Média anual de desmatamento {local} {periodo}: {_km2(valores['media'])}.")
+                elif medida in ('maior', 'menor'):
+                    linhas.append(f"{medida.capitalize()} desmatamento anual {local} {periodo}: "
+                                  f"{_km2(extremo['valor'])} (ano {extremo['ano']}).")
+                else:
+                    linhas.append(f"Total desmatado {local} {periodo}: {_km2(valores['soma'])}.")
+            if medida == 'total' and len(series) > 1:
+                linhas.append(f"Total das séries citadas {periodo}: {_km2(consulta['conjunto']['soma'])}.")
+            return '\n'.join(linhas)
+        linhas = []
+        for serie in series:
+            local = self._local(serie)
+            if medida == 'media':
+                linhas.append(f"Média anual de desmatamento {local}: {_km2(est.medias[serie])}.")
+            elif medida == 'maior':
+                linhas.append(f"Maior desmatamento anual {local}: {_km2(est.maximos[serie])} (ano {est.ano_maximo[serie]}).")
+            elif medida == 'menor':
+                linhas.append(f"Menor desmatamento anual {local}: {_km2(est.minimos[serie])} (ano {est.ano_minimo[serie]}).")
+            else:
+                linhas.append(f"Total desmatado {local} no período: {_km2(est.totais[serie])}.")
+        return '\n'.join(linhas)
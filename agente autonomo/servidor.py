@@ -0,0 +1,191 @@
+"""Servidor de produção: vários processos atendendo o app no mesmo socket.
+
+    python servidor.py --processos 4 --porta 8000
+
+O processo mestre abre o socket e cria os workers com fork. Cada worker
+importa o app só depois do fork (as threads do app não sobrevivem a um
+fork), atende requisições com threads e consome a fila de perguntas
+compartilhada no banco SQLite (``AGENTE_FILA_COMPARTILHADA``); as respostas
+chegam às conexões SSE de qualquer processo. Só o worker 0 monitora a pasta
+de dados.
+
+Sinais enviados ao mestre:
+
+- SIGTERM/SIGINT: para de aceitar conexões, drena as perguntas em andamento
+  (até ``--prazo`` segundos; as restantes voltam para a fila) e sai;
+- SIGHUP: reinicia os workers um a um, sem deixar de atender.
+
+Workers que morrem são recriados. O número de processos vem de
+``--processos`` ou ``AGENTE_PROCESSOS`` (padrão: um por núcleo).
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+logger = logging.getLogger('servidor')
+
+
+def _atender(soquete, indice, args):
+    """Corpo de um worker: importa o app, atende até SIGTERM e encerra drenando as perguntas"""
+    os.environ['AGENTE_WORKER_ID'] = str(indice)
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    # Ctrl+C chega a todo o grupo de processos: quem coordena o encerramento é o mestre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    import app as aplicacao
+    from werkzeug.serving import make_server
+
+    servidor = make_server(args.host, args.porta, aplicacao.app, threaded=True, fd=soquete.fileno())
+    thread = threading.Thread(target=servidor.serve_forever, name='servidor-http', daemon=True)
+    thread.start()
+    logger.info("Worker %s (pid %s) atendendo em %s:%s", indice, os.getpid(), args.host, args.porta)
+    parar.wait()
+
+    # Deixa de aceitar conexões (os outros workers continuam atendendo) e drena
+    servidor.shutdown()
+    aplicacao.encerrar(args.prazo)
+
+
+class Mestre:
+    """Cria, supervisiona e reinicia os processos workers"""
+
+    def __init__(self, soquete, args):
+        self.soquete = soquete
+        self.args = args
+        self.workers = {}
+        self._encerrar = False
+        self._reiniciar = False
+
+    def _criar(self, indice):
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                _atender(self.soquete, indice, self.args)
+            except BaseException:
+                logger.exception("Erro no worker %s", indice)
+                codigo = 1
+            finally:
+                logging.shutdown()
+                os._exit(codigo)
+        self.workers[pid] = (indice, time.monotonic())
+        return pid
+
+    def _recolher(self):
+        """Retira os workers encerrados; retorna (índice, pid, status, criado_em) de cada um"""
+        saidos = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            indice, criado_em = self.workers.pop(pid, (None, None))
+            if indice is not None:
+                saidos.append((indice, pid, status, criado_em))
+        return saidos
+
+    def _esperar(self, pid, prazo):
+        """Espera um worker sair, forçando depois do prazo"""
+        limite = time.monotonic() + prazo
+        while time.monotonic() < limite:
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] != 0:
+                    break
+            except ChildProcessError:
+                break
+            time.sleep(0.1)
+        else:
+            logger.warning("Worker %s não encerrou em %ss; forçando", pid, prazo)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def _reiniciar_workers(self):
+        """Troca cada worker por um novo, um de cada vez"""
+        logger.info("Reiniciando %s worker(s)", len(self.workers))
+        for pid, (indice, _) in list(self.workers.items()):
+            if self._encerrar:
+                return
+            os.kill(pid, signal.SIGTERM)
+            self._esperar(pid, self.args.prazo + 5)
+            self._criar(indice)
+
+    def executar(self):
+        signal.signal(signal.SIGTERM, self._sinal_encerrar)
+        signal.signal(signal.SIGINT, self._sinal_encerrar)
+        signal.signal(signal.SIGHUP, self._sinal_reiniciar)
+        for indice in range(self.args.processos):
+            self._criar(indice)
+        logger.info("Mestre (pid %s) com %s worker(s) em http://%s:%s",
+                    os.getpid(), self.args.processos, self.args.host, self.args.porta)
+
+        while not self._encerrar:
+            if self._reiniciar:
+                self._reiniciar = False
+                self._reiniciar_workers()
+            for indice, pid, status, criado_em in self._recolher():
+                if self._encerrar:
+                    break
+                logger.warning("Worker %s (pid %s) saiu com status %s; recriando", indice, pid, status)
+                # Um worker que morre logo ao subir (erro de configuração) não é recriado em laço
+                if time.monotonic() - criado_em < 1:
+                    time.sleep(1)
+                self._criar(indice)
+            time.sleep(0.2)
+
+        logger.info("Encerrando %s worker(s)", len(self.workers))
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.workers):
+            self._esperar(pid, self.args.prazo + 5)
+        self.soquete.close()
+
+    def _sinal_encerrar(self, *_):
+        self._encerrar = True
+
+    def _sinal_reiniciar(self, *_):
+        self._reiniciar = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('AGENTE_HOST', '127.0.0.1'))
+    parser.add_argument('--porta', type=int, default=int(os.environ.get('AGENTE_PORTA', 5000)))
+    parser.add_argument('--processos', type=int, default=int(os.environ.get('AGENTE_PROCESSOS', os.cpu_count() or 1)),
+                        help='número de processos workers (padrão: um por núcleo)')
+    parser.add_argument('--prazo', type=float, default=float(os.environ.get('AGENTE_PRAZO_ENCERRAMENTO', 30)),
+                        help='segundos para drenar as perguntas em andamento ao encerrar um worker')
+    args = parser.parse_args(argv)
+    if args.processos < 1:
+        parser.error('--processos deve ser ao menos 1')
+    if not hasattr(os, 'fork'):
+        parser.error('o servidor com vários processos exige fork (Linux ou macOS); use app.py')
+
+    logging.basicConfig(level=os.environ.get('AGENTE_LOG_NIVEL', 'INFO').upper(),
+                        format='%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s')
+    os.environ['AGENTE_FILA_COMPARTILHADA'] = '1'
+    # pandas e numpy não iniciam threads: importados aqui, são herdados pelos workers
+    import agente_analise  # noqa: F401
+
+    soquete = socket.socket(socket.AF_INET6 if ':' in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    soquete.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    soquete.bind((args.host, args.porta))
+    soquete.listen(128)
+    soquete.set_inheritable(True)
+    Mestre(soquete, args).executar()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,182 @@
-// Gráfico de Linha
-const ctxLine = document.getElementById('lineChart').getContext('2d');
-const lineChart = new Chart(ctxLine, {
-    type: 'line',
-    data: {
-        labels: ['2017', '2018', '2019', '2020', '2021', '2022', '2023'],
-        datasets: [{
-            label: 'Desmatamento',
-            data: [120, 150, 180, 130, 170, 210, 190],
-            borderColor: '#00fff7',
-            backgroundColor: 'rgba(0,255,247,0.1)',
-            pointBackgroundColor: '#ff00c8',
-            pointBorderColor: '#fff',
-            pointRadius: 6,
-            tension: 0.4,
-        }]
-    },
-    options: {
+// Gráficos da análise renderizados no navegador a partir de /api/dados
+const CORES = {
+    principal: '#00fff7',
+    destaque: '#ff00c8',
+    texto: '#e0e0f0',
+    grade: '#23234a'
+};
+
+function opcoesPadrao() {
+    return {
+        responsive: true,
         plugins: {
             legend: {
                 labels: {
-                    color: '#00fff7',
-                    font: { size: 16 }
+                    color: CORES.texto,
+                    font: { size: 14 }
                 }
             }
         },
         scales: {
             x: {
-                ticks: { color: '#e0e0f0' },
-                grid: { color: '#23234a' }
+                ticks: { color: CORES.texto },
+                grid: { color: CORES.grade }
             },
             y: {
-                ticks: { color: '#e0e0f0' },
-                grid: { color: '#23234a' }
+                ticks: { color: CORES.texto },
+                grid: { color: CORES.grade }
             }
         }
-    }
-});
+    };
+}
 
-// Gráfico Doughnut
-const ctxDoughnut = document.getElementById('doughnutChart').getContext('2d');
-const doughnutChart = new Chart(ctxDoughnut, {
-    type: 'doughnut',
-    data: {
-        labels: ['Legal', 'Ilegal'],
-        datasets: [{
-            data: [65, 35],
-            backgroundColor: [
-                'rgba(0,255,247,0.8)',
-                'rgba(255,0,200,0.8)'
-            ],
-            borderColor: '#181828',
-            borderWidth: 4
-        }]
-    },
-    options: {
-        plugins: {
-            legend: {
-                labels: {
-                    color: '#e0e0f0',
-                    font: { size: 16 }
-                }
-            }
+function buscarDados(tipo, datasetHash, url) {
+    // A página pré-gerada aponta para o artefato estático (data-url) do gráfico
+    return fetch(url || `/api/dados/${datasetHash}/${tipo}`).then(response => {
+        if (!response.ok) {
+            throw new Error(`Falha ao carregar dados de ${tipo}: ${response.status}`);
         }
+        return response.json();
+    });
+}
+
+function graficoEvolucao(canvas, dados) {
+    return new Chart(canvas.getContext('2d'), {
+        type: 'line',
+        data: {
+            labels: dados.anos,
+            datasets: [{
+                label: 'Área Desmatada (km²)',
+                data: dados.valores,
+                borderColor: CORES.principal,
+                backgroundColor: 'rgba(0,255,247,0.1)',
+                pointBackgroundColor: CORES.destaque,
+                pointBorderColor: '#fff',
+                pointRadius: 4,
+                tension: 0.3
+            }]
+        },
+        options: opcoesPadrao()
+    });
+}
+
+function graficoEstados(canvas, dados) {
+    return new Chart(canvas.getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: dados.estados,
+            datasets: [{
+                label: 'Área Média Desmatada (km²)',
+                data: dados.medias,
+                backgroundColor: 'rgba(0,255,247,0.6)',
+                borderColor: CORES.principal,
+                borderWidth: 1
+            }]
+        },
+        options: opcoesPadrao()
+    });
+}
+
+function graficoPrevisao(canvas, dados) {
+    // Histórico e previsão compartilham o eixo de anos; cada série preenche só o seu trecho
+    const anos = dados.anos.concat(dados.anos_futuros);
+    const historico = dados.historico.concat(dados.anos_futuros.map(() => null));
+    const previsao = dados.anos.map(() => null).concat(dados.previsao);
+    return new Chart(canvas.getContext('2d'), {
+        type: 'line',
+        data: {
+            labels: anos,
+            datasets: [{
+                label: 'Dados Históricos',
+                data: historico,
+                borderColor: CORES.principal,
+                pointRadius: 3
+            }, {
+                label: 'Previsão',
+                data: previsao,
+                borderColor: CORES.destaque,
+                borderDash: [6, 4],
+                pointRadius: 3
+            }]
+        },
+        options: opcoesPadrao()
+    });
+}
+
+function corCorrelacao(valor) {
+    // Escala divergente: azul (-1), neutro (0), vermelho (+1)
+    if (valor === null) {
+        return '#444';
     }
-}); 
\ No newline at end of file
+    const intensidade = Math.round(Math.abs(valor) * 200);
+    return valor >= 0
+        ? `rgb(${55 + intensidade}, 55, 75)`
+        : `rgb(55, 75, ${55 + intensidade})`;
+}
+
+function tabelaCorrelacao(elemento, dados) {
+    const tabela = document.createElement('table');
+    tabela.className = 'table table-sm table-borderless text-center mb-0';
+
+    const cabecalho = tabela.createTHead().insertRow();
+    cabecalho.appendChild(document.createElement('th'));
+    dados.estados.forEach(estado => {
+        const th = document.createElement('th');
+        th.textContent = estado;
+        th.style.color = CORES.texto;
+        cabecalho.appendChild(th);
+    });
+
+    const corpo = tabela.createTBody();
+    dados.matriz.forEach((linha, i) => {
+        const tr = corpo.insertRow();
+        const th = document.createElement('th');
+        th.textContent = dados.estados[i];
+        th.style.color = CORES.texto;
+        tr.appendChild(th);
+        linha.forEach(valor => {
+            const td = tr.insertCell();
+            td.textContent = valor === null ? '-' : valor.toFixed(2);
+            td.style.background = corCorrelacao(valor);
+            td.style.color = '#fff';
+        });
+    });
+
+    elemento.innerHTML = '';
+    elemento.appendChild(tabela);
+}
+
+const RENDERIZADORES = {
+    evolucao: graficoEvolucao,
+    estados: graficoEstados,
+    previsao: graficoPrevisao,
+    correlacao: tabelaCorrelacao
+};
+
+function usarImagemDoServidor(elemento, tipo, datasetHash) {
+    // Sem Chart.js ou sem dados, recorre ao PNG renderizado no servidor
+    const imagem = document.createElement('img');
+    imagem.src = `/grafico/${datasetHash}/${tipo}`;
+    imagem.alt = elemento.getAttribute('aria-label') || tipo;
+    elemento.replaceWith(imagem);
+}
+
+function renderizarGraficos(raiz) {
+    (raiz || document).querySelectorAll('[data-grafico]').forEach(elemento => {
+        const tipo = elemento.dataset.grafico;
+        const datasetHash = elemento.dataset.dataset;
+        const renderizar = RENDERIZADORES[tipo];
+        if (!renderizar || typeof Chart === 'undefined') {
+            usarImagemDoServidor(elemento, tipo, datasetHash);
+            return;
+        }
+        buscarDados(tipo, datasetHash, elemento.dataset.url)
+            .then(dados => renderizar(elemento, dados))
+            .catch(error => {
+                console.error(error);
+                usarImagemDoServidor(elemento, tipo, datasetHash);
+            });
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => renderizarGraficos());
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analise_series import correlacao_parceiros, detectar_anomalias
+
+
+@pytest.fixture(scope='module')
+def valores():
+    gerador = np.random.default_rng(7)
+    base = gerador.normal(size=(40, 1))
+    # Séries com graus variados de dependência da primeira, em escalas diferentes
+    pesos = np.linspace(1, 0, 30)
+    ruido = gerador.normal(size=(40, 30))
+    return (base * pesos + ruido * (1 - pesos) + 0.01 * ruido) * 1000 + 5000
+
+
+def _top_k_pandas(df, k):
+    matriz = df.corr()
+    resultado = {}
+    for serie in df.columns:
+        r = matriz[serie].drop(serie).dropna()
+        resultado[serie] = r.reindex(r.abs().sort_values(ascending=False, kind='stable').index)[:k]
+    return resultado
+
+
+@pytest.mark.parametrize('tamanho_bloco', [4, 512])
+def test_parceiros_iguais_aos_da_matriz_completa(valores, tamanho_bloco):
+    series = [f's{i}' for i in range(valores.shape[1])]
+    parceiros = correlacao_parceiros(valores, series, k=5, tamanho_bloco=tamanho_bloco)
+    esperado = _top_k_pandas(pd.DataFrame(valores, columns=series), 5)
+    for serie in series:
+        obtido = parceiros.parceiros(serie)
+        assert [nome for nome, _ in obtido] == list(esperado[serie].index)
+        np.testing.assert_allclose([r for _, r in obtido], esperado[serie].to_numpy(), atol=1e-5)
+
+
+def test_parceiros_com_ausentes_e_serie_constante(valores):
+    valores = valores[:, :6].copy()
+    valores[::3, 1] = np.nan
+    valores[:, 5] = 42.0
+    series = list('abcdef')
+    parceiros = correlacao_parceiros(valores, series, k=10)
+    esperado = _top_k_pandas(pd.DataFrame(valores, columns=series), 10)
+
+    assert [nome for nome, _ in parceiros.parceiros('b')] == list(esperado['b'].index)
+    np.testing.assert_allclose([r for _, r in parceiros.parceiros('b')], esperado['b'].to_numpy(), atol=1e-5)
+    # Série constante não tem correlação definida com nenhuma outra
+    assert parceiros.parceiros('f') == []
+    assert 'f' not in [nome for nome, _ in parceiros.parceiros('a')]
+    # k é limitado ao número de outras séries
+    assert parceiros.indices.shape == (6, 5)
+    assert parceiros.para_json(['a'])['a'][0]['serie'] == parceiros.parceiros('a')[0][0]
+
+
+def test_anomalias_pelos_tres_criterios():
+    anos = np.arange(2000, 2020)
+    estavel = 100 + np.tile([1.0, -1.0], 10)
+    pico = estavel.copy()
+    pico[-1] = 400
+    valores = np.column_stack([estavel, pico])
+
+    anomalias = detectar_anomalias(anos, valores, ['estavel', 'pico'])
+
+    alertas = anomalias.alertas(ultimos_anos=1)
+    assert [(alerta['serie'], alerta['ano']) for alerta in alertas] == [('pico', 2019)]
+    alerta = alertas[0]
+    assert set(alerta['criterios']) == {'z_historico', 'z_janela', 'variacao_anual'}
+    assert alerta['severidade'] == 'alta'
+    assert alerta['variacao_anual'] == pytest.approx((400 - pico[-2]) / pico[-2] * 100)
+    assert alerta['descricao'].startswith('pico em 2019: 400 km²')
+
+    # z-score histórico igual ao calculado coluna a coluna
+    serie = pd.Series(pico)
+    esperado = (serie - serie.mean()) / serie.std()
+    np.testing.assert_allclose(anomalias.z_historico[:, 1], esperado)
+    # Janela móvel: média e desvio dos 5 anos anteriores
+    anteriores = pd.Series(pico).shift(1).rolling(5)
+    esperado_janela = (serie - anteriores.mean()) / anteriores.std()
+    np.testing.assert_allclose(anomalias.z_janela[5:, 1], esperado_janela[5:], rtol=1e-9)
+
+
+def test_anomalias_filtram_series_e_periodo():
+    anos = np.arange(2000, 2010)
+    valores = np.full((10, 2), 100.0) + np.tile([[1.0], [-1.0]], (5, 2))
+    valores[3] = [300.0, 300.0]
+    anomalias = detectar_anomalias(anos, valores, ['a', 'b'])
+
+    assert anomalias.alertas(ultimos_anos=1) == []
+    todos = anomalias.alertas(ultimos_anos=None)
+    assert {(alerta['serie'], alerta['ano']) for alerta in todos} >= {('a', 2003), ('b', 2003)}
+    assert all(alerta['serie'] == 'b' for alerta in anomalias.alertas(ultimos_anos=None, series=['b']))
+    assert len(anomalias.alertas(ultimos_anos=None, limite=1)) == 1
@@ -0,0 +1,106 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import armazem_perguntas
+from armazem_perguntas import ArmazemPerguntas
+
+
+@pytest.fixture
+def armazem(tmp_path):
+    return ArmazemPerguntas(str(tmp_path / 'perguntas.db'))
+
+
+def test_paginas_nao_perdem_perguntas_do_mesmo_instante(armazem, monkeypatch):
+    # Cinco perguntas criadas no mesmo instante, que a página corta ao meio
+    monkeypatch.setattr(armazem_perguntas, 'time', SimpleNamespace(time=lambda: 1000.0))
+    ids = {armazem.registrar_pergunta('s1', f'pergunta {i}') for i in range(5)}
+
+    vistos = []
+    pagina, cursor = armazem.listar('s1', limite=2)
+    vistos += [registro['id'] for registro in pagina]
+    while cursor is not None:
+        pagina, cursor = armazem.listar('s1', limite=2, antes_de=cursor)
+        vistos += [registro['id'] for registro in pagina]
+
+    assert len(vistos) == 5 and set(vistos) == ids
+
+
+def test_cursor_so_com_o_instante(armazem, monkeypatch):
+    instantes = iter([10.0, 20.0, 30.0])
+    monkeypatch.setattr(armazem_perguntas, 'time', SimpleNamespace(time=lambda: next(instantes)))
+    for i in range(3):
+        armazem.registrar_pergunta('s1', f'pergunta {i}')
+    pagina, cursor = armazem.listar('s1', antes_de=30.0)
+    assert [registro['pergunta'] for registro in pagina] == ['pergunta 0', 'pergunta 1']
+    assert cursor is None
+    with pytest.raises(ValueError):
+        armazem.listar('s1', antes_de='ontem')
+
+
+def test_pergunta_e_resposta_persistem(tmp_path):
+    caminho = str(tmp_path / 'perguntas.db')
+    armazem = ArmazemPerguntas(caminho)
+    pergunta_id = armazem.registrar_pergunta('s1', 'Qual estado mais desmatou?', 'v1')
+    assert armazem.obter(pergunta_id)['status'] == 'pendente'
+
+    assert armazem.registrar_resposta(pergunta_id, 'PA') == 's1'
+    armazem.registrar_uso(pergunta_id, 120, 30, 850.0)
+
+    # Outra instância (por exemplo, após um reinício) lê o mesmo banco
+    registro = ArmazemPerguntas(caminho).obter(pergunta_id)
+    assert registro['resposta'] == 'PA' and registro['status'] == 'respondida'
+    assert registro['dataset_hash'] == 'v1'
+    assert (registro['tokens_prompt'], registro['tokens_resposta'], registro['latencia_ms']) == (120, 30, 850.0)
+
+
+def test_historico_separado_por_sessao(armazem, monkeypatch):
+    instantes = iter(range(1, 100))
+    monkeypatch.setattr(armazem_perguntas, 'time', SimpleNamespace(time=lambda: float(next(instantes))))
+    for i in range(3):
+        armazem.registrar_pergunta('s1', f'pergunta {i}')
+    armazem.registrar_pergunta('s2', 'de outra sessão')
+
+    pagina, cursor = armazem.listar('s1', limite=2)
+    # As mais recentes, em ordem cronológica
+    assert [registro['pergunta'] for registro in pagina] == ['pergunta 1', 'pergunta 2']
+    anteriores, fim = armazem.listar('s1', limite=2, antes_de=cursor)
+    assert [registro['pergunta'] for registro in anteriores] == ['pergunta 0']
+    assert fim is None
+    assert [registro['pergunta'] for registro in armazem.listar('s2')[0]] == ['de outra sessão']
+
+
+def test_respostas_desde(armazem, monkeypatch):
+    instantes = iter(range(1, 100))
+    monkeypatch.setattr(armazem_perguntas, 'time', SimpleNamespace(time=lambda: float(next(instantes))))
+    primeira = armazem.registrar_pergunta('s1', 'a')
+    segunda = armazem.registrar_pergunta('s1', 'b')
+    armazem.registrar_resposta(primeira, 'A')
+    instante = armazem.obter(primeira)['respondida_em']
+    armazem.registrar_resposta(segunda, 'B')
+
+    assert [r['id'] for r in armazem.respostas_desde(0)] == [primeira, segunda]
+    assert [r['resposta'] for r in armazem.respostas_desde(instante)] == ['B']
+
+
+def test_remover(armazem):
+    pergunta_id = armazem.registrar_pergunta('s1', 'recusada')
+    armazem.remover(pergunta_id)
+    assert armazem.obter(pergunta_id) is None
+    assert armazem.sessao_da_pergunta(pergunta_id) is None
+
+
+def test_migra_banco_sem_as_colunas_novas(tmp_path):
+    caminho = str(tmp_path / 'antigo.db')
+    with sqlite3.connect(caminho) as conexao:
+        conexao.execute(
+            'CREATE TABLE perguntas (id TEXT PRIMARY KEY, sessao TEXT NOT NULL, pergunta TEXT NOT NULL, '
+            "resposta TEXT, status TEXT NOT NULL DEFAULT 'pendente', criada_em REAL NOT NULL, respondida_em REAL)"
+        )
+        conexao.execute("INSERT INTO perguntas (id, sessao, pergunta, criada_em) VALUES ('p0', 's1', 'antiga', 1.0)")
+
+    armazem = ArmazemPerguntas(caminho)
+    assert armazem.obter('p0')['dataset_hash'] is None
+    pergunta_id = armazem.registrar_pergunta('s1', 'nova', 'v1')
+    assert armazem.obter(pergunta_id)['dataset_hash'] == 'v1'
@@ -0,0 +1,169 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from agente_analise import AgenteAnaliseDesmatamento
+from cache_analises import CacheAnalises, hash_dataset, linhas_alteradas
+from ingestao import ler_csv
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+@pytest.fixture(scope='module')
+def csv():
+    with open(CAMINHO_CSV, encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+def _ler(texto):
+    df, _ = ler_csv(io.BytesIO(texto.encode('utf-8')))
+    return df
+
+
+def test_versao_atualizada_tem_o_hash_do_conteudo(csv):
+    linhas = csv.rstrip('\n').split('\n')
+    completo = _ler(csv)
+    sem_ultimo_ano = _ler('\n'.join(linhas[:-1]) + '\n')
+
+    cache = CacheAnalises()
+    cache.construir(AgenteAnaliseDesmatamento(sem_ultimo_ano))
+    ultimo_ano = _ler(linhas[0] + '\n' + linhas[-1] + '\n')
+    atualizacao = cache.atualizar(ultimo_ano)
+
+    # A mesma versão enviada inteira pelo upload tem o mesmo hash
+    assert atualizacao.analise.dataset_hash == hash_dataset(completo)
+    assert atualizacao.analise.dataset_hash != atualizacao.anterior.dataset_hash
+
+
+def test_hash_ignora_o_tipo_numerico():
+    inteiros = pd.DataFrame({'Ano/Estados': [2020, 2021], 'PA': [10, 20]})
+    reais = inteiros.astype({'Ano/Estados': 'int16', 'PA': 'float64'})
+    assert hash_dataset(inteiros) == hash_dataset(reais)
+    assert hash_dataset(inteiros) != hash_dataset(inteiros.assign(PA=[10, 21]))
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_csv(CAMINHO_CSV, sep=';')
+
+
+def test_linhas_alteradas(df):
+    anterior = df.iloc[:-1].reset_index(drop=True)
+    novo = df.copy()
+    novo.loc[novo['Ano/Estados'] == 2000, 'PA'] += 1
+
+    alteradas = linhas_alteradas(anterior, novo)
+    assert alteradas['Ano/Estados'].tolist() == [2000, int(df['Ano/Estados'].iloc[-1])]
+    assert linhas_alteradas(df, df.copy()).empty
+
+
+@pytest.mark.parametrize('mudanca', [
+    lambda df: df.drop(columns=['PA']),
+    lambda df: df.iloc[1:],
+    lambda df: pd.concat([df, df.iloc[-1:]]),
+    lambda df: df.assign(PA=df['PA'].where(df['Ano/Estados'] != 2000)),
+])
+def test_linhas_alteradas_sem_diferenca_incremental(df, mudanca):
+    # Coluna removida, ano removido, ano repetido ou valor apagado exigem a versão completa
+    assert linhas_alteradas(df, mudanca(df.copy())) is None
+
+
+def test_atualizar_reaproveita_graficos_nao_afetados(df):
+    cache = CacheAnalises()
+    anterior = cache.construir(AgenteAnaliseDesmatamento(df))
+    for tipo in ('evolucao', 'estados', 'correlacao', 'previsao'):
+        anterior.dados_grafico(tipo)
+
+    # Só um estado corrigido: os gráficos da Amazônia Legal continuam valendo
+    atualizacao = cache.atualizar(pd.DataFrame({'Ano/Estados': [2000], 'PA': [1.0]}))
+
+    assert atualizacao.series_alteradas == ['PA']
+    assert atualizacao.anos_corrigidos == [2000] and atualizacao.anos_novos == []
+    assert atualizacao.graficos_afetados == {'estados', 'correlacao'}
+    novos = atualizacao.analise._dados_graficos
+    assert novos['evolucao'] is anterior._dados_graficos['evolucao']
+    assert 'estados' not in novos
+    assert atualizacao.ativada and cache.obter() is atualizacao.analise
+    assert atualizacao.analise.df.loc[atualizacao.analise.df['Ano/Estados'] == 2000, 'PA'].iloc[0] == 1.0
+
+
+def _versoes(df, quantidade):
+    """Versões diferentes do mesmo dataset (valores de PA deslocados)"""
+    return [AgenteAnaliseDesmatamento(df.assign(PA=df['PA'] + i)) for i in range(quantidade)]
+
+
+def test_remove_as_versoes_menos_usadas_acima_do_orcamento(df):
+    agentes = _versoes(df, 4)
+    sonda = CacheAnalises().construir(agentes[0])
+    # Cabem duas versões e meia
+    cache = CacheAnalises(orcamento_bytes=int(sonda.memoria * 2.5))
+    analises = [cache.construir(agente, ativar=False) for agente in agentes[:2]]
+    # Usar a primeira faz da segunda a menos usada
+    assert cache.obter(analises[0].dataset_hash) is analises[0]
+    cache.construir(agentes[2], ativar=False)
+
+    assert cache.obter(analises[1].dataset_hash) is None
+    assert cache.obter(analises[0].dataset_hash) is analises[0]
+    metricas = cache.metricas()
+    assert metricas['datasets'] == 2 and metricas['removidos'] == 1
+    assert metricas['memoria_bytes'] <= cache.orcamento_bytes
+
+
+def test_versao_atual_nao_e_removida(df):
+    agentes = _versoes(df, 3)
+    sonda = CacheAnalises().construir(agentes[0])
+    cache = CacheAnalises(orcamento_bytes=int(sonda.memoria * 1.5))
+    atual = cache.construir(agentes[0])
+    for agente in agentes[1:]:
+        cache.construir(agente, ativar=False)
+    assert cache.obter() is atual
+    assert cache.obter(atual.dataset_hash) is atual
+
+
+def test_recarrega_versao_removida(df):
+    agentes = {}
+    carregados = []
+
+    def carregador(dataset_hash):
+        carregados.append(dataset_hash)
+        return agentes.get(dataset_hash)
+
+    cache = CacheAnalises(orcamento_bytes=1, carregador=carregador)
+    primeira, segunda = _versoes(df, 2)
+    analise = cache.construir(primeira)
+    agentes[analise.dataset_hash] = primeira
+    cache.construir(segunda)
+
+    # A primeira saiu da memória e volta pelo carregador, sem virar a atual
+    recarregada = cache.obter(analise.dataset_hash)
+    assert recarregada is not analise and recarregada.dataset_hash == analise.dataset_hash
+    assert carregados == [analise.dataset_hash]
+    assert cache.obter() is not recarregada
+    assert cache.obter('desconhecido') is None
+    assert cache.metricas()['recarregados'] == 1
+
+
+def test_atual_resolvida_por_outro_processo(df):
+    primeira, segunda = _versoes(df, 2)
+    ponteiro = [None]
+    cache = CacheAnalises(atual=lambda: ponteiro[0])
+    a = cache.construir(primeira)
+    b = cache.construir(segunda, ativar=False)
+    assert cache.obter() is a
+
+    # Outro processo trocou a versão atual
+    ponteiro[0] = b.dataset_hash
+    assert cache.obter() is b
+    # A atualização só passa a ser a atual se partiu da versão atual
+    assert not cache.atualizar(pd.DataFrame({'Ano/Estados': [2000], 'PA': [1.0]}), a.dataset_hash).ativada
+    assert cache.atualizar(pd.DataFrame({'Ano/Estados': [2000], 'PA': [2.0]})).ativada
+
+
+def test_invalidar(df):
+    cache = CacheAnalises()
+    analise = cache.construir(AgenteAnaliseDesmatamento(df))
+    cache.invalidar()
+    assert cache.obter() is None
+    assert cache.obter(analise.dataset_hash) is None
@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+
+import pytest
+
+import cache_respostas
+from cache_respostas import CacheRespostas, normalizar_pergunta
+
+MODELO = 'gpt-3.5-turbo'
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste no lugar de time.monotonic"""
+    agora = [1000.0]
+    monkeypatch.setattr(cache_respostas, 'time', SimpleNamespace(monotonic=lambda: agora[0]))
+    return agora
+
+
+def test_normalizar_pergunta():
+    assert normalizar_pergunta("  Qual o ESTADO que mais desmatou?! ") == 'qual o estado que mais desmatou'
+    assert normalizar_pergunta("Região: Amazônia") == 'regiao amazonia'
+
+
+def test_acerto_e_falha():
+    cache = CacheRespostas()
+    assert cache.obter('v1', 'Qual estado mais desmatou?', MODELO, 0.7) is None
+    cache.armazenar('v1', 'Qual estado mais desmatou?', MODELO, 0.7, 'PA')
+
+    # A chave usa a pergunta normalizada
+    assert cache.obter('v1', 'qual estado mais desmatou', MODELO, 0.7) == 'PA'
+    # Outra versão do dataset, outro modelo ou outra temperatura não compartilham a resposta
+    assert cache.obter('v2', 'Qual estado mais desmatou?', MODELO, 0.7) is None
+    assert cache.obter('v1', 'Qual estado mais desmatou?', 'gpt-4', 0.7) is None
+    assert cache.obter('v1', 'Qual estado mais desmatou?', MODELO, 0.2) is None
+
+    metricas = cache.metricas()
+    assert metricas['acertos'] == 1
+    assert metricas['falhas'] == 4
+    assert metricas['taxa_acerto'] == pytest.approx(0.2)
+
+
+def test_expiracao_por_ttl(relogio):
+    cache = CacheRespostas(ttl=60)
+    cache.armazenar('v1', 'pergunta', MODELO, 0.7, 'resposta')
+    relogio[0] += 59
+    assert cache.obter('v1', 'pergunta', MODELO, 0.7) == 'resposta'
+    relogio[0] += 1
+    assert cache.obter('v1', 'pergunta', MODELO, 0.7) is None
+    assert cache.metricas()['expiradas'] == 1
+    assert cache.metricas()['tamanho'] == 0
+
+
+def test_remove_a_menos_usada():
+    cache = CacheRespostas(capacidade=2)
+    cache.armazenar('v1', 'a', MODELO, 0.7, 'A')
+    cache.armazenar('v1', 'b', MODELO, 0.7, 'B')
+    # Usar "a" faz de "b" a menos usada
+    assert cache.obter('v1', 'a', MODELO, 0.7) == 'A'
+    cache.armazenar('v1', 'c', MODELO, 0.7, 'C')
+
+    assert cache.obter('v1', 'b', MODELO, 0.7) is None
+    assert cache.obter('v1', 'a', MODELO, 0.7) == 'A'
+    assert cache.obter('v1', 'c', MODELO, 0.7) == 'C'
+    assert cache.metricas()['removidas'] == 1
+
+
+def test_limiar_de_similaridade():
+    cache = CacheRespostas(limiar_similaridade=0.9)
+    cache.armazenar('v1', 'qual estado mais desmatou em 2020', MODELO, 0.7, 'PA')
+
+    assert cache.obter('v1', 'qual estado mais desmatou em 2020?!', MODELO, 0.7) == 'PA'
+    assert cache.obter('v1', 'qual o estado mais desmatou em 2020', MODELO, 0.7) == 'PA'
+    assert cache.obter('v1', 'qual estado menos desmatou em 2012', MODELO, 0.7) is None
+    # A similaridade só vale dentro do mesmo dataset, modelo e temperatura
+    assert cache.obter('v2', 'qual o estado mais desmatou em 2020', MODELO, 0.7) is None
+    assert cache.metricas()['acertos_similares'] == 1
+
+
+def test_sem_limiar_exige_pergunta_igual():
+    cache = CacheRespostas()
+    cache.armazenar('v1', 'qual estado mais desmatou em 2020', MODELO, 0.7, 'PA')
+    assert cache.obter('v1', 'qual o estado mais desmatou em 2020', MODELO, 0.7) is None
+
+
+def test_similar_exige_mesmos_numeros_e_series():
+    cache = CacheRespostas(limiar_similaridade=0.9)
+    cache.armazenar('v1', 'Quanto foi desmatado no PA em 2020?', MODELO, 0.7, '2020', series=['PA'])
+    cache.armazenar('v1', 'Quanto foi desmatado no Acre em 2019?', MODELO, 0.7, 'AC', series=['AC'])
+
+    # Textos quase iguais, mas outro ano ou outra série
+    assert cache.obter('v1', 'Quanto foi desmatado no PA em 2021?', MODELO, 0.7, series=['PA']) is None
+    assert cache.obter('v1', 'Quanto foi desmatado no AM em 2020?', MODELO, 0.7, series=['AM']) is None
+    assert cache.obter('v1', 'Quanto foi desmatado no Acre em 2019', MODELO, 0.7, series=['AC']) == 'AC'
+    assert cache.obter('v1', 'Quanto foi o desmatado no PA em 2020?', MODELO, 0.7, series=['PA']) == '2020'
+    assert cache.metricas()['acertos_similares'] == 1
+
+
+def test_similar_expirada_nao_e_usada(relogio):
+    cache = CacheRespostas(ttl=10, limiar_similaridade=0.9)
+    cache.armazenar('v1', 'qual estado mais desmatou em 2020', MODELO, 0.7, 'PA')
+    relogio[0] += 10
+    assert cache.obter('v1', 'qual o estado mais desmatou em 2020', MODELO, 0.7) is None
+    assert cache.metricas()['tamanho'] == 0
+
+
+def test_migrar_para_nova_versao():
+    cache = CacheRespostas()
+    cache.armazenar('v1', 'desmatamento no PA em 2004', MODELO, 0.7, 'pa')
+    cache.armazenar('v1', 'desmatamento no AM em 2004', MODELO, 0.7, 'am')
+    cache.armazenar('v0', 'desmatamento no PA em 2004', MODELO, 0.7, 'antiga')
+
+    cache.armazenar('v1', 'desmatamento no Pará em 2005', MODELO, 0.7, 'pará')
+
+    # manter recebe a pergunta como foi feita, com acentos e maiúsculas
+    mantidas = cache.migrar('v1', 'v2', lambda pergunta: 'PA' in pergunta.split() or 'Pará' in pergunta)
+
+    assert mantidas == 2
+    assert cache.obter('v2', 'desmatamento no PA em 2004', MODELO, 0.7) == 'pa'
+    assert cache.obter('v2', 'desmatamento no Pará em 2005', MODELO, 0.7) == 'pará'
+    assert cache.obter('v2', 'desmatamento no AM em 2004', MODELO, 0.7) is None
+    # A versão de origem continua com as respostas até saírem por LRU ou TTL
+    assert cache.obter('v1', 'desmatamento no PA em 2004', MODELO, 0.7) == 'pa'
+    assert cache.obter('v1', 'desmatamento no AM em 2004', MODELO, 0.7) == 'am'
+    assert cache.obter('v0', 'desmatamento no PA em 2004', MODELO, 0.7) == 'antiga'
+
+
+def test_migrar_respeita_a_capacidade():
+    cache = CacheRespostas(capacidade=3)
+    cache.armazenar('v1', 'a', MODELO, 0.7, 'A')
+    cache.armazenar('v1', 'b', MODELO, 0.7, 'B')
+    assert cache.migrar('v1', 'v2', lambda pergunta: True) == 2
+    # As cópias são as mais recentes: saem primeiro as da versão de origem
+    assert cache.metricas()['tamanho'] == 3
+    assert cache.obter('v1', 'a', MODELO, 0.7) is None
+    assert cache.obter('v2', 'a', MODELO, 0.7) == 'A'
+
+
+def test_migradas_entram_na_busca_por_similaridade():
+    cache = CacheRespostas(limiar_similaridade=0.9)
+    cache.armazenar('v1', 'qual estado mais desmatou em 2020', MODELO, 0.7, 'PA')
+    cache.migrar('v1', 'v2', lambda pergunta: True)
+    assert cache.obter('v2', 'qual o estado mais desmatou em 2020', MODELO, 0.7) == 'PA'
+    assert cache.obter('v1', 'qual o estado mais desmatou em 2020', MODELO, 0.7) == 'PA'
+
+
+def test_invalidar():
+    cache = CacheRespostas()
+    cache.armazenar('v1', 'a', MODELO, 0.7, 'A')
+    cache.armazenar('v2', 'a', MODELO, 0.7, 'A2')
+    cache.invalidar('v1')
+    assert cache.obter('v1', 'a', MODELO, 0.7) is None
+    assert cache.obter('v2', 'a', MODELO, 0.7) == 'A2'
+    cache.invalidar()
+    assert cache.metricas()['tamanho'] == 0
@@ -0,0 +1,109 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from consultas import IndiceIntervalos, detectar_esquema
+from estatisticas import EstatisticasDataset
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+@pytest.fixture(scope='module')
+def indice():
+    gerador = np.random.default_rng(3)
+    valores = gerador.integers(0, 1000, size=(23, 4)).astype(np.float64)
+    valores[gerador.random(valores.shape) < 0.2] = np.nan
+    valores[:, 3] = np.nan  # série sem nenhum dado
+    return IndiceIntervalos(np.arange(2000, 2023), valores, ['a', 'b', 'c', 'vazia'])
+
+
+def test_intervalos_iguais_ao_calculo_direto(indice):
+    # Todos os intervalos possíveis, comparados com as reduções nan* do NumPy
+    for primeira in range(len(indice.anos)):
+        for ultima in range(primeira, len(indice.anos)):
+            inicio, fim = int(indice.anos[primeira]), int(indice.anos[ultima])
+            janela = indice.valores[primeira:ultima + 1]
+            com_dado = ~np.isnan(janela).all(axis=0)
+            with warnings.catch_warnings():
+                # Média de série sem dado no intervalo
+                warnings.simplefilter('ignore', RuntimeWarning)
+                media = np.nanmean(janela, axis=0)
+            np.testing.assert_allclose(indice.soma(None, inicio, fim), np.nansum(janela, axis=0))
+            np.testing.assert_allclose(indice.media(None, inicio, fim), media)
+
+            minimos, anos_minimos = indice.minimo(None, inicio, fim)
+            maximos, anos_maximos = indice.maximo(None, inicio, fim)
+            for i in np.flatnonzero(com_dado):
+                coluna = janela[:, i]
+                assert minimos[i] == np.nanmin(coluna)
+                assert maximos[i] == np.nanmax(coluna)
+                # Em empates, o primeiro ano
+                assert anos_minimos[i] == indice.anos[primeira + np.nanargmin(coluna)]
+                assert anos_maximos[i] == indice.anos[primeira + np.nanargmax(coluna)]
+            assert np.isnan(minimos[~com_dado]).all() and np.isnan(maximos[~com_dado]).all()
+
+
+def test_limites_do_intervalo(indice):
+    # Anos fora do período são recortados; sem limites, o período todo
+    assert indice.linhas() == (0, len(indice.anos) - 1)
+    assert indice.linhas(1990, 2001) == (0, 1)
+    assert indice.linhas(2021, 2100) == (21, 22)
+    with pytest.raises(ValueError, match='Não há dados'):
+        indice.linhas(2030, 2040)
+    with pytest.raises(ValueError, match='Não há dados'):
+        indice.linhas(2010, 2005)
+    with pytest.raises(KeyError):
+        indice.soma(['zz'])
+
+
+def test_anos_fora_de_ordem():
+    with pytest.raises(ValueError):
+        IndiceIntervalos([2001, 2000], np.zeros((2, 1)), ['a'])
+
+
+def test_consultar_como_a_rota(indice):
+    resultado = indice.consultar(['a', 'c', 'vazia'], 2005, 2010, ['soma', 'maximo', 'variacao'])
+    janela = indice.valores[5:11]
+
+    assert (resultado['inicio'], resultado['fim'], resultado['anos']) == (2005, 2010, 6)
+    assert list(resultado['series']) == ['a', 'c', 'vazia']
+    assert list(resultado['series']['a']) == ['soma', 'variacao', 'maximo']
+    assert resultado['series']['a']['soma'] == pytest.approx(np.nansum(janela[:, 0]))
+    assert resultado['series']['vazia'] == {'soma': None, 'variacao': None, 'maximo': {'valor': None, 'ano': None}}
+    conjunto = np.nansum(janela[:, [0, 2, 3]], axis=1)
+    assert resultado['conjunto']['soma'] == pytest.approx(conjunto.sum())
+    assert set(resultado['conjunto']) == {'soma', 'variacao'}
+    with pytest.raises(ValueError, match='Medidas desconhecidas'):
+        indice.consultar(medidas=['mediana'])
+
+
+def test_consulta_do_dataset_usa_os_estados():
+    df = pd.read_csv(CAMINHO_CSV, sep=';')
+    estatisticas = EstatisticasDataset(df)
+    resultado = estatisticas.consultar(inicio=2004, fim=2012)
+    assert list(resultado['series']) == list(estatisticas.estados)
+    janela = df[(df['Ano/Estados'] >= 2004) & (df['Ano/Estados'] <= 2012)]
+    assert resultado['series']['PA']['soma'] == janela['PA'].sum()
+    assert resultado['series']['PA']['maximo'] == {
+        'valor': float(janela['PA'].max()), 'ano': int(janela.loc[janela['PA'].idxmax(), 'Ano/Estados'])
+    }
+    # Os estados somados ano a ano reproduzem a Amazônia Legal
+    assert resultado['conjunto']['soma'] == pytest.approx(janela['AMZ LEGAL'].sum(), rel=0.01)
+
+
+def test_detectar_esquema():
+    prodes = detectar_esquema(pd.read_csv(CAMINHO_CSV, sep=';'))
+    assert (prodes.coluna_ano, prodes.coluna_total) == ('Ano/Estados', 'AMZ LEGAL')
+    assert prodes.series[-1] == 'AMZ LEGAL' and 'PA' in prodes.regioes
+
+    # Sem nomes conhecidos: o ano pelos valores e o total pela soma das demais
+    df = pd.DataFrame({'periodo': [2001, 2002, 2003], 'x': [1, 2, 3], 'y': [4, 5, 6], 'z': [5, 7, 9]})
+    esquema = detectar_esquema(df)
+    assert (esquema.coluna_ano, esquema.coluna_total, esquema.regioes) == ('periodo', 'z', ['x', 'y'])
+
+    assert detectar_esquema(df[['periodo', 'x', 'y']]).coluna_total is None
+    with pytest.raises(ValueError):
+        detectar_esquema(pd.DataFrame({'x': [1.5, 2.5]}))
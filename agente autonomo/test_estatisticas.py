@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from estatisticas import EstatisticasDataset
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_csv(CAMINHO_CSV, sep=';')
+
+
+def _iguais(incremental, completa):
+    """As estatísticas ajustadas pelas linhas novas coincidem com as recalculadas do zero"""
+    np.testing.assert_array_equal(incremental.anos, completa.anos)
+    np.testing.assert_array_equal(incremental.valores, completa.valores)
+    for atributo in ('totais', 'medias', 'maximos', 'minimos'):
+        pd.testing.assert_series_equal(getattr(incremental, atributo), getattr(completa, atributo),
+                                       check_names=False)
+    for atributo in ('ano_maximo', 'ano_minimo'):
+        assert getattr(incremental, atributo).astype(int).tolist() == getattr(completa, atributo).astype(int).tolist()
+    np.testing.assert_allclose(incremental.correlacao(), completa.correlacao(), rtol=1e-9)
+    assert incremental.variacao_serie(incremental.coluna_total, 5) == pytest.approx(
+        completa.variacao_serie(completa.coluna_total, 5))
+
+
+def test_anexar_anos(df):
+    base = EstatisticasDataset(df.iloc[:-2].reset_index(drop=True))
+    valores_base = base.valores.copy()
+
+    nova, alteradas, anos_novos, corrigidos = base.atualizar(df.iloc[-2:])
+
+    _iguais(nova, EstatisticasDataset(df))
+    assert anos_novos == df['Ano/Estados'].iloc[-2:].tolist()
+    assert corrigidos == []
+    assert alteradas == list(base.series)
+    # A versão de origem não muda
+    np.testing.assert_array_equal(base.valores, valores_base)
+    assert base.num_anos == len(df) - 2
+
+
+def test_corrigir_ano_existente(df):
+    base = EstatisticasDataset(df)
+    # Só PA é informado: as demais células do ano ficam como estavam
+    correcao = pd.DataFrame({'Ano/Estados': [1995], 'PA': [99999]})
+
+    nova, alteradas, anos_novos, corrigidos = base.atualizar(correcao)
+
+    corrigido = df.copy()
+    corrigido.loc[corrigido['Ano/Estados'] == 1995, 'PA'] = 99999
+    _iguais(nova, EstatisticasDataset(corrigido))
+    assert alteradas == ['PA']
+    assert (anos_novos, corrigidos) == ([], [1995])
+    assert base.maximos['PA'] == df['PA'].max()
+
+
+def test_versoes_derivadas_da_mesma_origem_sao_independentes(df):
+    base = EstatisticasDataset(df.iloc[:-1].reset_index(drop=True))
+    ultimo = df.iloc[-1:]
+    primeira, *_ = base.atualizar(ultimo)
+    # Outra versão a partir da mesma origem pode reaproveitar a folga do buffer
+    segunda, *_ = base.atualizar(ultimo.assign(PA=0))
+
+    assert primeira.valores[-1, primeira._indice('PA')] == ultimo['PA'].iloc[0]
+    assert segunda.valores[-1, segunda._indice('PA')] == 0
+    _iguais(primeira, EstatisticasDataset(df))
+
+
+def test_atualizacoes_em_sequencia(df):
+    estatisticas = EstatisticasDataset(df.iloc[:-5].reset_index(drop=True))
+    for i in range(len(df) - 5, len(df)):
+        estatisticas, *_ = estatisticas.atualizar(df.iloc[i:i + 1])
+    _iguais(estatisticas, EstatisticasDataset(df))
+
+
+@pytest.mark.parametrize('novas, mensagem', [
+    (pd.DataFrame({'Ano/Estados': [2030], 'XX': [1]}), 'Colunas desconhecidas'),
+    (pd.DataFrame({'Ano/Estados': [2030, 2030], 'PA': [1, 2]}), 'anos repetidos'),
+    (pd.DataFrame({'Ano/Estados': [1900], 'PA': [1]}), 'posteriores'),
+])
+def test_atualizacao_invalida(df, novas, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        EstatisticasDataset(df).atualizar(novas)
@@ -0,0 +1,79 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestao import ler_csv
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+def _ler(texto, **opcoes):
+    return ler_csv(io.BytesIO(texto.encode('utf-8')), **opcoes)
+
+
+def test_agregados_usam_os_valores_guardados():
+    linhas = ['Ano/Estados;PA;AM'] + [f'{2000 + i};{0.1 * (i + 1):.1f};{i}' for i in range(10)]
+    df, agregados = _ler('\n'.join(linhas) + '\n', tamanho_bloco=3)
+
+    assert df['PA'].dtype == np.float32
+    resumo = agregados.resumo()
+    guardados = df['PA'].to_numpy(dtype=np.float64)
+    # Calculados a partir dos float32 guardados, não dos float64 lidos do texto
+    assert resumo['PA']['soma'] == pytest.approx(guardados.sum(), rel=1e-12)
+    assert resumo['PA']['maximo'] == guardados.max()
+    assert resumo['PA']['minimo'] == float(np.float32(0.1)) != 0.1
+    assert resumo['AM']['soma'] == 45
+
+
+@pytest.fixture(scope='module')
+def csv_prodes():
+    with open(CAMINHO_CSV, encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+@pytest.mark.parametrize('delimitador', [';', ',', '\t'])
+def test_detecta_o_delimitador(csv_prodes, delimitador):
+    df, _ = _ler(csv_prodes.replace(';', delimitador))
+    esperado = pd.read_csv(CAMINHO_CSV, sep=';')
+    assert list(df.columns) == list(esperado.columns)
+    assert len(df) == len(esperado)
+
+
+def test_blocos_equivalem_a_leitura_inteira(csv_prodes):
+    esperado = pd.read_csv(CAMINHO_CSV, sep=';')
+    df, agregados = _ler(csv_prodes, tamanho_bloco=7)
+
+    pd.testing.assert_frame_equal(df, esperado, check_dtype=False)
+    # Tipos reduzidos
+    assert df['Ano/Estados'].dtype == np.int16
+    assert df['PA'].dtype == np.int32
+    resumo = agregados.resumo()
+    assert resumo['PA']['soma'] == esperado['PA'].sum()
+    assert resumo['PA']['maximo'] == esperado['PA'].max()
+    assert resumo['PA']['ano_maximo'] == esperado.loc[esperado['PA'].idxmax(), 'Ano/Estados']
+    assert resumo['AC']['ano_minimo'] == esperado.loc[esperado['AC'].idxmin(), 'Ano/Estados']
+    assert resumo['AMZ LEGAL']['media'] == pytest.approx(esperado['AMZ LEGAL'].mean())
+
+
+def test_valores_ausentes_nos_agregados():
+    df, agregados = _ler('Ano/Estados;PA\n2000;10\n2001;\n2002;30\n', tamanho_bloco=2)
+    assert np.isnan(df['PA'].iloc[1])
+    resumo = agregados.resumo()
+    assert resumo['PA']['soma'] == 40
+    assert resumo['PA']['media'] == 20
+    assert agregados.contagem.tolist() == [2]
+
+
+def test_copia_durante_a_leitura(csv_prodes, tmp_path):
+    copia = tmp_path / 'copia.csv'
+    _ler(csv_prodes, copia=str(copia))
+    assert copia.read_text(encoding='utf-8') == csv_prodes
+
+
+def test_arquivo_vazio():
+    # EmptyDataError do pandas é um ValueError, tratado como arquivo inválido pela rota
+    with pytest.raises(ValueError):
+        _ler('')
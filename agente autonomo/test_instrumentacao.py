@@ -0,0 +1,21 @@
+from instrumentacao import RegistroMetricas
+
+
+def test_instantaneo_e_lido_uma_vez_por_coleta():
+    registro = RegistroMetricas()
+    chamadas = []
+
+    def metricas():
+        chamadas.append(1)
+        return {'fila': len(chamadas), 'em_execucao': 2}
+
+    retrato = registro.instantaneo(metricas)
+    registro.medidor('teste_fila', 'Fila', lambda: retrato()['fila'])
+    registro.medidor('teste_em_execucao', 'Em execução', lambda: retrato()['em_execucao'])
+
+    texto = registro.exportar()
+    assert 'teste_fila 1' in texto and 'teste_em_execucao 2' in texto
+    assert len(chamadas) == 1
+    # Cada coleta tira um retrato novo; fora dela, a função é chamada direto
+    assert 'teste_fila 2' in registro.exportar()
+    assert retrato()['fila'] == 3
@@ -0,0 +1,205 @@
+import asyncio
+import gc
+import threading
+import time
+
+import pytest
+
+import llm
+from cache_respostas import CacheRespostas
+from llm import CircuitoAberto, ErroLLM, GatewayLLM
+
+pytest.importorskip('aiohttp')
+
+MENSAGENS = [{'role': 'user', 'content': 'Qual estado mais desmatou?'}]
+
+
+class _RespostaFalsa:
+    def __init__(self, status, dados=None, atraso=0.0):
+        self.status = status
+        self.headers = {}
+        self.dados = dados or {}
+        self.atraso = atraso
+
+    async def json(self):
+        return self.dados
+
+    async def text(self):
+        return str(self.dados)
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.atraso)
+        return self
+
+    async def __aexit__(self, *_):
+        return False
+
+
+class _SessaoFalsa:
+    """Cliente HTTP falso: devolve as respostas programadas, na ordem, e registra os pedidos"""
+
+    def __init__(self, *respostas):
+        self.respostas = list(respostas)
+        self.pedidos = []
+
+    def post(self, url, json=None):
+        self.pedidos.append((url, json))
+        return self.respostas.pop(0) if len(self.respostas) > 1 else self.respostas[0]
+
+    async def close(self):
+        pass
+
+
+def _chat(texto, prompt=12, resposta=3, atraso=0.0):
+    dados = {
+        'choices': [{'message': {'content': texto}}],
+        'usage': {'prompt_tokens': prompt, 'completion_tokens': resposta}
+    }
+    return _RespostaFalsa(200, dados, atraso)
+
+
+@pytest.fixture
+def criar_gateway():
+    """Cria gateways que usam a sessão falsa no lugar do aiohttp"""
+    gateways = []
+
+    def criar(sessao, **opcoes):
+        llm._importar_aiohttp()
+        opcoes.setdefault('espera_base', 0.001)
+        gateway = GatewayLLM('chave', url_base='http://llm.local/v1', **opcoes)
+
+        async def abrir_sessao():
+            gateway._semaforo = asyncio.Semaphore(gateway.max_concorrencia)
+            gateway._sessao = sessao
+
+        gateway._abrir_sessao = abrir_sessao
+        gateways.append(gateway)
+        return gateway
+
+    yield criar
+    for gateway in gateways:
+        gateway.encerrar()
+
+
+def test_pipeline_com_cache(criar_gateway):
+    sessao = _SessaoFalsa(_chat('PA'))
+    gateway = criar_gateway(sessao)
+    cache = CacheRespostas()
+
+    def responder(pergunta):
+        resposta = cache.obter('v1', pergunta, gateway.modelo, 0.7)
+        if resposta is None:
+            uso = {}
+            resposta = gateway.completar([{'role': 'user', 'content': pergunta}], temperatura=0.7, uso=uso)
+            cache.armazenar('v1', pergunta, gateway.modelo, 0.7, resposta)
+            assert uso == {'tokens_prompt': 12, 'tokens_resposta': 3}
+        return resposta
+
+    assert responder('Qual estado mais desmatou?') == 'PA'
+    assert responder('qual estado mais desmatou') == 'PA'
+    assert len(sessao.pedidos) == 1
+    url, corpo = sessao.pedidos[0]
+    assert url == 'http://llm.local/v1/chat/completions'
+    assert corpo['model'] == gateway.modelo and corpo['temperature'] == 0.7
+    assert cache.metricas()['acertos'] == 1
+
+
+def test_repete_apos_erro_do_servidor(criar_gateway):
+    sessao = _SessaoFalsa(_RespostaFalsa(503), _RespostaFalsa(500), _chat('ok'))
+    gateway = criar_gateway(sessao, tentativas=3)
+    assert gateway.completar(MENSAGENS) == 'ok'
+    assert len(sessao.pedidos) == 3
+    assert gateway.metricas()['novas_tentativas'] == 2
+
+
+def test_nao_repete_requisicao_recusada(criar_gateway):
+    sessao = _SessaoFalsa(_RespostaFalsa(400, {'erro': 'modelo inválido'}))
+    gateway = criar_gateway(sessao, tentativas=3)
+    with pytest.raises(ErroLLM) as erro:
+        gateway.completar(MENSAGENS)
+    assert erro.value.status == 400
+    assert len(sessao.pedidos) == 1
+
+
+def test_disjuntor_abre_apos_falhas(criar_gateway):
+    sessao = _SessaoFalsa(_RespostaFalsa(500))
+    gateway = criar_gateway(sessao, tentativas=1, limite_falhas=2)
+    for _ in range(2):
+        with pytest.raises(ErroLLM):
+            gateway.completar(MENSAGENS)
+    with pytest.raises(CircuitoAberto):
+        gateway.completar(MENSAGENS)
+    assert len(sessao.pedidos) == 2
+    assert gateway.metricas()['circuito'] == 'aberto'
+
+
+def test_agrupa_pedidos_identicos(criar_gateway):
+    sessao = _SessaoFalsa(_chat('PA', atraso=0.2))
+    gateway = criar_gateway(sessao)
+    usos = [{}, {}]
+    resultados = [None, None]
+
+    def perguntar(i):
+        resultados[i] = gateway.completar(MENSAGENS, uso=usos[i])
+
+    threads = [threading.Thread(target=perguntar, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resultados == ['PA', 'PA']
+    assert len(sessao.pedidos) == 1
+    # Só um dos pedidos gera custo
+    assert sorted(uso['tokens_prompt'] for uso in usos) == [0, 12]
+
+
+def test_respeita_o_prazo(criar_gateway):
+    sessao = _SessaoFalsa(_chat('tarde', atraso=0.6))
+    gateway = criar_gateway(sessao)
+    inicio = time.monotonic()
+    with pytest.raises(ErroLLM):
+        gateway.completar(MENSAGENS, prazo=time.monotonic() + 0.2)
+    assert time.monotonic() - inicio < 0.5
+    with pytest.raises(ErroLLM):
+        gateway.completar(MENSAGENS, prazo=time.monotonic() - 1)
+    assert gateway.metricas()['prazos_esgotados'] == 2
+    # O pedido abandonado continua valendo para quem pedir o mesmo depois
+    assert gateway.completar(MENSAGENS) == 'tarde'
+    assert len(sessao.pedidos) == 1
+
+
+def test_erro_de_pedido_abandonado_e_lido(criar_gateway, caplog):
+    sessao = _SessaoFalsa(_RespostaFalsa(500, atraso=0.2))
+    gateway = criar_gateway(sessao, tentativas=1)
+    with pytest.raises(ErroLLM):
+        gateway.completar(MENSAGENS, prazo=time.monotonic() + 0.05)
+    # A chamada abandonada termina com erro sem ninguém esperando por ela
+    limite = time.monotonic() + 2
+    while gateway._em_voo and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not gateway._em_voo
+    gc.collect()
+    assert 'never retrieved' not in caplog.text
+    assert gateway.metricas()['falhas'] == 1
+
+
+def test_contadores_com_pedidos_concorrentes(criar_gateway):
+    sessao = _SessaoFalsa(_chat('ok', atraso=0.01))
+    gateway = criar_gateway(sessao, max_concorrencia=4)
+
+    def perguntar(i):
+        for j in range(10):
+            gateway.completar([{'role': 'user', 'content': f'{i}-{j}'}])
+
+    threads = [threading.Thread(target=perguntar, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert gateway.metricas()['chamadas'] == len(sessao.pedidos) == 80
+
+
+def test_exige_ao_menos_uma_tentativa():
+    with pytest.raises(ValueError):
+        GatewayLLM('chave', tentativas=0)
@@ -0,0 +1,227 @@
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from armazem_perguntas import ArmazemPerguntas
+from motor_perguntas import FilaCheiaError, FilaCompartilhada, MotorPerguntas
+
+
+class _Respostas:
+    """Coleta as respostas entregues pelo motor (``ao_concluir``)"""
+
+    def __init__(self):
+        self.recebidas = {}
+        self._condicao = threading.Condition()
+
+    def __call__(self, pergunta_id, resposta):
+        with self._condicao:
+            self.recebidas[pergunta_id] = resposta
+            self._condicao.notify_all()
+
+    def esperar(self, quantidade, timeout=5):
+        with self._condicao:
+            assert self._condicao.wait_for(lambda: len(self.recebidas) >= quantidade, timeout)
+        return self.recebidas
+
+
+@pytest.fixture
+def criar_motor():
+    motores = []
+
+    def criar(processador, **opcoes):
+        respostas = _Respostas()
+        motor = MotorPerguntas(processador, respostas, **opcoes)
+        motor.iniciar()
+        motores.append(motor)
+        return motor, respostas
+
+    yield criar
+    for motor in motores:
+        motor.encerrar(timeout=1)
+
+
+def test_workers_respondem_em_paralelo(criar_motor):
+    prazos = []
+
+    def processador(pergunta_id, pergunta, dataset_hash, prazo=None):
+        prazos.append(prazo - time.monotonic())
+        time.sleep(0.2)
+        return f'{pergunta} ({dataset_hash})'
+
+    motor, respostas = criar_motor(processador, num_workers=4, timeout=10)
+    inicio = time.monotonic()
+    for i in range(4):
+        motor.submeter(f'p{i}', f'pergunta {i}', 'v1')
+    assert respostas.esperar(4) == {f'p{i}': f'pergunta {i} (v1)' for i in range(4)}
+    assert time.monotonic() - inicio < 0.6
+    # O processador recebe o prazo da pergunta
+    assert all(8 < restante <= 10 for restante in prazos)
+    assert motor.metricas()['contadores']['concluidas'] == 4
+
+
+def test_fila_cheia_recusa_perguntas(criar_motor):
+    liberar = threading.Event()
+    motor, respostas = criar_motor(lambda *_, prazo=None: liberar.wait() and 'ok', num_workers=1, capacidade=1)
+    motor.submeter('p0', 'ocupa o worker')
+    limite = time.monotonic() + 2
+    while motor.metricas()['em_execucao'] == 0 and time.monotonic() < limite:
+        time.sleep(0.01)
+    motor.submeter('p1', 'ocupa a fila')
+    with pytest.raises(FilaCheiaError):
+        motor.submeter('p2', 'sem espaço')
+    liberar.set()
+    assert respostas.esperar(2) == {'p0': 'ok', 'p1': 'ok'}
+    assert motor.metricas()['contadores']['rejeitadas'] == 1
+
+
+def test_erro_do_processador_vira_resposta(criar_motor):
+    def processador(*_, prazo=None):
+        raise RuntimeError('falhou')
+
+    motor, respostas = criar_motor(processador, num_workers=1)
+    motor.submeter('p0', 'pergunta')
+    assert respostas.esperar(1)['p0'] == 'Erro ao processar pergunta: falhou'
+    assert motor.metricas()['contadores']['erros'] == 1
+
+
+def test_vigia_expira_e_substitui_worker_preso(criar_motor):
+    liberar = threading.Event()
+
+    def processador(pergunta_id, pergunta, dataset_hash, prazo=None):
+        if pergunta == 'trava':
+            # Ignora o prazo e prende o worker
+            liberar.wait(5)
+            return 'tardia'
+        return 'rápida'
+
+    motor, respostas = criar_motor(processador, num_workers=1, timeout=0.2)
+    motor.submeter('p0', 'trava')
+    assert 'Tempo limite' in respostas.esperar(1)['p0']
+
+    # O pool não encolhe: outro worker atende enquanto o primeiro está preso
+    motor.submeter('p1', 'outra')
+    assert respostas.esperar(2)['p1'] == 'rápida'
+    metricas = motor.metricas()
+    assert metricas['contadores']['expiradas'] == 1
+    assert metricas['contadores']['workers_substituidos'] == 1
+    assert metricas['workers_presos'] == 1
+
+    # O resultado tardio é descartado e o worker preso termina
+    liberar.set()
+    limite = time.monotonic() + 2
+    while motor.metricas()['workers_presos'] and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert motor.metricas()['workers_presos'] == 0
+    assert respostas.recebidas['p0'].startswith('Tempo limite')
+
+
+def test_encerrar_responde_as_aceitas_e_recusa_novas(criar_motor):
+    def processador(pergunta_id, pergunta, dataset_hash, prazo=None):
+        time.sleep(0.05)
+        return 'ok'
+
+    motor, respostas = criar_motor(processador, num_workers=2)
+    for i in range(6):
+        motor.submeter(f'p{i}', 'pergunta')
+    assert motor.encerrar(timeout=5)
+    assert len(respostas.recebidas) == 6
+    with pytest.raises(FilaCheiaError):
+        motor.submeter('p6', 'depois do encerramento')
+
+
+@pytest.fixture
+def armazem(tmp_path):
+    return ArmazemPerguntas(str(tmp_path / 'perguntas.db'))
+
+
+def test_fila_compartilhada_entre_processos(armazem, criar_motor):
+    atendidas = []
+
+    def processador(pergunta_id, pergunta, dataset_hash, prazo=None):
+        atendidas.append(pergunta_id)
+        time.sleep(0.01)
+        return pergunta.upper()
+
+    # Dois motores com donos diferentes fazem o papel de dois processos
+    motores = [criar_motor(processador, num_workers=2,
+                           fila=FilaCompartilhada(armazem, intervalo=0.02, dono=f'processo-{i}'))
+               for i in range(2)]
+    ids = []
+    for i in range(20):
+        pergunta_id = armazem.registrar_pergunta('s1', f'pergunta {i}', 'v1')
+        motores[i % 2][0].submeter(pergunta_id, f'pergunta {i}', 'v1')
+        ids.append(pergunta_id)
+
+    limite = time.monotonic() + 5
+    while sum(len(respostas.recebidas) for _, respostas in motores) < len(ids) and time.monotonic() < limite:
+        time.sleep(0.01)
+    recebidas = {}
+    for _, respostas in motores:
+        recebidas.update(respostas.recebidas)
+
+    # Cada pergunta é atendida uma única vez, por qualquer um dos processos
+    assert sorted(atendidas) == sorted(ids)
+    assert recebidas == {pergunta_id: f'PERGUNTA {i}' for i, pergunta_id in enumerate(ids)}
+    assert armazem.pendentes() == 0
+
+
+def test_fila_compartilhada_cheia(armazem):
+    fila = FilaCompartilhada(armazem, capacidade=1)
+    armazem.registrar_pergunta('s1', 'a')
+    fila.put_nowait(None)
+    armazem.registrar_pergunta('s1', 'b')
+    with pytest.raises(queue.Full):
+        fila.put_nowait(None)
+    fila.parar()
+    assert fila.get() is None
+
+
+def test_recupera_perguntas_de_processo_encerrado(armazem):
+    pergunta_id = armazem.registrar_pergunta('s1', 'órfã')
+    # Reservada por um processo desta máquina que já não existe
+    processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+    processo.wait()
+    assert armazem.reservar(f'{socket.gethostname()}:{processo.pid}')['id'] == pergunta_id
+    assert armazem.pendentes() == 0
+
+    fila = FilaCompartilhada(armazem, dono='vivo')
+    assert fila.recuperar() == 1
+    tarefa = fila.get()
+    assert tarefa.pergunta_id == pergunta_id and tarefa.pergunta == 'órfã'
+
+
+def test_recupera_perguntas_presas_alem_do_prazo(armazem):
+    pergunta_id = armazem.registrar_pergunta('s1', 'presa')
+    outro = FilaCompartilhada(armazem, dono=f'{socket.gethostname()}:{os.getpid()}')
+    assert outro.get().pergunta_id == pergunta_id
+
+    fila = FilaCompartilhada(armazem, prazo_orfas=60, dono='vivo')
+    # O dono está vivo e a reserva é recente: nada a recuperar
+    assert fila.recuperar() == 0
+    fila.prazo_orfas = 0
+    assert fila.recuperar() == 1
+    assert armazem.obter(pergunta_id)['status'] == 'pendente'
+
+
+def test_encerrar_devolve_as_reservadas(armazem, criar_motor):
+    liberar = threading.Event()
+    fila = FilaCompartilhada(armazem, intervalo=0.02, dono='saindo')
+    motor, respostas = criar_motor(lambda *_, prazo=None: liberar.wait(5) and 'ok', num_workers=1, fila=fila)
+    pergunta_id = armazem.registrar_pergunta('s1', 'longa')
+    motor.submeter(pergunta_id, 'longa')
+    limite = time.monotonic() + 2
+    while armazem.obter(pergunta_id)['status'] != 'em_execucao' and time.monotonic() < limite:
+        time.sleep(0.01)
+    pendente = armazem.registrar_pergunta('s1', 'ainda na fila')
+
+    assert not motor.encerrar(timeout=0.1)
+    # A pergunta em andamento volta para a fila, e a não reservada continua lá
+    assert armazem.obter(pergunta_id)['status'] == 'pendente'
+    assert armazem.obter(pendente)['status'] == 'pendente'
+    liberar.set()
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from estatisticas import EstatisticasDataset
+from previsoes import ServicoPrevisoes, previsao_linear
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+def test_previsao_linear_nao_fica_negativa():
+    anos = np.arange(2000, 2010)
+    # Série em queda forte: a reta cruza o zero logo depois do último ano
+    valores = np.column_stack([np.linspace(900, 100, 10), np.full(10, 50.0)])
+    resultado = previsao_linear(anos, valores, ['queda', 'estavel'], horizonte=5)
+
+    assert (resultado.previsao >= 0).all()
+    assert (resultado.inferior >= 0).all()
+    assert resultado.previsao[-1, 0] == 0
+    assert resultado.superior[0, 0] > 0
+    assert np.allclose(resultado.previsao[:, 1], 50)
+
+
+@pytest.fixture(scope='module')
+def estatisticas():
+    return EstatisticasDataset(pd.read_csv(CAMINHO_CSV, sep=';'))
+
+
+def test_previsao_linear_igual_a_regressao_por_serie(estatisticas):
+    valores = estatisticas.valores.copy()
+    valores[[3, 10], 0] = np.nan  # lacunas em uma das séries
+    resultado = previsao_linear(estatisticas.anos, valores, estatisticas.series, horizonte=3)
+
+    assert resultado.anos_futuros.tolist() == [int(estatisticas.anos[-1]) + i for i in (1, 2, 3)]
+    futuro = resultado.anos_futuros.astype(np.float64)
+    for i, serie in enumerate(estatisticas.series):
+        presentes = ~np.isnan(valores[:, i])
+        x = estatisticas.anos[presentes].astype(np.float64)
+        y = valores[presentes, i]
+        inclinacao, intercepto = np.polyfit(x, y, 1)
+        ajustados = intercepto + inclinacao * x
+        n = len(x)
+        # Intervalo de predição da regressão simples
+        s = np.sqrt(((y - ajustados) ** 2).sum() / (n - 2))
+        erro = s * np.sqrt(1 + 1 / n + (futuro - x.mean()) ** 2 / ((x - x.mean()) ** 2).sum())
+        margem = stats.t.ppf(0.975, n - 2) * erro
+        esperado = intercepto + inclinacao * futuro
+        np.testing.assert_allclose(resultado.previsao[:, i], np.maximum(esperado, 0), rtol=1e-6, err_msg=serie)
+        np.testing.assert_allclose(resultado.superior[:, i], np.maximum(esperado + margem, 0), rtol=1e-6, err_msg=serie)
+        np.testing.assert_allclose(resultado.inferior[:, i], np.maximum(esperado - margem, 0),
+                                   rtol=1e-6, atol=1e-6, err_msg=serie)
+
+
+def test_para_json(estatisticas):
+    resultado = previsao_linear(estatisticas.anos, estatisticas.valores, estatisticas.series)
+    dados = resultado.para_json(['PA'])
+    assert dados['modelo'] == 'linear' and dados['confianca'] == 0.95
+    assert list(dados['series']) == ['PA']
+    assert len(dados['series']['PA']['previsao']) == len(dados['anos_futuros']) == 5
+
+
+def test_servico_guarda_a_previsao_linear(estatisticas):
+    servico = ServicoPrevisoes(processos=1)
+    primeira = servico.obter('v1', estatisticas, 'linear')
+    assert servico.obter('v1', estatisticas, 'linear') is primeira
+    assert servico.obter('v1', estatisticas, 'linear', horizonte=3) is not primeira
+    servico.invalidar('v1')
+    assert servico.obter('v1', estatisticas, 'linear') is not primeira
+    with pytest.raises(ValueError):
+        servico.solicitar('v1', estatisticas, 'prophet')
+
+
+def test_servico_ajusta_arima_no_pool(estatisticas):
+    pytest.importorskip('statsmodels.tsa.arima.model')
+    servico = ServicoPrevisoes(processos=1, tamanho_lote=4)
+    try:
+        primeira = servico.solicitar('v1', estatisticas, 'arima', horizonte=3)
+        # Pedidos simultâneos compartilham o mesmo cálculo
+        assert servico.solicitar('v1', estatisticas, 'arima', horizonte=3) is primeira
+        resultado = primeira.result(timeout=120)
+    finally:
+        servico.encerrar()
+    assert resultado.modelo == 'arima'
+    assert resultado.previsao.shape == (3, len(estatisticas.series))
+    assert np.isfinite(resultado.previsao).all()
+    assert (resultado.inferior <= resultado.previsao).all() and (resultado.previsao <= resultado.superior).all()
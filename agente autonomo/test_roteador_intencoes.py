@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+import pytest
+
+from estatisticas import EstatisticasDataset
+from roteador_intencoes import RoteadorIntencoes
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prodes_desmatamento.csv')
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_csv(CAMINHO_CSV, sep=';')
+
+
+@pytest.fixture(scope='module')
+def roteador(df):
+    return RoteadorIntencoes(EstatisticasDataset(df))
+
+
+def _km2(valor):
+    return f"{valor:,.2f} km²"
+
+
+def _valor(df, ano, serie):
+    return float(df.loc[df['Ano/Estados'] == ano, serie].iloc[0])
+
+
+def test_ano_com_mais_desmatamento(roteador, df):
+    resposta = roteador.responder("Qual foi o ano com mais desmatamento?")
+    pico = df.loc[df['AMZ LEGAL'].idxmax()]
+    assert resposta == (f"O maior desmatamento na Amazônia Legal foi em {int(pico['Ano/Estados'])}, "
+                        f"com {_km2(pico['AMZ LEGAL'])}.")
+
+
+def test_ano_extremo_desde(roteador, df):
+    resposta = roteador.responder("Em que ano o Pará teve o menor desmatamento desde 2010?")
+    janela = df[df['Ano/Estados'] >= 2010]
+    minimo = janela.loc[janela['PA'].idxmin()]
+    fim = int(df['Ano/Estados'].max())
+    assert resposta == (f"O menor desmatamento em PA entre 2010 e {fim} foi em {int(minimo['Ano/Estados'])}, "
+                        f"com {_km2(minimo['PA'])}.")
+
+
+def test_variacao_desde_ano(roteador, df):
+    resposta = roteador.responder("Qual a variação do PA desde 2004?")
+    fim = int(df['Ano/Estados'].max())
+    assert resposta.startswith(f"PA: {_km2(_valor(df, 2004, 'PA'))} em 2004 e {_km2(_valor(df, fim, 'PA'))} em {fim}")
+
+
+def test_variacao_de_um_ano_compara_com_o_anterior(roteador, df):
+    resposta = roteador.responder("Quanto o desmatamento aumentou em 2020?")
+    base, final = _valor(df, 2019, 'AMZ LEGAL'), _valor(df, 2020, 'AMZ LEGAL')
+    variacao = (final - base) / base * 100
+    assert resposta.startswith(f"Amazônia Legal: {_km2(base)} em 2019 e {_km2(final)} em 2020")
+    assert f"{abs(variacao):,.2f}%" in resposta
+
+
+def test_variacao_entre_dois_anos(roteador, df):
+    resposta = roteador.responder("Qual a variação entre 2004 e 2012?")
+    assert resposta.startswith(f"Amazônia Legal: {_km2(_valor(df, 2004, 'AMZ LEGAL'))} em 2004 "
+                               f"e {_km2(_valor(df, 2012, 'AMZ LEGAL'))} em 2012")
+
+
+def test_total_ate_ano(roteador, df):
+    resposta = roteador.responder("Qual o total no Pará até 2000?")
+    inicio = int(df['Ano/Estados'].min())
+    total = df.loc[df['Ano/Estados'] <= 2000, 'PA'].sum()
+    assert resposta == f"Total desmatado em PA de {inicio} a 2000: {_km2(total)}."
+
+
+def test_ranking_em_um_ano(roteador, df):
+    resposta = roteador.responder("Qual estado mais desmatou em 2020?")
+    linha = df[df['Ano/Estados'] == 2020].iloc[0]
+    estado = linha[['AC', 'AM', 'AP', 'MA', 'MT', 'PA', 'RO', 'RR', 'TO']].astype(float).idxmax()
+    assert resposta == f"O estado com maior desmatamento em 2020 foi {estado}, com {_km2(linha[estado])}."
+
+
+def test_valor_de_um_ano(roteador, df):
+    resposta = roteador.responder("Qual o desmatamento em 2020?")
+    assert resposta == f"Desmatamento na Amazônia Legal em 2020: {_km2(_valor(df, 2020, 'AMZ LEGAL'))}."
+
+
+@pytest.mark.parametrize('pergunta', [
+    "Como ficou o desmatamento na última década?",
+    "Qual o total desmatado nos últimos 5 anos?",
+    "Qual a tendência do desmatamento no Pará?",
+    "Qual o desmatamento antes de 2000?",
+    "Qual ano teve a maior queda do desmatamento?",
+    "Quanto o desmatamento aumentou em 1988?",
+    "Desmatamento entre 2004 e 2012",
+    "Qual estado mais desmatou em 2004 e 2012?",
+    "Por que o desmatamento aumentou em 2019?",
+    # Quantidades com unidade não são anos, e comparações ficam com o LLM
+    "Quais estados desmataram mais de 2500 km² em 2020?",
+    "Qual estado desmatou 1500 km² em 2020?",
+    "O desmatamento caiu 30% em 2020?",
+    "O Acre desmatou mais que Rondônia?",
+    "O PA desmatou mais que o MT entre 2004 e 2012?",
+    "Em 2020 o desmatamento foi maior que a média?",
+])
+def test_perguntas_nao_entendidas_vao_para_o_llm(roteador, pergunta):
+    assert roteador.responder(pergunta) is None
+
+
+def test_ano_fora_do_dataset(roteador, df):
+    resposta = roteador.responder("Qual o desmatamento em 1950?")
+    assert resposta.startswith("Não há dados para 1950.")